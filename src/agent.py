@@ -1,12 +1,39 @@
-import re
+import time
 import uuid
-import sqlite3
 import json
-from datetime import datetime
+import asyncio
+from contextlib import contextmanager, nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Iterator, Optional
 
+import aiosqlite
+from langchain_core.runnables import RunnableLambda, RunnableParallel
 from langgraph.graph import StateGraph, END
 from langgraph.checkpoint.sqlite import SqliteSaver
-
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from cassette import Cassette
+from chain_cache import ChainCache
+from checkpointing import (
+    DURABILITY_MODES,
+    EndOfTurnCheckpointSaver,
+    ShardedCheckpointSaver,
+    ThreadLocalSqliteSaver,
+    connect_sqlite,
+)
+from checkpoint_maintenance import run_maintenance
+from deadlines import NodeDeadlineExceeded, fallback_response, with_deadline
+from hedging import Hedger
+from instrumentation import Instrumentation, TimedCheckpointSaver
+from intent_rules import IntentPreClassifier
+from inventory import RoomUnavailableError
+from local_extraction import LocalBookingExtractor
+from model_routing import ModelRouter
+from profiling import Profiler
+from reservations import ReservationStore, find_reference
+from speculation import SpeculationStats, TokenUsageCallback
+from templates import ChatModelCallCounter, ResponseTemplates
+from validation import booking_errors
 from pydantic_classes import (
     BookingState,
     IntentClassification,
@@ -14,6 +41,7 @@ from pydantic_classes import (
 )
 from chains import (
     create_intent_chain,
+    create_intent_and_booking_info_chain,
     create_booking_info_chain,
     create_booking_change_chain,
     create_response_generation_chain,
@@ -22,6 +50,10 @@ from chains import (
 )
 
 
+class SessionNotFoundError(KeyError):
+    """Raised when a turn refers to a thread_id that has no stored checkpoint."""
+
+
 class BookingWorkflow:
     NECESSARY_INFORMATION = [
         "full_name",
@@ -32,44 +64,217 @@ class BookingWorkflow:
         "breakfast_included",
     ]
 
-    def __init__(self, db_path: str = "conversation_history.db", debug: bool = False):
+    # Nodes whose chain writes the response shown to the user, streamed token by token
+    RESPONSE_NODES = ("generate_response", "summarize_booking", "ask_for_correction")
+
+    # Nodes that call a chain, and so may be given a deadline
+    LLM_NODES = (
+        "detect_intent",
+        "collect_information",
+        "change_information",
+        "generate_response",
+        "summarize_booking",
+        "ask_for_correction",
+    )
+
+    # Nodes that write to the reservations store. They never get a deadline: a sync node
+    # that misses one keeps running in its thread, and would still save the booking after
+    # the user was told the turn failed
+    WRITE_NODES = ("validate_information", "save_change")
+
+    def __init__(
+        self,
+        db_path: str = "conversation_history.db",
+        debug: bool = False,
+        llm=None,
+        durability: str = "per_node",
+        intent_fast_path: bool = False,
+        intent_confidence_threshold: float = 0.9,
+        local_extraction: bool = False,
+        dynamic_extraction_schema: bool = False,
+        combined_intent_extraction: bool = False,
+        speculative_extraction: bool = False,
+        chain_cache: Optional[ChainCache] = None,
+        model_router: Optional[ModelRouter] = None,
+        node_deadlines: Optional[dict[str, float]] = None,
+        hedger: Optional[Hedger] = None,
+        instrumentation: Optional[Instrumentation] = None,
+        profiler: Optional[Profiler] = None,
+        cassette: Optional[Cassette] = None,
+        busy_timeout: float = 5.0,
+        connection_per_thread: bool = False,
+        async_connections: int = 1,
+        template_responses: bool = False,
+        llm_response_nodes: tuple = (),
+        reservations: Optional[ReservationStore] = None,
+    ):
         """
         Initializes the BookingWorkflow.
 
         Args:
             db_path (str): Path to the SQLite database.
             debug (bool): If True, enables debug mode to print state before and after each node execution.
+            llm: Optional chat model shared by all chains instead of the default gpt-4o clients.
+            durability (str): When the conversation state is persisted: "per_node" after every node,
+                "end_of_turn" once when the graph reaches END, or "none" to disable checkpoints.
+            intent_fast_path (bool): If True, obvious intents are settled by local rules and
+                intent_chain is only called when the rules are unsure.
+            intent_confidence_threshold (float): Minimum rule confidence to skip intent_chain.
+            local_extraction (bool): If True, dates, number of guests, payment method and breakfast
+                are parsed locally and booking_info_chain is only called for what remains.
+            dynamic_extraction_schema (bool): If True, the extraction prompt and output schema only
+                ask for the fields in not_filled_keys, with one chain cached per set of fields.
+            combined_intent_extraction (bool): If True, detect_intent classifies the intent and extracts
+                the booking fields in a single call, and collect_information reuses those fields.
+            speculative_extraction (bool): If True, while a reservation is in progress detect_intent runs
+                booking_info_chain concurrently with intent_chain and keeps the result only if the
+                intent is "make a reservation".
+            chain_cache (ChainCache): Optional result cache shared by the temperature 0 chains;
+                correction_chain is never cached.
+            model_router (ModelRouter): Optional per-chain model routing, with intent_chain and
+                booking_info_chain running on a fast model first. Takes precedence over `llm`.
+            node_deadlines (dict): Seconds each listed node may take. A turn whose node misses its
+                deadline is answered with a template fallback instead of raising. The
+                WRITE_NODES cannot be given one.
+            hedger (Hedger): Optional hedging of slow chain calls with a duplicate request.
+            instrumentation (Instrumentation): Optional per-node timing, token and checkpoint
+                metrics, with sampled structured traces of whole turns.
+            profiler (Profiler): Optional profiler; turns run inside `profiler.profile()` are
+                sampled, including the threads their nodes run in, and broken down by node.
+            cassette (Cassette): Optional record/replay of every chain call, for runs without
+                the network.
+            busy_timeout (float): Seconds a checkpoint read or write waits for a lock held by
+                another connection or process before failing.
+            connection_per_thread (bool): If True, the sync graph opens one SQLite connection per
+                thread instead of sharing one behind a lock.
+            async_connections (int): Number of aiosqlite connections of the async graph; the
+                conversations are spread over them by thread_id.
+            template_responses (bool): If True, next questions, booking summaries and correction
+                requests are rendered from templates; the LLM only answers the "other" intent
+                and the cases without a template.
+            llm_response_nodes (tuple): Response nodes that keep calling the LLM when
+                template_responses is on.
+            reservations (ReservationStore): Optional store of the confirmed bookings. A booking
+                that passes validation with nothing missing is saved there, and "check" and
+                "change reservation" turns load it by the booking reference in the message, or
+                by guest name when the conversation holds no other booking details. If the
+                store has room types, dates and guests no room is free for are sent back to
+                the guest for correction, when a booking is made or changed.
         """
+        if durability not in DURABILITY_MODES:
+            raise ValueError(
+                f"Invalid durability {durability!r}. Choose from: {', '.join(DURABILITY_MODES)}."
+            )
         self.debug = debug
+        self.db_path = db_path
+        self.durability = durability
+        self.busy_timeout = busy_timeout
+        self.async_connections = async_connections
+        self.instrumentation = instrumentation
+        self.profiler = profiler
 
         # Initialize chains
-        self.intent_chain = create_intent_chain()
-        self.booking_info_chain = create_booking_info_chain()
-        self.booking_change_chain = create_booking_change_chain()
-        self.response_chain = create_response_generation_chain()
-        self.summarization_chain = create_summarization_chain()
-        self.correction_chain = create_correction_chain()
+        self.chain_cache = chain_cache
+        self.model_router = model_router
+        self.hedger = hedger
+        self.cassette = cassette
+        self._chain_options = chain_options = {
+            "cache": chain_cache,
+            "router": model_router,
+            "hedger": hedger,
+            "cassette": cassette,
+        }
+        self.intent_chain = create_intent_chain(llm, **chain_options)
+        self.booking_info_chain = create_booking_info_chain(llm, **chain_options)
+        self.booking_change_chain = create_booking_change_chain(llm, **chain_options)
+        self.response_chain = create_response_generation_chain(llm, **chain_options)
+        self.summarization_chain = create_summarization_chain(llm, **chain_options)
+        self.correction_chain = create_correction_chain(
+            llm, router=model_router, hedger=hedger, cassette=cassette
+        )
+        self.intent_and_booking_info_chain = (
+            create_intent_and_booking_info_chain(llm, **chain_options)
+            if combined_intent_extraction
+            else None
+        )
+        self.intent_classifier = (
+            IntentPreClassifier(intent_confidence_threshold) if intent_fast_path else None
+        )
+        self.local_extractor = LocalBookingExtractor() if local_extraction else None
+        self.dynamic_extraction_schema = dynamic_extraction_schema
+        self._llm = llm
+        self._booking_info_chains = {}
+        self.speculation_stats = SpeculationStats() if speculative_extraction else None
+        self.response_templates = ResponseTemplates() if template_responses else None
+        self.llm_response_nodes = tuple(llm_response_nodes)
+        self.reservations = reservations
+
+        # Nodes missing their deadline are abandoned, sync ones are run in worker threads
+        self.node_deadlines = node_deadlines or {}
+        writes = set(self.node_deadlines) & set(self.WRITE_NODES)
+        if writes:
+            raise ValueError(f"Nodes writing bookings cannot have a deadline: {sorted(writes)}")
+        self._deadline_executor = (
+            ThreadPoolExecutor(thread_name_prefix="node") if self.node_deadlines else None
+        )
 
         # Setup state graph
         self.workflow = StateGraph(BookingState)
         self._setup_graph()
 
-        # Setup SQLite checkpointer
-        self.conn = sqlite3.connect(db_path, check_same_thread=False)
-        self.checkpointer = SqliteSaver(self.conn)
+        # Setup SQLite checkpointer, in WAL mode so several processes can share the database
+        if connection_per_thread:
+            self.saver = ThreadLocalSqliteSaver(db_path, busy_timeout)
+            self.conn = self.saver.conn
+        else:
+            self.conn = connect_sqlite(db_path, busy_timeout)
+            self.saver = SqliteSaver(self.conn)
+        self.checkpointer = self._wrap_checkpointer(self.saver)
 
         # Compile the graph
         self.app = self.workflow.compile(checkpointer=self.checkpointer)
 
+        # The async graph needs aiosqlite connections, which can only be opened
+        # inside a running event loop, so it is compiled on the first arun_graph call
+        self.aconn = None
+        self.aconns = []
+        self.async_checkpointer = None
+        self.async_app = None
+        self._async_app_lock = asyncio.Lock()
+
     def _setup_graph(self):
-        # Define state transitions
-        self.workflow.add_node("detect_intent", self.detect_intent)
-        self.workflow.add_node("collect_information", self.collect_information)
-        self.workflow.add_node("validate_information", self.validate_information)
-        self.workflow.add_node("generate_response", self.generate_response)
-        self.workflow.add_node("summarize_booking", self.summarize_booking)
-        self.workflow.add_node("change_information", self.change_information)
-        self.workflow.add_node("ask_for_correction", self.ask_for_correction)
+        # Define state transitions. Every node has a sync and an async implementation,
+        # so the same graph serves both run_graph and arun_graph.
+        self.workflow.add_node(
+            "detect_intent", self._node("detect_intent", self.detect_intent, self.adetect_intent)
+        )
+        self.workflow.add_node(
+            "collect_information",
+            self._node("collect_information", self.collect_information, self.acollect_information),
+        )
+        self.workflow.add_node(
+            "validate_information",
+            self._node("validate_information", self.validate_information, None),
+        )
+        self.workflow.add_node(
+            "generate_response",
+            self._node("generate_response", self.generate_response, self.agenerate_response),
+        )
+        self.workflow.add_node(
+            "summarize_booking",
+            self._node("summarize_booking", self.summarize_booking, self.asummarize_booking),
+        )
+        self.workflow.add_node(
+            "change_information",
+            self._node("change_information", self.change_information, self.achange_information),
+        )
+        self.workflow.add_node(
+            "save_change", self._node("save_change", self.save_change, None)
+        )
+        self.workflow.add_node(
+            "ask_for_correction",
+            self._node("ask_for_correction", self.ask_for_correction, self.aask_for_correction),
+        )
 
         # Define edges
         self.workflow.set_entry_point("detect_intent")
@@ -99,11 +304,125 @@ class BookingWorkflow:
             },
         )
 
-        self.workflow.add_edge("change_information", "summarize_booking")
+        # The change is saved in a node of its own, outside the deadline of change_information
+        self.workflow.add_edge("change_information", "save_change")
+        self.workflow.add_conditional_edges(
+            "save_change",
+            lambda state: "ask_for_correction"
+            if not state.get("valid_info", True)
+            else "summarize_booking",
+            {
+                "ask_for_correction": "ask_for_correction",
+                "summarize_booking": "summarize_booking",
+            },
+        )
         self.workflow.add_edge("generate_response", END)
         self.workflow.add_edge("summarize_booking", END)
         self.workflow.add_edge("ask_for_correction", END)
 
+    def _node(self, name: str, func, afunc) -> RunnableLambda:
+        """
+        Returns the runnable of a node, enforcing its deadline if it has one and timing it
+        if the workflow is instrumented or profiled.
+        """
+        # Innermost, so a node moved to a deadline thread is sampled in that thread
+        if self.profiler is not None:
+            func, afunc = self.profiler.wrap_node(name, func, afunc)
+        if name in self.node_deadlines:
+            func, afunc = with_deadline(
+                name, func, afunc, self.node_deadlines[name], self._deadline_executor
+            )
+        if self.instrumentation is not None:
+            func, afunc = self.instrumentation.wrap_node(name, func, afunc)
+        return RunnableLambda(func, afunc=afunc, name=name)
+
+    def _wrap_checkpointer(self, saver):
+        """
+        Applies the durability mode to a checkpoint saver.
+        """
+        if self.durability == "none":
+            return None
+        if self.instrumentation is not None:
+            saver = TimedCheckpointSaver(saver, self.instrumentation)
+        if self.durability == "end_of_turn":
+            return EndOfTurnCheckpointSaver(saver)
+        return saver
+
+    @contextmanager
+    def _turn(self, config: dict):
+        """
+        Yields the config to run a turn with, which the instrumentation times and may trace.
+        In template mode the turn's chat model calls are counted.
+        """
+        counter = None
+        if self.response_templates is not None:
+            counter = ChatModelCallCounter()
+            config = {**config, "callbacks": [*(config.get("callbacks") or []), counter]}
+        start = time.perf_counter()
+        context = (
+            self.instrumentation.turn(config)
+            if self.instrumentation is not None
+            else nullcontext(config)
+        )
+        with context as run_config:
+            yield run_config
+        if counter is not None:
+            self.response_templates.record_turn(counter.calls, time.perf_counter() - start)
+
+    def _invoke(self, payload, config: dict) -> dict:
+        """
+        Runs the sync graph and, in end-of-turn mode, persists the turn's last checkpoint.
+        A turn whose node misses its deadline returns the fallback state instead.
+        """
+        try:
+            with self._turn(config) as run_config:
+                if not isinstance(self.checkpointer, EndOfTurnCheckpointSaver):
+                    return self.app.invoke(payload, config=run_config)
+                try:
+                    result = self.app.invoke(payload, config=run_config)
+                except BaseException:
+                    self.checkpointer.discard(config)
+                    raise
+                self.checkpointer.flush(config)
+                return result
+        except NodeDeadlineExceeded as exceeded:
+            stored = self.app.get_state(config).values if self.checkpointer is not None else {}
+            return self._deadline_fallback(stored, payload, exceeded)
+
+    async def _ainvoke(self, app, payload, config: dict) -> dict:
+        """
+        Asynchronous version of _invoke.
+        """
+        try:
+            with self._turn(config) as run_config:
+                if not isinstance(self.async_checkpointer, EndOfTurnCheckpointSaver):
+                    return await app.ainvoke(payload, config=run_config)
+                try:
+                    result = await app.ainvoke(payload, config=run_config)
+                except BaseException:
+                    self.async_checkpointer.discard(config)
+                    raise
+                await self.async_checkpointer.aflush(config)
+                return result
+        except NodeDeadlineExceeded as exceeded:
+            stored = (
+                (await app.aget_state(config)).values
+                if self.async_checkpointer is not None
+                else {}
+            )
+            return self._deadline_fallback(stored, payload, exceeded)
+
+    def _deadline_fallback(
+        self, stored: dict, payload: dict, exceeded: NodeDeadlineExceeded
+    ) -> dict:
+        """
+        Returns the state of a turn cut short by a node deadline: the latest stored state
+        with the template fallback as response.
+        """
+        state = {**stored, **payload}
+        state["response"] = fallback_response(state, exceeded.node, self.durability == "per_node")
+        return state
+
     def _print_state(self, state: dict, message: str):
         """
         Helper method to print the current state in a formatted manner.
@@ -116,16 +435,307 @@ class BookingWorkflow:
         print(json.dumps(state, indent=4, default=str))
         print("========================\n")
 
-    def detect_intent(self, state: BookingState) -> BookingState:
-        if self.debug:
-            self._print_state(state, "Before detect_intent")
+    def _booking_payload(self, state: BookingState) -> dict:
+        """
+        Collects the booking fields of the state into a chain payload.
+
+        Args:
+            state (dict): The current state of the booking.
+
+        Returns:
+            dict: The six booking fields, None for the ones not filled yet.
+        """
+        return {key: state.get(key) for key in self.NECESSARY_INFORMATION}
 
-        payload = {
+    def _intent_payload(self, state: BookingState) -> dict:
+        return {
             "assistant_question": state["response"] if "response" in state else None,
             "answer": state["user_message"],
         }
-        result = self.intent_chain.invoke(payload)
-        state["intent"] = result.intent
+
+    def _store_extracted_info(self, state: BookingState, result) -> str:
+        """
+        Keeps the booking fields of a combined intent and extraction result for collect_information.
+
+        Returns:
+            str: The classified intent.
+        """
+        state["extracted_info"] = result.dict(exclude={"intent"})
+        return result.intent
+
+    def _should_speculate(self, state: BookingState) -> bool:
+        # Speculate only while a reservation is in progress, when the turn will most likely
+        # end up in collect_information
+        return (
+            self.speculation_stats is not None
+            and state.get("intent") == "make a reservation"
+            and len(state.get("not_filled_keys") or []) > 0
+        )
+
+    def _speculative_chain(self, state: BookingState):
+        """
+        Builds a chain running intent detection and slot extraction concurrently.
+
+        Returns:
+            tuple: The parallel chain and the callback counting the extraction's tokens.
+        """
+        usage = TokenUsageCallback()
+        chain = RunnableParallel(
+            intent=self.intent_chain,
+            booking_info=self._booking_info_chain_for(state).with_config(callbacks=[usage]),
+        )
+        return chain, usage
+
+    def _speculative_payload(self, state: BookingState) -> dict:
+        # Each prompt only reads its own variables, so both chains can share one input
+        return {**self._intent_payload(state), "message": state["user_message"]}
+
+    def _commit_speculation(self, state: BookingState, result: dict, usage) -> str:
+        """
+        Keeps the speculative extraction if the turn is a reservation turn, drops it otherwise.
+
+        Returns:
+            str: The classified intent.
+        """
+        intent = result["intent"].intent
+        committed = intent == "make a reservation"
+        self.speculation_stats.record(committed, usage.tokens)
+        if committed:
+            state["extracted_info"] = result["booking_info"].dict()
+        return intent
+
+    def _fast_intent(self, state: BookingState):
+        """
+        Returns the intent predicted by the local rules, or None if intent_chain is needed.
+        """
+        if self.intent_classifier is None:
+            return None
+        return self.intent_classifier.predict(
+            state["user_message"],
+            state.get("not_filled_keys"),
+            state.get("response"),
+            state.get("intent"),
+        )
+
+    def _extract_without_chain(self, state: BookingState) -> bool:
+        """
+        Fills what is known without calling booking_info_chain: the fixed-format fields found
+        by the local extractor and the fields extracted together with the intent.
+
+        Returns:
+            bool: Whether booking_info_chain still has to be called for this message.
+        """
+        needs_llm = len(state["not_filled_keys"]) > 0
+        if self.local_extractor is not None:
+            extracted_info, needs_llm = self.local_extractor.extract(
+                state["user_message"], state["not_filled_keys"], state.get("response")
+            )
+            self._apply_extracted_info(state, extracted_info)
+
+        if state.get("extracted_info") is not None:
+            self._apply_extracted_info(state, BookingInfo(**state["extracted_info"]))
+            state["extracted_info"] = None
+            needs_llm = False
+
+        return needs_llm
+
+    def _booking_info_chain_for(self, state: BookingState):
+        """
+        Returns the extraction chain for the fields still missing, building it on first use.
+        """
+        missing = frozenset(state["not_filled_keys"]) & set(self.NECESSARY_INFORMATION)
+        if not self.dynamic_extraction_schema or missing == set(self.NECESSARY_INFORMATION):
+            return self.booking_info_chain
+        chain = self._booking_info_chains.get(missing)
+        if chain is None:
+            fields = [key for key in self.NECESSARY_INFORMATION if key in missing]
+            chain = create_booking_info_chain(self._llm, fields, **self._chain_options)
+            self._booking_info_chains[missing] = chain
+        return chain
+
+    def _apply_extracted_info(
+        self, state: BookingState, extracted_info: BookingInfo
+    ) -> BookingState:
+        # Update the state with the extracted information, only for keys still missing
+        for key in self.NECESSARY_INFORMATION:
+            value = getattr(extracted_info, key, None)
+            if value is not None and key in state["not_filled_keys"]:
+                state[key] = value
+                state["not_filled_keys"].remove(key)
+
+        return state
+
+    def _apply_changed_info(
+        self, state: BookingState, info_to_change: BookingInfo
+    ) -> BookingState:
+        # Change the information requested by the user
+        for key, value in info_to_change.dict().items():
+            if value is not None:
+                state[key] = value
+                if key in state["not_filled_keys"]:
+                    state["not_filled_keys"].remove(key)
+
+        # Change intent back to make a reservation in case there is still information to be collected
+        if len(state["not_filled_keys"]) > 0:
+            state["intent"] = "make a reservation"
+        else:
+            state["intent"] = "check reservation"
+
+        return state
+
+    def _load_reservation(self, state: BookingState):
+        """
+        Replaces the booking fields of the state with the stored booking whose reference the
+        user gave. Only a reference loads a booking into the conversation, where it can be
+        changed: see _booking_by_name for a guest who only gives their name.
+        """
+        if self.reservations is None:
+            return
+        reference = find_reference(state.get("user_message"))
+        if reference is None or reference == state.get("booking_reference"):
+            return
+        booking = self.reservations.get(reference)
+        if booking is None:
+            return
+        for key in self.NECESSARY_INFORMATION:
+            state[key] = booking[key]
+        state["booking_reference"] = booking["reference"]
+        state["not_filled_keys"] = []
+
+    def _booking_by_name(self, state: BookingState) -> Optional[dict]:
+        """
+        Returns the latest stored booking of the guest if the state has their exact name (up
+        to case and spacing) and no other booking details, e.g. a client that only sends the
+        name back. It is only shown, never put in the state: two guests can share a name,
+        and a name is no proof of whose booking it is, so changing it takes the reference.
+        """
+        if (
+            self.reservations is None
+            or state.get("booking_reference") is not None
+            or not state.get("full_name")
+            or any(
+                state.get(key) is not None
+                for key in self.NECESSARY_INFORMATION
+                if key != "full_name"
+            )
+        ):
+            return None
+        bookings = self.reservations.find_by_name(state["full_name"], limit=1)
+        return bookings[0] if bookings else None
+
+    def _summary_view(self, state: BookingState) -> BookingState:
+        # The state to summarize: a booking found by name is shown without its reference
+        booking = self._booking_by_name(state)
+        if booking is None:
+            return state
+        view = dict(state)
+        view.update({key: booking[key] for key in self.NECESSARY_INFORMATION})
+        view["not_filled_keys"] = []
+        return view
+
+    def _room_errors(self, state: BookingState) -> list[tuple[str, list[str]]]:
+        """
+        Checks that a room is free for the guests and dates of the state, once all three are
+        known and valid; the booking's own room does not count against a change of it.
+        """
+        if self.reservations is None or self.reservations.rooms is None:
+            return []
+        stay = {key: state.get(key) for key in ("check_in_date", "check_out_date", "num_guests")}
+        if None in stay.values() or booking_errors(stay):
+            return []
+        try:
+            self.reservations.room_for(
+                state["num_guests"],
+                state["check_in_date"],
+                state["check_out_date"],
+                state.get("booking_reference"),
+            )
+        except RoomUnavailableError as error:
+            return [(str(error), error.fields)]
+        return []
+
+    def _save_reservation(self, state: BookingState) -> list[tuple[str, list[str]]]:
+        """
+        Saves a complete and valid booking to the reservations store, updating its stored
+        copy if it already has a reference. Returns the error that kept it from being saved
+        if its room was taken in the meantime.
+        """
+        if self.reservations is None or state.get("not_filled_keys"):
+            return []
+        booking = self._booking_payload(state)
+        if any(value is None for value in booking.values()) or booking_errors(booking):
+            return []
+        try:
+            state["booking_reference"] = self.reservations.save(
+                booking, state.get("booking_reference")
+            )
+        except RoomUnavailableError as error:
+            return [(str(error), error.fields)]
+        return []
+
+    def _set_errors(self, state: BookingState, errors: list[tuple[str, list[str]]]):
+        # The fields of every error are asked for again
+        for _, keys in errors:
+            state.setdefault("not_filled_keys", []).extend(keys)
+        state["valid_info"] = len(errors) == 0
+        state["error"] = [message for message, _ in errors]
+
+    def _template_response(self, node: str, state: BookingState) -> Optional[str]:
+        """
+        Returns the node's response rendered from a template, None if the LLM has to answer.
+        """
+        if self.response_templates is None or node in self.llm_response_nodes:
+            return None
+        return self.response_templates.render(node, state)
+
+    def _correction_payload(self, state: BookingState) -> dict:
+        payload = self._booking_payload(state)
+        payload["errors"] = state.get("error")
+        return payload
+
+    def detect_intent(self, state: BookingState) -> BookingState:
+        if self.debug:
+            self._print_state(state, "Before detect_intent")
+
+        intent = self._fast_intent(state)
+        if self.intent_and_booking_info_chain is not None or self.speculation_stats is not None:
+            # Fields extracted on an earlier turn must not be applied to this one
+            state["extracted_info"] = None
+        if intent is None and self.intent_and_booking_info_chain is not None:
+            result = self.intent_and_booking_info_chain.invoke(self._intent_payload(state))
+            intent = self._store_extracted_info(state, result)
+        elif intent is None and self._should_speculate(state):
+            chain, usage = self._speculative_chain(state)
+            result = chain.invoke(self._speculative_payload(state))
+            intent = self._commit_speculation(state, result, usage)
+        if intent is None:
+            intent = self.intent_chain.invoke(self._intent_payload(state)).intent
+        state["intent"] = intent
+
+        if self.debug:
+            self._print_state(state, "After detect_intent")
+
+        return state
+
+    async def adetect_intent(self, state: BookingState) -> BookingState:
+        if self.debug:
+            self._print_state(state, "Before detect_intent")
+
+        intent = self._fast_intent(state)
+        if self.intent_and_booking_info_chain is not None or self.speculation_stats is not None:
+            state["extracted_info"] = None
+        if intent is None and self.intent_and_booking_info_chain is not None:
+            result = await self.intent_and_booking_info_chain.ainvoke(
+                self._intent_payload(state)
+            )
+            intent = self._store_extracted_info(state, result)
+        elif intent is None and self._should_speculate(state):
+            chain, usage = self._speculative_chain(state)
+            result = await chain.ainvoke(self._speculative_payload(state))
+            intent = self._commit_speculation(state, result, usage)
+        if intent is None:
+            intent = (await self.intent_chain.ainvoke(self._intent_payload(state))).intent
+        state["intent"] = intent
 
         if self.debug:
             self._print_state(state, "After detect_intent")
@@ -136,48 +746,27 @@ class BookingWorkflow:
         if self.debug:
             self._print_state(state, "Before collect_information")
 
-        # Invoke the booking_info_chain to extract booking information
-        extracted_info = self.booking_info_chain.invoke({
-            "message": state["user_message"]
-        })
+        # Invoke the booking_info_chain to extract booking information the local rules could not
+        if self._extract_without_chain(state):
+            extracted_info = self._booking_info_chain_for(state).invoke({
+                "message": state["user_message"]
+            })
+            self._apply_extracted_info(state, extracted_info)
 
-        # Update the state with the extracted information
-        if (
-            extracted_info.full_name is not None
-            and "full_name" in state["not_filled_keys"]
-        ):
-            state["full_name"] = extracted_info.full_name
-            state["not_filled_keys"].remove("full_name")
-        if (
-            extracted_info.check_in_date is not None
-            and "check_in_date" in state["not_filled_keys"]
-        ):
-            state["check_in_date"] = extracted_info.check_in_date
-            state["not_filled_keys"].remove("check_in_date")
-        if (
-            extracted_info.check_out_date is not None
-            and "check_out_date" in state["not_filled_keys"]
-        ):
-            state["check_out_date"] = extracted_info.check_out_date
-            state["not_filled_keys"].remove("check_out_date")
-        if (
-            extracted_info.num_guests is not None
-            and "num_guests" in state["not_filled_keys"]
-        ):
-            state["num_guests"] = extracted_info.num_guests
-            state["not_filled_keys"].remove("num_guests")
-        if (
-            extracted_info.payment_method is not None
-            and "payment_method" in state["not_filled_keys"]
-        ):
-            state["payment_method"] = extracted_info.payment_method
-            state["not_filled_keys"].remove("payment_method")
-        if (
-            extracted_info.breakfast_included is not None
-            and "breakfast_included" in state["not_filled_keys"]
-        ):
-            state["breakfast_included"] = extracted_info.breakfast_included
-            state["not_filled_keys"].remove("breakfast_included")
+        if self.debug:
+            self._print_state(state, "After collect_information")
+
+        return state
+
+    async def acollect_information(self, state: BookingState) -> BookingState:
+        if self.debug:
+            self._print_state(state, "Before collect_information")
+
+        if self._extract_without_chain(state):
+            extracted_info = await self._booking_info_chain_for(state).ainvoke({
+                "message": state["user_message"]
+            })
+            self._apply_extracted_info(state, extracted_info)
 
         if self.debug:
             self._print_state(state, "After collect_information")
@@ -188,110 +777,57 @@ class BookingWorkflow:
         if self.debug:
             self._print_state(state, "Before change_information")
 
+        # A booking named by its reference is loaded before the change is applied to it
+        self._load_reservation(state)
         # Invoke the booking_change_chain to identify the booking information that needs to be changed
-        payload = {
-            "message": state["user_message"],
-            "full_name": state.get("full_name"),
-            "check_in_date": state.get("check_in_date"),
-            "check_out_date": state.get("check_out_date"),
-            "num_guests": state.get("num_guests"),
-            "payment_method": state.get("payment_method"),
-            "breakfast_included": state.get("breakfast_included"),
-        }
+        payload = {"message": state["user_message"], **self._booking_payload(state)}
         info_to_change = self.booking_change_chain.invoke(payload)
+        self._apply_changed_info(state, info_to_change)
 
-        # Change the information requested by the user
-        for key, value in info_to_change.dict().items():
-            if value is not None:
-                state[key] = value
-                if key in state["not_filled_keys"]:
-                    state["not_filled_keys"].remove(key)
+        if self.debug:
+            self._print_state(state, "After change_information")
 
-        # Change intent back to make a reservation in case there is still information to be collected
-        if len(state["not_filled_keys"]) > 0:
-            state["intent"] = "make a reservation"
-        else:
-            state["intent"] = "check reservation"
+        return state
+
+    async def achange_information(self, state: BookingState) -> BookingState:
+        if self.debug:
+            self._print_state(state, "Before change_information")
+
+        self._load_reservation(state)
+        payload = {"message": state["user_message"], **self._booking_payload(state)}
+        info_to_change = await self.booking_change_chain.ainvoke(payload)
+        self._apply_changed_info(state, info_to_change)
 
         if self.debug:
             self._print_state(state, "After change_information")
 
         return state
 
+    def save_change(self, state: BookingState) -> BookingState:
+        if self.debug:
+            self._print_state(state, "Before save_change")
+
+        # A change to dates or guests no room is free for is not saved and goes to
+        # ask_for_correction instead of the summary
+        self._set_errors(state, self._room_errors(state) or self._save_reservation(state))
+
+        if self.debug:
+            self._print_state(state, "After save_change")
+
+        return state
+
     def validate_information(self, state: BookingState) -> BookingState:
         if self.debug:
             self._print_state(state, "Before validate_information")
 
-        def is_valid_date_format(date_string):
-            pattern = r"^\d{4}-\d{2}-\d{2}$"
-            if not re.match(pattern, date_string):
-                return False
-            try:
-                datetime.strptime(date_string, "%Y-%m-%d")
-                return True
-            except ValueError:
-                return False
-
-        errors = []
-
-        # Validate full_name
-        if "full_name" in state and len(state["full_name"]) < 3:
-            errors.append("Full name must be at least 3 characters long.")
-            state.setdefault("not_filled_keys", []).append("full_name")
-
-        # Validate check_in_date
-        if "check_in_date" in state:
-            if not is_valid_date_format(state["check_in_date"]):
-                errors.append("Check-in date format is invalid (YYYY-MM-DD).")
-                state.setdefault("not_filled_keys", []).append("check_in_date")
-            elif (
-                datetime.strptime(state["check_in_date"], "%Y-%m-%d") < datetime.today()
-            ):
-                errors.append("Check-in date cannot be in the past.")
-                state.setdefault("not_filled_keys", []).append("check_in_date")
-
-        # Validate check_out_date
-        if "check_out_date" in state:
-            if not is_valid_date_format(state["check_out_date"]):
-                errors.append("Check-out date format is invalid (YYYY-MM-DD).")
-                state.setdefault("not_filled_keys", []).append("check_out_date")
-            elif (
-                datetime.strptime(state["check_out_date"], "%Y-%m-%d")
-                < datetime.today()
-            ):
-                errors.append("Check-out date cannot be in the past.")
-                state.setdefault("not_filled_keys", []).append("check_out_date")
-
-        # Validate date order
-        if "check_in_date" in state and "check_out_date" in state:
-            if datetime.strptime(
-                state["check_out_date"], "%Y-%m-%d"
-            ) <= datetime.strptime(state["check_in_date"], "%Y-%m-%d"):
-                errors.append("Check-out date must be after check-in date.")
-                state.setdefault("not_filled_keys", []).extend([
-                    "check_in_date",
-                    "check_out_date",
-                ])
-
-        # Validate num_guests
-        if "num_guests" in state and state["num_guests"] <= 0:
-            errors.append("Number of guests must be positive.")
-            state.setdefault("not_filled_keys", []).append("num_guests")
-
-        # Validate payment_method
-        valid_payment_methods = ["credit card", "debit card", "cash", "paypal"]
-        if (
-            "payment_method" in state
-            and state["payment_method"].lower() not in valid_payment_methods
-        ):
-            errors.append(
-                f"Invalid payment method. Please choose from: {', '.join(valid_payment_methods)}."
-            )
-            state.setdefault("not_filled_keys", []).append("payment_method")
+        # The rooms are only looked at once the fields are valid, and looked at again when
+        # the booking is saved, since another one may have taken the last room in between
+        errors = booking_errors(state) or self._room_errors(state)
+        if not errors:
+            errors = self._save_reservation(state)
 
         # Update the state
-        state["valid_info"] = len(errors) == 0
-        state["error"] = errors
+        self._set_errors(state, errors)
 
         if self.debug:
             self._print_state(state, "After validate_information")
@@ -302,17 +838,24 @@ class BookingWorkflow:
         if self.debug:
             self._print_state(state, "Before generate_response")
 
-        payload = {
-            "intent": state["intent"],
-            "full_name": state.get("full_name"),
-            "check_in_date": state.get("check_in_date"),
-            "check_out_date": state.get("check_out_date"),
-            "num_guests": state.get("num_guests"),
-            "payment_method": state.get("payment_method"),
-            "breakfast_included": state.get("breakfast_included"),
-        }
+        state["response"] = self._template_response("generate_response", state)
+        if state["response"] is None:
+            payload = {"intent": state["intent"], **self._booking_payload(state)}
+            state["response"] = self.response_chain.invoke(input=payload)
+
+        if self.debug:
+            self._print_state(state, "After generate_response")
+
+        return state
+
+    async def agenerate_response(self, state: BookingState) -> BookingState:
+        if self.debug:
+            self._print_state(state, "Before generate_response")
 
-        state["response"] = self.response_chain.invoke(input=payload)
+        state["response"] = self._template_response("generate_response", state)
+        if state["response"] is None:
+            payload = {"intent": state["intent"], **self._booking_payload(state)}
+            state["response"] = await self.response_chain.ainvoke(input=payload)
 
         if self.debug:
             self._print_state(state, "After generate_response")
@@ -323,17 +866,36 @@ class BookingWorkflow:
         if self.debug:
             self._print_state(state, "Before summarize_booking")
 
-        payload = {
-            "intent": state["intent"],
-            "full_name": state.get("full_name"),
-            "check_in_date": state.get("check_in_date"),
-            "check_out_date": state.get("check_out_date"),
-            "num_guests": state.get("num_guests"),
-            "payment_method": state.get("payment_method"),
-            "breakfast_included": state.get("breakfast_included"),
-        }
+        self._load_reservation(state)
+        view = self._summary_view(state)
+        state["response"] = self._template_response("summarize_booking", view)
+        if state["response"] is None:
+            payload = {
+                "intent": state["intent"],
+                "booking_reference": view.get("booking_reference"),
+                **self._booking_payload(view),
+            }
+            state["response"] = self.summarization_chain.invoke(input=payload)
+
+        if self.debug:
+            self._print_state(state, "After summarize_booking")
+
+        return state
+
+    async def asummarize_booking(self, state: BookingState) -> BookingState:
+        if self.debug:
+            self._print_state(state, "Before summarize_booking")
 
-        state["response"] = self.summarization_chain.invoke(input=payload)
+        self._load_reservation(state)
+        view = self._summary_view(state)
+        state["response"] = self._template_response("summarize_booking", view)
+        if state["response"] is None:
+            payload = {
+                "intent": state["intent"],
+                "booking_reference": view.get("booking_reference"),
+                **self._booking_payload(view),
+            }
+            state["response"] = await self.summarization_chain.ainvoke(input=payload)
 
         if self.debug:
             self._print_state(state, "After summarize_booking")
@@ -344,18 +906,26 @@ class BookingWorkflow:
         if self.debug:
             self._print_state(state, "Before ask_for_correction")
 
-        payload = {
-            "full_name": state.get("full_name"),
-            "check_in_date": state.get("check_in_date"),
-            "check_out_date": state.get("check_out_date"),
-            "num_guests": state.get("num_guests"),
-            "payment_method": state.get("payment_method"),
-            "breakfast_included": state.get("breakfast_included"),
-            "errors": state.get("error"),
-        }
+        state["response"] = self._template_response("ask_for_correction", state)
+        if state["response"] is None:
+            state["response"] = self.correction_chain.invoke(
+                input=self._correction_payload(state)
+            )
 
-        state["response"] = self.correction_chain.invoke(input=payload)
-        print("next question: ", state["response"])
+        if self.debug:
+            self._print_state(state, "After ask_for_correction")
+
+        return state
+
+    async def aask_for_correction(self, state: BookingState) -> BookingState:
+        if self.debug:
+            self._print_state(state, "Before ask_for_correction")
+
+        state["response"] = self._template_response("ask_for_correction", state)
+        if state["response"] is None:
+            state["response"] = await self.correction_chain.ainvoke(
+                input=self._correction_payload(state)
+            )
 
         if self.debug:
             self._print_state(state, "After ask_for_correction")
@@ -377,7 +947,327 @@ class BookingWorkflow:
             payload["not_filled_keys"] = self.NECESSARY_INFORMATION.copy()
 
         config = {"configurable": {"thread_id": str(uuid.uuid4())}}
-        return self.app.invoke(payload, config=config)
+        return self._invoke(payload, config)
+
+    def _session_seed(self) -> dict:
+        return {"not_filled_keys": self.NECESSARY_INFORMATION.copy()}
+
+    def create_session(self) -> str:
+        """
+        Starts a server-side conversation by writing its initial checkpoint.
+
+        Returns:
+            str: The thread_id identifying the conversation in later turns.
+        """
+        thread_id = str(uuid.uuid4())
+        config = {"configurable": {"thread_id": thread_id}}
+        # Stored as if generate_response had just finished, so the first turn starts at the entry point
+        self.app.update_state(config, self._session_seed(), as_node="generate_response")
+        if isinstance(self.checkpointer, EndOfTurnCheckpointSaver):
+            self.checkpointer.flush(config)
+        return thread_id
+
+    def has_session(self, thread_id: str) -> bool:
+        """
+        Returns True if a session with this thread_id was created.
+        """
+        config = {"configurable": {"thread_id": thread_id}}
+        return bool(self.app.get_state(config).values)
+
+    def run_turn(self, thread_id: str, user_message: str) -> dict:
+        """
+        Runs one turn of a session, resuming from the state stored in its last checkpoint.
+
+        Args:
+            thread_id (str): Identifier returned by create_session.
+            user_message (str): The new message from the user.
+
+        Returns:
+            dict: The state of the conversation after the turn.
+        """
+        if not self.has_session(thread_id):
+            raise SessionNotFoundError(thread_id)
+        config = {"configurable": {"thread_id": thread_id}}
+        return self._invoke({"user_message": user_message}, config)
+
+    @staticmethod
+    def _batch_groups(items: list[dict]) -> list[list[int]]:
+        """
+        Splits the indices of a batch into groups run one after the other: the turns of a
+        session, in their order in the batch, and every stateless payload on its own.
+        """
+        groups: dict[Any, list[int]] = {}
+        for index, item in enumerate(items):
+            groups.setdefault(item.get("thread_id", ("payload", index)), []).append(index)
+        return list(groups.values())
+
+    def _run_batch_item(self, item: dict) -> dict:
+        if "thread_id" in item:
+            return self.run_turn(item["thread_id"], item["user_message"])
+        return self.run_graph(dict(item))
+
+    def run_graph_batch(self, items: list[dict], max_concurrency: int = 8) -> list:
+        """
+        Runs many payloads and session turns concurrently in threads.
+
+        Args:
+            items (list): Payloads as taken by run_graph, or session turns given as
+                {"thread_id": ..., "user_message": ...}. Turns of the same session run in the
+                order they appear, never at the same time.
+            max_concurrency (int): Maximum number of items running at once.
+
+        Returns:
+            list: For every item, in order, its final state or the exception it raised.
+        """
+        results: list = [None] * len(items)
+
+        def run_group(indices: list[int]):
+            for index in indices:
+                try:
+                    results[index] = self._run_batch_item(items[index])
+                except Exception as e:
+                    results[index] = e
+
+        groups = self._batch_groups(items)
+        with ThreadPoolExecutor(
+            max_workers=max(1, min(max_concurrency, len(groups))), thread_name_prefix="batch"
+        ) as executor:
+            list(executor.map(run_group, groups))
+        return results
+
+    def stream_turn(self, thread_id: str, user_message: str) -> Iterator[tuple[str, Any]]:
+        """
+        Runs one turn of a session like run_turn, yielding the response while it is generated.
+
+        Args:
+            thread_id (str): Identifier returned by create_session.
+            user_message (str): The new message from the user.
+
+        Yields:
+            tuple: ("token", text) for every piece of the response, then ("state", state)
+            with the state of the conversation after the turn.
+        """
+        config = {"configurable": {"thread_id": thread_id}}
+        if not self.app.get_state(config).values:
+            raise SessionNotFoundError(thread_id)
+
+        streamed, state = False, None
+        try:
+            with self._turn(config) as run_config:
+                for mode, chunk in self.app.stream(
+                    {"user_message": user_message},
+                    config=run_config,
+                    stream_mode=["messages", "values"],
+                ):
+                    if mode == "values":
+                        state = chunk
+                        continue
+                    text = self._response_token(*chunk)
+                    if text:
+                        streamed = True
+                        yield "token", text
+        except NodeDeadlineExceeded as exceeded:
+            if isinstance(self.checkpointer, EndOfTurnCheckpointSaver):
+                self.checkpointer.discard(config)
+            state = self._deadline_fallback(
+                self.app.get_state(config).values, {"user_message": user_message}, exceeded
+            )
+            # The fallback follows whatever part of the answer was already sent
+            yield "token", ("\n\n" if streamed else "") + state["response"]
+            streamed = True
+        except BaseException:
+            if isinstance(self.checkpointer, EndOfTurnCheckpointSaver):
+                self.checkpointer.discard(config)
+            raise
+        if isinstance(self.checkpointer, EndOfTurnCheckpointSaver):
+            self.checkpointer.flush(config)
+
+        # Cached answers never reach the chat model, so they are sent in one piece
+        if not streamed and state.get("response"):
+            yield "token", state["response"]
+        yield "state", state
+
+    def _response_token(self, message, metadata: dict) -> Optional[str]:
+        """
+        Returns the text of a streamed message chunk if it belongs to a response node.
+        """
+        if metadata.get("langgraph_node") not in self.RESPONSE_NODES:
+            return None
+        return message.content if isinstance(message.content, str) else None
+
+    async def _get_async_app(self):
+        """
+        Returns the graph compiled with an AsyncSqliteSaver, creating it on first use.
+        With several async connections, each has its own saver and the conversations are
+        sharded over them.
+        """
+        if self.async_app is None:
+            async with self._async_app_lock:
+                if self.async_app is None:
+                    for _ in range(self.async_connections):
+                        aconn = await aiosqlite.connect(self.db_path, timeout=self.busy_timeout)
+                        if self.db_path != ":memory:":
+                            await aconn.execute("PRAGMA journal_mode=WAL")
+                        self.aconns.append(aconn)
+                    self.aconn = self.aconns[0]
+                    savers = [AsyncSqliteSaver(aconn) for aconn in self.aconns]
+                    self.async_checkpointer = self._wrap_checkpointer(
+                        savers[0] if len(savers) == 1 else ShardedCheckpointSaver(savers)
+                    )
+                    self.async_app = self.workflow.compile(
+                        checkpointer=self.async_checkpointer
+                    )
+        return self.async_app
+
+    async def arun_graph(self, payload: dict) -> dict:
+        """
+        Asynchronous version of run_graph. Chain calls and checkpoint writes are awaited,
+        so many turns can be in flight on one event loop.
+
+        Args:
+            payload (dict): Initial payload containing at least the 'user_message' and other optional fields.
+
+        Returns:
+            dict: The final state after running the workflow.
+        """
+        if "not_filled_keys" not in payload:
+            payload["not_filled_keys"] = self.NECESSARY_INFORMATION.copy()
+
+        app = await self._get_async_app()
+        config = {"configurable": {"thread_id": str(uuid.uuid4())}}
+        return await self._ainvoke(app, payload, config)
+
+    async def acreate_session(self) -> str:
+        """
+        Asynchronous version of create_session.
+        """
+        app = await self._get_async_app()
+        thread_id = str(uuid.uuid4())
+        config = {"configurable": {"thread_id": thread_id}}
+        await app.aupdate_state(config, self._session_seed(), as_node="generate_response")
+        if isinstance(self.async_checkpointer, EndOfTurnCheckpointSaver):
+            await self.async_checkpointer.aflush(config)
+        return thread_id
+
+    async def arun_turn(self, thread_id: str, user_message: str) -> dict:
+        """
+        Asynchronous version of run_turn.
+        """
+        app = await self._get_async_app()
+        config = {"configurable": {"thread_id": thread_id}}
+        if not (await app.aget_state(config)).values:
+            raise SessionNotFoundError(thread_id)
+        return await self._ainvoke(app, {"user_message": user_message}, config)
+
+    async def _arun_batch_item(self, item: dict) -> dict:
+        if "thread_id" in item:
+            return await self.arun_turn(item["thread_id"], item["user_message"])
+        return await self.arun_graph(dict(item))
+
+    async def arun_graph_batch(self, items: list[dict], max_concurrency: int = 32) -> list:
+        """
+        Asynchronous version of run_graph_batch, running the items on the event loop.
+        """
+        results: list = [None] * len(items)
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def run_group(indices: list[int]):
+            async with semaphore:
+                for index in indices:
+                    try:
+                        results[index] = await self._arun_batch_item(items[index])
+                    except Exception as e:
+                        results[index] = e
+
+        await asyncio.gather(*(run_group(indices) for indices in self._batch_groups(items)))
+        return results
+
+    async def astream_turn(
+        self, thread_id: str, user_message: str
+    ) -> AsyncIterator[tuple[str, Any]]:
+        """
+        Asynchronous version of stream_turn.
+        """
+        app = await self._get_async_app()
+        config = {"configurable": {"thread_id": thread_id}}
+        if not (await app.aget_state(config)).values:
+            raise SessionNotFoundError(thread_id)
+
+        streamed, state = False, None
+        try:
+            with self._turn(config) as run_config:
+                async for mode, chunk in app.astream(
+                    {"user_message": user_message},
+                    config=run_config,
+                    stream_mode=["messages", "values"],
+                ):
+                    if mode == "values":
+                        state = chunk
+                        continue
+                    text = self._response_token(*chunk)
+                    if text:
+                        streamed = True
+                        yield "token", text
+        except NodeDeadlineExceeded as exceeded:
+            if isinstance(self.async_checkpointer, EndOfTurnCheckpointSaver):
+                self.async_checkpointer.discard(config)
+            state = self._deadline_fallback(
+                (await app.aget_state(config)).values, {"user_message": user_message}, exceeded
+            )
+            yield "token", ("\n\n" if streamed else "") + state["response"]
+            streamed = True
+        except BaseException:
+            if isinstance(self.async_checkpointer, EndOfTurnCheckpointSaver):
+                self.async_checkpointer.discard(config)
+            raise
+        if isinstance(self.async_checkpointer, EndOfTurnCheckpointSaver):
+            await self.async_checkpointer.aflush(config)
+
+        # Cached answers never reach the chat model, so they are sent in one piece
+        if not streamed and state.get("response"):
+            yield "token", state["response"]
+        yield "state", state
+
+    def maintain_checkpoints(
+        self,
+        keep_last: Optional[int] = 10,
+        ttl_seconds: Optional[float] = 7 * 24 * 3600,
+        vacuum_pages: Optional[int] = None,
+    ) -> dict:
+        """
+        Prunes and compacts the checkpoint store through the workflow's SQLite connection.
+
+        Args:
+            keep_last (int): Checkpoints kept per thread, no pruning if None.
+            ttl_seconds (float): Threads idle for longer than this are deleted, no expiry if None.
+            vacuum_pages (int): Maximum number of pages released by the incremental vacuum.
+
+        Returns:
+            dict: Sizes before and after, and how many checkpoints and threads were deleted.
+        """
+        # Make sure the checkpoint tables exist before they are inspected. The saver's
+        # connection is the calling thread's when there is one per thread
+        self.saver.setup()
+        return run_maintenance(
+            self.saver.conn,
+            db_path=self.db_path,
+            keep_last=keep_last,
+            ttl_seconds=ttl_seconds,
+            vacuum_pages=vacuum_pages,
+            lock=self.saver.lock,
+        )
+
+    async def aclose(self):
+        """
+        Closes the aiosqlite connections used by the async graph, if they were opened.
+        """
+        if self.aconns:
+            for aconn in self.aconns:
+                await aconn.close()
+            self.aconns = []
+            self.aconn = None
+            self.async_checkpointer = None
+            self.async_app = None
 
 
 # Example usage:
@@ -0,0 +1,72 @@
+"""
+Compares the blocking run_graph path with arun_graph on one event loop, using a fake
+chat model with a fixed latency per call.
+
+Usage (from src/):
+    python -m benchmarks.async_concurrency --latency 0.1 --concurrency 1 10 100 500
+"""
+
+import os
+import time
+import asyncio
+import argparse
+import tempfile
+
+from agent import BookingWorkflow
+from benchmarks.fake_llm import FakeChatModel
+
+
+def make_payload(i: int) -> dict:
+    return {"user_message": f"Hi, I would like to book a room ({i})"}
+
+
+async def run_async(workflow: BookingWorkflow, turns: int, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one_turn(i):
+        async with semaphore:
+            await workflow.arun_graph(make_payload(i))
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one_turn(i) for i in range(turns)))
+    return time.perf_counter() - start
+
+
+def run_sync(workflow: BookingWorkflow, turns: int) -> float:
+    start = time.perf_counter()
+    for i in range(turns):
+        workflow.run_graph(make_payload(i))
+    return time.perf_counter() - start
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        workflow = BookingWorkflow(
+            db_path=os.path.join(tmp, "bench.db"),
+            llm=FakeChatModel(latency=args.latency),
+        )
+
+        sync_turns = min(args.turns, 10)
+        elapsed = run_sync(workflow, sync_turns)
+        print(f"{'mode':<10}{'concurrency':>12}{'turns':>8}{'seconds':>10}{'turns/s':>10}")
+        print(f"{'sync':<10}{1:>12}{sync_turns:>8}{elapsed:>10.2f}{sync_turns / elapsed:>10.1f}")
+
+        for concurrency in args.concurrency:
+            turns = max(args.turns, concurrency)
+            elapsed = await run_async(workflow, turns, concurrency)
+            print(
+                f"{'async':<10}{concurrency:>12}{turns:>8}{elapsed:>10.2f}{turns / elapsed:>10.1f}"
+            )
+
+        await workflow.aclose()
+        workflow.conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.1, help="Seconds per fake LLM call")
+    parser.add_argument("--turns", type=int, default=100, help="Turns per concurrency level")
+    parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=[1, 10, 100, 500]
+    )
+    asyncio.run(main(parser.parse_args()))
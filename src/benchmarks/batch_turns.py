@@ -0,0 +1,156 @@
+"""
+Throughput of a backlog of queued turns: the same 1,000 turns of the scripted load-test
+conversations answered one call at a time, with arun_graph_batch and run_graph_batch at
+several concurrency limits, and through the /run_workflow/batch endpoint in-process.
+Every run checks that each turn ends in the same state as in the sequential run.
+
+Usage (from src/):
+    python -m benchmarks.batch_turns --turns 1000 --concurrency 8 32 128
+"""
+
+import os
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+
+from agent import BookingWorkflow
+from benchmarks.fake_llm import FakeChatModel
+from benchmarks.load_test import conversation_plan, scripted_responder
+
+# Fields compared between every run and the sequential one
+STATE_KEYS = ("intent", "full_name", "check_in_date", "check_out_date", "not_filled_keys")
+
+
+def queued_turns(count: int, seed: int) -> list[tuple[int, str]]:
+    """
+    Returns `count` turns as (conversation, message), interleaved across conversations the
+    way a channel backlog delivers them, each conversation's turns in order.
+    """
+    plan, total = [], 0
+    while total < count:
+        messages = conversation_plan(1, seed + len(plan))[0][: count - total]
+        plan.append(messages)
+        total += len(messages)
+    turns = []
+    for position in range(max(map(len, plan))):
+        turns.extend(
+            (conversation, messages[position])
+            for conversation, messages in enumerate(plan)
+            if position < len(messages)
+        )
+    return turns
+
+
+def summary(result) -> tuple:
+    if isinstance(result, Exception):
+        return (type(result).__name__,)
+    return tuple(str(result.get(key)) for key in STATE_KEYS)
+
+
+async def run(mode: str, concurrency: int, turns: list, args, directory: str) -> tuple[float, list]:
+    random.seed(args.seed)
+    llm = FakeChatModel(
+        latency_sampler=lambda: random.lognormvariate(0, 0.5) * args.median_latency,
+        responder=scripted_responder,
+    )
+    workflow = BookingWorkflow(
+        db_path=os.path.join(directory, f"{mode}-{concurrency}.db"),
+        llm=llm,
+        durability="end_of_turn",
+        connection_per_thread=mode == "threads",
+        async_connections=4,
+    )
+    conversations = {conversation for conversation, _ in turns}
+    thread_ids = {conversation: await workflow.acreate_session() for conversation in conversations}
+    items = [
+        {"thread_id": thread_ids[conversation], "user_message": message}
+        for conversation, message in turns
+    ]
+
+    start = time.perf_counter()
+    if mode == "sequential":
+        results = []
+        for item in items:
+            try:
+                results.append(await workflow.arun_turn(item["thread_id"], item["user_message"]))
+            except Exception as e:
+                results.append(e)
+    elif mode == "batch":
+        results = await workflow.arun_graph_batch(items, max_concurrency=concurrency)
+    elif mode == "threads":
+        results = await asyncio.to_thread(workflow.run_graph_batch, items, concurrency)
+    else:
+        results = await api_batch(workflow, items, concurrency)
+    elapsed = time.perf_counter() - start
+
+    await workflow.aclose()
+    if mode == "threads":
+        workflow.saver.close()
+    else:
+        workflow.conn.close()
+    return elapsed, [summary(result) for result in results]
+
+
+async def api_batch(workflow: BookingWorkflow, items: list[dict], concurrency: int) -> list:
+    import httpx
+    import hotel_booking_api
+
+    # The endpoint looks the workflow up at call time, so the fake one takes its place
+    hotel_booking_api.get_services().workflow = workflow
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=hotel_booking_api.app),
+        base_url="http://batch",
+        timeout=None,
+    ) as client:
+        response = await client.post(
+            "/run_workflow/batch", json={"items": items, "max_concurrency": concurrency}
+        )
+    response.raise_for_status()
+    return [
+        item["state"] if item["status"] == 200 else RuntimeError(item["error"])
+        for item in response.json()
+    ]
+
+
+async def main(args):
+    turns = queued_turns(args.turns, args.seed)
+    print(
+        f"{len(turns)} turns of {len({conversation for conversation, _ in turns})} conversations, "
+        f"{args.median_latency * 1000:.0f} ms median model latency\n"
+    )
+    print(f"{'mode':<12}{'limit':>7}{'seconds':>9}{'turns/s':>10}{'speedup':>9}{'errors':>8}{'same':>7}")
+    runs = [("sequential", 1)] + [
+        (mode, concurrency) for mode in args.modes for concurrency in args.concurrency
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        baseline = expected = None
+        for mode, concurrency in runs:
+            elapsed, results = await run(mode, concurrency, turns, args, directory)
+            baseline = baseline or elapsed
+            expected = expected or results
+            errors = sum(len(result) == 1 for result in results)
+            print(
+                f"{mode:<12}{concurrency:>7}{elapsed:>9.2f}{len(results) / elapsed:>10.1f}"
+                f"{baseline / elapsed:>8.1f}x{errors:>8}{str(results == expected):>7}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[8, 32, 128])
+    parser.add_argument(
+        "--modes", nargs="+", choices=("batch", "threads", "api"), default=["batch", "threads", "api"]
+    )
+    parser.add_argument("--median-latency", type=float, default=0.02, help="Seconds per model call")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # The API module builds its own workflow on first use; keep its database out of the tree
+    os.environ.setdefault("CONVERSATION_DB", os.path.join(tempfile.gettempdir(), "batch_turns_api.db"))
+    os.environ.setdefault("OPENAI_API_KEY", "unused")
+    os.environ["TRACE_SAMPLE_RATE"] = "0"
+    os.environ["BATCH_MAX_CONCURRENCY"] = str(max(args.concurrency))
+    asyncio.run(main(args))
@@ -0,0 +1,68 @@
+"""
+Records the scripted load-test conversations to a cassette with a slow fake chat model,
+then replays them strictly (any model call fails) with the original and with zero
+latency, checking that every turn answers the same as when it was recorded.
+
+Usage (from src/):
+    python -m benchmarks.cassette_replay --latency 0.05
+"""
+
+import os
+import time
+import argparse
+import tempfile
+
+from agent import BookingWorkflow
+from cassette import Cassette
+from benchmarks.fake_llm import FakeChatModel
+from benchmarks.load_test import CONVERSATIONS, scripted_responder
+
+
+def offline_responder(messages, schema):
+    raise RuntimeError("The chat model was called during a strict replay")
+
+
+def replay(workflow: BookingWorkflow) -> tuple[list, float]:
+    states = []
+    start = time.perf_counter()
+    for turns in CONVERSATIONS.values():
+        thread_id = workflow.create_session()
+        for message, _, _ in turns:
+            state = workflow.run_turn(thread_id, message)
+            states.append({key: value for key, value in state.items() if key != "extracted_info"})
+    return states, time.perf_counter() - start
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "chains.jsonl.gz")
+        print(f"{'run':<16}{'turns':>7}{'seconds':>9}{'model calls':>13}{'same answers':>14}")
+        recorded = None
+        for name, latency in [("record", None), ("replay original", "original"), ("replay zero", "zero")]:
+            if latency is None:
+                llm = FakeChatModel(latency=args.latency, responder=scripted_responder)
+                cassette = Cassette(path, mode="record")
+            else:
+                llm = FakeChatModel(responder=offline_responder)
+                cassette = Cassette(path, mode="replay", strict=True, latency=latency)
+            workflow = BookingWorkflow(
+                db_path=os.path.join(directory, f"{name}.db"), llm=llm, cassette=cassette
+            )
+            states, seconds = replay(workflow)
+            workflow.conn.close()
+            recorded = recorded or states
+            print(
+                f"{name:<16}{len(states):>7}{seconds:>9.2f}{llm.calls:>13}"
+                f"{str(states == recorded):>14}"
+            )
+        stats = cassette.stats()
+        print(
+            f"\ncassette: {stats['keys']} recorded inputs, {os.path.getsize(path)} bytes "
+            f"({os.path.getsize(path) / stats['keys']:.0f} bytes per input)"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds per recorded call")
+    main(parser.parse_args())
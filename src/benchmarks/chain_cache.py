@@ -0,0 +1,69 @@
+"""
+Replays the same conversations with and without the chain result cache against a fake
+chat model, reporting turn latency, LLM calls per turn and the cache counters.
+
+Usage (from src/):
+    python -m benchmarks.chain_cache --latency 0.2 --conversations 5
+"""
+
+import os
+import time
+import argparse
+import tempfile
+
+from agent import BookingWorkflow
+from chain_cache import ChainCache
+from benchmarks.fake_llm import FakeChatModel
+
+# Every conversation repeats the same messages, as do the many guests who open
+# with the same greeting or answer with the same short replies
+CONVERSATION = [
+    "Hi, I would like to book a room",
+    "Hugo Albuquerque",
+    "From 2025-12-01 to 2025-12-05",
+    "2 guests",
+    "credit card",
+    "yes, with breakfast",
+]
+
+
+def replay(cache, latency: float, conversations: int):
+    llm = FakeChatModel(latency=latency)
+    workflow = BookingWorkflow(db_path=":memory:", llm=llm, chain_cache=cache)
+    turns = 0
+    start = time.perf_counter()
+    for _ in range(conversations):
+        thread_id = workflow.create_session()
+        for message in CONVERSATION:
+            workflow.run_turn(thread_id, message)
+            turns += 1
+    elapsed = time.perf_counter() - start
+    workflow.conn.close()
+    return elapsed / turns, llm.calls / turns
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, "chain_cache.db")
+        runs = [
+            ("no cache", None),
+            ("memory", ChainCache()),
+            ("disk, cold", ChainCache(db_path=db_path)),
+            # A fresh process reading the entries written by the previous run
+            ("disk, warm", ChainCache(db_path=db_path)),
+        ]
+        print(f"{'cache':<12}{'ms/turn':>10}{'LLM calls/turn':>16}")
+        for name, cache in runs:
+            seconds, calls = replay(cache, args.latency, args.conversations)
+            print(f"{name:<12}{seconds * 1000:>10.1f}{calls:>16.2f}")
+            if cache is not None:
+                print(f"  {cache.stats()}")
+                if cache.conn is not None:
+                    cache.conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds per fake LLM call")
+    parser.add_argument("--conversations", type=int, default=5)
+    main(parser.parse_args())
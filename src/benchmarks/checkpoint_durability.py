@@ -0,0 +1,100 @@
+"""
+Reports checkpoint writes per turn, checkpoint bytes per turn and turn latency for
+each durability mode of BookingWorkflow, using a fake chat model.
+
+Usage (from src/):
+    python -m benchmarks.checkpoint_durability --sessions 20 --turns 5
+"""
+
+import os
+import time
+import argparse
+import statistics
+import tempfile
+
+from agent import BookingWorkflow
+from checkpointing import DURABILITY_MODES
+from benchmarks.fake_llm import FakeChatModel
+
+
+def table_stats(conn) -> tuple[int, int]:
+    """
+    Returns the number of rows and payload bytes stored in the checkpoint tables.
+    """
+    tables = {
+        row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")
+    }
+    rows, size = 0, 0
+    if "checkpoints" in tables:
+        count, total = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(checkpoint) + LENGTH(metadata)), 0) FROM checkpoints"
+        ).fetchone()
+        rows, size = rows + count, size + total
+    if "writes" in tables:
+        count, total = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM writes"
+        ).fetchone()
+        rows, size = rows + count, size + total
+    return rows, size
+
+
+def file_size(db_path: str) -> int:
+    return sum(
+        os.path.getsize(path)
+        for path in (db_path, db_path + "-wal")
+        if os.path.exists(path)
+    )
+
+
+def run_mode(durability: str, sessions: int, turns: int, latency: float) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "bench.db")
+        workflow = BookingWorkflow(
+            db_path=db_path, llm=FakeChatModel(latency=latency), durability=durability
+        )
+
+        latencies = []
+        for i in range(sessions):
+            thread_id = workflow.create_session() if durability != "none" else None
+            for j in range(turns):
+                message = f"I would like to book a room ({i}-{j})"
+                start = time.perf_counter()
+                if thread_id is None:
+                    workflow.run_graph({"user_message": message})
+                else:
+                    workflow.run_turn(thread_id, message)
+                latencies.append(time.perf_counter() - start)
+
+        rows, size = table_stats(workflow.conn)
+        on_disk = file_size(db_path)
+        workflow.conn.close()
+
+    total_turns = sessions * turns
+    latencies.sort()
+    return {
+        "mode": durability,
+        "writes/turn": rows / total_turns,
+        "bytes/turn": size / total_turns,
+        "disk/turn": on_disk / total_turns,
+        "p50 ms": statistics.median(latencies) * 1000,
+        "p95 ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+    }
+
+
+def main(args):
+    columns = ["mode", "writes/turn", "bytes/turn", "disk/turn", "p50 ms", "p95 ms"]
+    print("".join(f"{column:>14}" for column in columns))
+    for durability in DURABILITY_MODES:
+        result = run_mode(durability, args.sessions, args.turns, args.latency)
+        print(
+            f"{result['mode']:>14}"
+            + "".join(f"{result[column]:>14.1f}" for column in columns[1:])
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=5, help="Turns per session")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds per fake LLM call")
+    main(parser.parse_args())
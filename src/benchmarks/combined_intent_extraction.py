@@ -0,0 +1,55 @@
+"""
+Replays booking conversations through the two-call graph (intent_chain, then
+booking_info_chain) and the combined single-call mode, reporting LLM calls and wall
+time per turn against a fake chat model.
+
+Usage (from src/):
+    python -m benchmarks.combined_intent_extraction --latency 0.3
+"""
+
+import time
+import argparse
+
+from agent import BookingWorkflow
+from benchmarks.fake_llm import FakeChatModel
+
+CONVERSATION = [
+    "Hi, I would like to book a room",
+    "Hugo Albuquerque",
+    "From 2025-12-01 to 2025-12-05",
+    "2 guests",
+    "credit card",
+    "yes, with breakfast",
+]
+
+
+def replay(combined: bool, latency: float, conversations: int) -> tuple[float, float]:
+    llm = FakeChatModel(latency=latency)
+    workflow = BookingWorkflow(
+        db_path=":memory:", llm=llm, combined_intent_extraction=combined
+    )
+    turns = 0
+    start = time.perf_counter()
+    for _ in range(conversations):
+        thread_id = workflow.create_session()
+        for message in CONVERSATION:
+            workflow.run_turn(thread_id, message)
+            turns += 1
+    elapsed = time.perf_counter() - start
+    workflow.conn.close()
+    return llm.calls / turns, elapsed / turns
+
+
+def main(args):
+    print(f"{'mode':<12}{'LLM calls/turn':>16}{'ms/turn':>10}")
+    for combined in (False, True):
+        calls, seconds = replay(combined, args.latency, args.conversations)
+        mode = "combined" if combined else "two-call"
+        print(f"{mode:<12}{calls:>16.2f}{seconds * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.3, help="Seconds per fake LLM call")
+    parser.add_argument("--conversations", type=int, default=3)
+    main(parser.parse_args())
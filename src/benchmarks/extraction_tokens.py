@@ -0,0 +1,81 @@
+"""
+Prompt and completion tokens per turn of booking_info_chain with the full six-field schema
+and with the per-turn schema restricted to the missing fields, counted with tiktoken.
+
+Usage (from src/):
+    python -m benchmarks.extraction_tokens
+"""
+
+import json
+import argparse
+
+import tiktoken
+from langchain_core.utils.function_calling import convert_to_openai_tool
+
+from prompts import booking_info_prompt, create_booking_info_prompt
+from pydantic_classes import BookingInfo, create_booking_info_model
+
+ALL_KEYS = list(BookingInfo.model_fields)
+
+# A typical conversation: one field answered per turn, in the order the assistant asks
+CONVERSATION = [
+    ("I'd like to book a room", ALL_KEYS),
+    ("Hugo Albuquerque", ALL_KEYS),
+    ("2025-12-01", ALL_KEYS[1:]),
+    ("2025-12-05", ALL_KEYS[2:]),
+    ("2 guests", ALL_KEYS[3:]),
+    ("credit card", ALL_KEYS[4:]),
+    ("yes please", ALL_KEYS[5:]),
+]
+
+
+def count_tokens(encoding, prompt, schema, message: str) -> tuple[int, int]:
+    """
+    Returns (prompt tokens, completion tokens) of one structured extraction call: the
+    rendered prompt plus the function-call schema, and the JSON arguments of an answer
+    that leaves every field empty.
+    """
+    text = prompt.format(message=message)
+    tool = json.dumps(convert_to_openai_tool(schema))
+    arguments = json.dumps({field: None for field in schema.model_fields})
+    return (
+        len(encoding.encode(text)) + len(encoding.encode(tool)),
+        len(encoding.encode(arguments)),
+    )
+
+
+def main(args):
+    encoding = tiktoken.get_encoding(args.encoding)
+
+    print(
+        f"{'turn':<6}{'missing':>8}{'full in':>10}{'full out':>10}"
+        f"{'dyn in':>10}{'dyn out':>10}{'saved':>8}"
+    )
+    totals = [0, 0, 0, 0]
+    for i, (message, missing) in enumerate(CONVERSATION, start=1):
+        full_in, full_out = count_tokens(encoding, booking_info_prompt, BookingInfo, message)
+        dyn_in, dyn_out = count_tokens(
+            encoding,
+            create_booking_info_prompt(missing),
+            create_booking_info_model(missing),
+            message,
+        )
+        for j, value in enumerate((full_in, full_out, dyn_in, dyn_out)):
+            totals[j] += value
+        saved = 1 - (dyn_in + dyn_out) / (full_in + full_out)
+        print(
+            f"{i:<6}{len(missing):>8}{full_in:>10}{full_out:>10}"
+            f"{dyn_in:>10}{dyn_out:>10}{saved:>8.0%}"
+        )
+
+    saved = 1 - (totals[2] + totals[3]) / (totals[0] + totals[1])
+    print(
+        f"{'total':<6}{'':>8}{totals[0]:>10}{totals[1]:>10}"
+        f"{totals[2]:>10}{totals[3]:>10}{saved:>8.0%}"
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--encoding", default="o200k_base", help="tiktoken encoding (gpt-4o uses o200k_base)")
+    main(parser.parse_args())
@@ -0,0 +1,130 @@
+import time
+import asyncio
+from typing import Any, AsyncIterator, Callable, Iterator, Optional
+
+from langchain_core.language_models.chat_models import (
+    BaseChatModel,
+    agenerate_from_stream,
+    generate_from_stream,
+)
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+
+
+
+def default_responder(messages: list[BaseMessage], schema: Optional[type]) -> Any:
+    """
+    Answers every structured call with a reservation intent or an empty schema,
+    and every free-text call with a fixed follow-up question.
+    """
+    if schema is not None and "intent" in schema.model_fields:
+        return schema(intent="make a reservation")
+    if schema is not None:
+        return schema()
+    return "Thank you! Could you please tell me your full name?"
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Offline stand-in for ChatOpenAI with a fixed latency per call. It supports plain
+    completions and with_structured_output, so it can be passed as the `llm` of every
+    chain in chains.py. Every call goes through the chat model callbacks and reports an
+    approximate token usage (one token per word). When streamed, free-text answers arrive
+    word by word: the first after `latency`, the others `token_latency` apart. A
+    `latency_sampler` draws the first-token latency of every call from a distribution.
+    """
+
+    latency: float = 0.0
+    latency_sampler: Optional[Callable[[], float]] = None
+    token_latency: float = 0.0
+    responder: Callable[[list[BaseMessage], Optional[type]], Any] = default_responder
+    calls: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+
+    def _generate(
+        self, messages, stop=None, run_manager=None, schema=None, **kwargs
+    ) -> ChatResult:
+        # A complete answer takes as long as streaming all of its tokens
+        return generate_from_stream(self._stream(messages, stop, run_manager, schema=schema))
+
+    async def _agenerate(
+        self, messages, stop=None, run_manager=None, schema=None, **kwargs
+    ) -> ChatResult:
+        return await agenerate_from_stream(
+            self._astream(messages, stop, run_manager, schema=schema)
+        )
+
+    def _stream(
+        self, messages, stop=None, run_manager=None, schema=None, **kwargs
+    ) -> Iterator[ChatGenerationChunk]:
+        self.calls += 1
+        time.sleep(self._first_token_latency())
+        for index, chunk in enumerate(self._chunks(messages, schema)):
+            if index and self.token_latency:
+                time.sleep(self.token_latency)
+            yield chunk
+
+    async def _astream(
+        self, messages, stop=None, run_manager=None, schema=None, **kwargs
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        self.calls += 1
+        await asyncio.sleep(self._first_token_latency())
+        for index, chunk in enumerate(self._chunks(messages, schema)):
+            if index and self.token_latency:
+                await asyncio.sleep(self.token_latency)
+            yield chunk
+
+    def _first_token_latency(self) -> float:
+        return self.latency if self.latency_sampler is None else self.latency_sampler()
+
+    def _chunks(
+        self, messages: list[BaseMessage], schema: Optional[type]
+    ) -> list[ChatGenerationChunk]:
+        message = self._result(messages, schema).generations[0].message
+        if schema is not None:
+            # Structured answers are not split, the parser needs the whole object
+            words = [""]
+            additional_kwargs = message.additional_kwargs
+        else:
+            words = message.content.split(" ")
+            words = [word + " " for word in words[:-1]] + words[-1:]
+            additional_kwargs = {}
+        chunks = [
+            ChatGenerationChunk(message=AIMessageChunk(content=word)) for word in words
+        ]
+        # The usage of the whole answer is reported once, on the last chunk
+        chunks[-1] = ChatGenerationChunk(
+            message=AIMessageChunk(
+                content=words[-1],
+                additional_kwargs=additional_kwargs,
+                usage_metadata=message.usage_metadata,
+            )
+        )
+        return chunks
+
+    def _result(self, messages: list[BaseMessage], schema: Optional[type]) -> ChatResult:
+        output = self.responder(messages, schema)
+        if schema is None:
+            message = AIMessage(content=output)
+            completion = output
+        else:
+            # Structured answers travel in additional_kwargs and are unpacked by the parser
+            message = AIMessage(content="", additional_kwargs={"parsed": output})
+            completion = output.model_dump_json()
+        input_tokens = sum(len(str(m.content).split()) for m in messages)
+        output_tokens = len(completion.split())
+        message.usage_metadata = {
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+        }
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def with_structured_output(self, schema, **kwargs):
+        return self.bind(schema=schema) | RunnableLambda(
+            lambda message: message.additional_kwargs["parsed"]
+        )
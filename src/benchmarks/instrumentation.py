@@ -0,0 +1,107 @@
+"""
+Overhead of the workflow instrumentation: turn latency without it, with metrics only,
+and with every turn traced, using a zero-latency fake chat model so the bookkeeping is
+what gets measured. Prints the per-node breakdown collected by the metrics.
+
+Usage (from src/):
+    python -m benchmarks.instrumentation --turns 600
+"""
+
+import os
+import time
+import logging
+import argparse
+import tempfile
+import statistics
+
+from agent import BookingWorkflow
+from instrumentation import Instrumentation, trace_logger
+from benchmarks.fake_llm import FakeChatModel
+
+CONVERSATION = [
+    "Hi, I would like to book a room",
+    "Hugo Albuquerque",
+    "From 2025-12-01 to 2025-12-05",
+    "2 guests",
+    "credit card",
+    "yes, with breakfast",
+]
+
+
+def replay(workflow: BookingWorkflow, turns: int) -> list[float]:
+    latencies = []
+    thread_id = workflow.create_session()
+    for index in range(turns):
+        if index and index % len(CONVERSATION) == 0:
+            thread_id = workflow.create_session()
+        start = time.perf_counter()
+        workflow.run_turn(thread_id, CONVERSATION[index % len(CONVERSATION)])
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def node_breakdown(instrumentation: Instrumentation) -> dict:
+    """
+    Returns the calls and mean milliseconds per node from the node histogram.
+    """
+    breakdown = {}
+    for (node,), (counts, total) in instrumentation.node_seconds._series.items():
+        calls = sum(counts)
+        breakdown[node] = (calls, total / calls * 1000)
+    return breakdown
+
+
+def main(args):
+    # Traces are formatted and logged, but not written anywhere
+    trace_logger.setLevel(logging.INFO)
+    trace_logger.addHandler(logging.NullHandler())
+    trace_logger.propagate = False
+
+    runs = [
+        ("off", None),
+        ("metrics", Instrumentation(trace_sample_rate=0.0)),
+        ("traced", Instrumentation(trace_sample_rate=1.0)),
+    ]
+    with tempfile.TemporaryDirectory() as directory:
+        workflows = {
+            name: BookingWorkflow(
+                db_path=os.path.join(directory, f"{name}.db"),
+                llm=FakeChatModel(),
+                durability="end_of_turn",
+                instrumentation=instrumentation,
+            )
+            for name, instrumentation in runs
+        }
+        # Warm up imports and prompt caches, then interleave the modes in rounds so
+        # drift in the machine's speed affects them alike
+        for workflow in workflows.values():
+            replay(workflow, len(CONVERSATION) * 10)
+        latencies = {name: [] for name in workflows}
+        for _ in range(args.rounds):
+            for name, workflow in workflows.items():
+                latencies[name].extend(replay(workflow, args.turns // args.rounds))
+
+    print(f"{'mode':<9}{'p50 ms':>9}{'p95 ms':>9}{'mean ms':>9}{'overhead':>10}")
+    baseline = statistics.mean(latencies["off"])
+    for name, values in latencies.items():
+        values.sort()
+        mean = statistics.mean(values)
+        print(
+            f"{name:<9}"
+            f"{values[len(values) // 2] * 1000:>9.2f}"
+            f"{values[int(len(values) * 0.95)] * 1000:>9.2f}"
+            f"{mean * 1000:>9.2f}"
+            f"{(mean / baseline - 1) * 100:>9.1f}%"
+        )
+    metrics = runs[1][1]
+
+    print(f"\n{'node':<22}{'calls':>7}{'mean ms':>9}")
+    for node, (calls, mean_ms) in sorted(node_breakdown(metrics).items()):
+        print(f"{node:<22}{calls:>7}{mean_ms:>9.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=600, help="Turns per mode")
+    parser.add_argument("--rounds", type=int, default=10)
+    main(parser.parse_args())
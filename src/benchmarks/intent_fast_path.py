@@ -0,0 +1,224 @@
+"""
+Offline accuracy and latency report for the local intent pre-classifier against a
+labelled set of messages.
+
+Usage (from src/):
+    python -m benchmarks.intent_fast_path --threshold 0.9
+"""
+
+import time
+import argparse
+
+from intent_rules import IntentPreClassifier
+
+ALL_KEYS = [
+    "full_name",
+    "check_in_date",
+    "check_out_date",
+    "num_guests",
+    "payment_method",
+    "breakfast_included",
+]
+
+# (message, assistant's previous message, not_filled_keys, previous intent, expected intent)
+LABELLED_MESSAGES = [
+    ("Hi, I would like to book a room", None, ALL_KEYS, None, "make a reservation"),
+    ("I want to make a reservation for next week", None, ALL_KEYS, None, "make a reservation"),
+    ("Can I reserve a double room?", None, ALL_KEYS, None, "make a reservation"),
+    ("I'd like to book a suite for two nights", None, ALL_KEYS, None, "make a reservation"),
+    ("Hello, we want to reserve 2 rooms", None, ALL_KEYS, None, "make a reservation"),
+    ("hello", None, ALL_KEYS, None, "other"),
+    ("I want to cancel my booking", None, ALL_KEYS, None, "other"),
+    (
+        "I don't want to make a reservation, just asking about parking",
+        None,
+        ALL_KEYS,
+        None,
+        "other",
+    ),
+    ("Do you need a booking to use the spa?", None, ALL_KEYS, None, "other"),
+    ("Is it possible to book a room with a sea view?", None, ALL_KEYS, None, "make a reservation"),
+    ("My friend booked a room here last year", None, ALL_KEYS, None, "other"),
+    ("What is the reservation policy for pets?", None, ALL_KEYS, None, "other"),
+    ("Can you show me the booking form?", None, ALL_KEYS, None, "other"),
+    ("What is the booking fee?", None, ALL_KEYS, None, "other"),
+    ("Could you confirm the reservation desk phone number?", None, ALL_KEYS, None, "other"),
+    ("How do I change a reservation?", None, ALL_KEYS, None, "other"),
+    ("Please confirm the booking details", None, ALL_KEYS, None, "check reservation"),
+    (
+        "I'd like to book another room and check my reservation",
+        None,
+        ALL_KEYS,
+        "check reservation",
+        "make a reservation",
+    ),
+    ("What's the weather like in Lisbon?", None, ALL_KEYS, None, "other"),
+    ("Do you have a swimming pool?", None, ALL_KEYS, None, "other"),
+    (
+        "Hugo Albuquerque",
+        "Could you please tell me your full name?",
+        ALL_KEYS,
+        "make a reservation",
+        "make a reservation",
+    ),
+    (
+        "My name is Maria Silva",
+        "May I have your full name, please?",
+        ALL_KEYS,
+        "make a reservation",
+        "make a reservation",
+    ),
+    (
+        "2025-12-01",
+        "Thanks Hugo! What is your check-in date (YYYY-MM-DD)?",
+        ALL_KEYS[1:],
+        "make a reservation",
+        "make a reservation",
+    ),
+    (
+        "from 2025-12-01 to 2025-12-05",
+        "When would you like to check in and check out (YYYY-MM-DD)?",
+        ALL_KEYS[1:],
+        "make a reservation",
+        "make a reservation",
+    ),
+    (
+        "2 guests",
+        "How many guests will be staying?",
+        ALL_KEYS[3:],
+        "make a reservation",
+        "make a reservation",
+    ),
+    (
+        "we are 3",
+        "How many guests will be staying?",
+        ALL_KEYS[3:],
+        "make a reservation",
+        "make a reservation",
+    ),
+    (
+        "credit card",
+        "How would you like to pay?",
+        ALL_KEYS[4:],
+        "make a reservation",
+        "make a reservation",
+    ),
+    (
+        "I'll pay with paypal",
+        "Which payment method would you prefer?",
+        ALL_KEYS[4:],
+        "make a reservation",
+        "make a reservation",
+    ),
+    (
+        "yes please",
+        "Would you like breakfast included?",
+        ALL_KEYS[5:],
+        "make a reservation",
+        "make a reservation",
+    ),
+    (
+        "no thanks",
+        "Would you like to add breakfast to your stay?",
+        ALL_KEYS[5:],
+        "make a reservation",
+        "make a reservation",
+    ),
+    (
+        "Can you show me my reservation?",
+        "Is there anything else I can help with?",
+        [],
+        "check reservation",
+        "check reservation",
+    ),
+    (
+        "What's the status of my booking?",
+        None,
+        ALL_KEYS,
+        None,
+        "check reservation",
+    ),
+    (
+        "I need to change the check-in date to 2025-12-02",
+        "Your reservation is booked.",
+        [],
+        "check reservation",
+        "change reservation",
+    ),
+    (
+        "Please update the number of guests to 4",
+        "Your reservation is booked.",
+        [],
+        "check reservation",
+        "change reservation",
+    ),
+    (
+        "Actually, can I switch the payment to cash?",
+        "Would you like breakfast included?",
+        ALL_KEYS[5:],
+        "make a reservation",
+        "change reservation",
+    ),
+    (
+        "Is parking free?",
+        "How many guests will be staying?",
+        ALL_KEYS[3:],
+        "make a reservation",
+        "other",
+    ),
+    (
+        "what time is breakfast served?",
+        "Would you like breakfast included?",
+        ALL_KEYS[5:],
+        "make a reservation",
+        "other",
+    ),
+    (
+        "yes",
+        "Shall I go ahead and confirm the booking?",
+        [],
+        "make a reservation",
+        "make a reservation",
+    ),
+]
+
+
+def main(args):
+    classifier = IntentPreClassifier(threshold=args.threshold)
+
+    correct, wrong = 0, []
+    start = time.perf_counter()
+    for _ in range(args.repeat):
+        for message, response, not_filled_keys, previous, expected in LABELLED_MESSAGES:
+            classifier.predict(message, list(not_filled_keys), response, previous)
+    elapsed = time.perf_counter() - start
+
+    settled = 0
+    for message, response, not_filled_keys, previous, expected in LABELLED_MESSAGES:
+        intent, confidence = classifier.classify(
+            message, list(not_filled_keys), response, previous
+        )
+        if intent is None or confidence < args.threshold:
+            continue
+        settled += 1
+        if intent == expected:
+            correct += 1
+        else:
+            wrong.append((message, intent, expected))
+
+    total = len(LABELLED_MESSAGES)
+    print(f"messages:          {total}")
+    print(f"settled locally:   {settled} ({settled / total:.0%})")
+    print(f"accuracy (local):  {correct / settled if settled else 0:.0%}")
+    print(f"fallback to LLM:   {total - settled}")
+    print(f"latency/message:   {elapsed / (args.repeat * total) * 1e6:.1f} us")
+    print(f"counters:          {classifier.stats()}")
+    for message, intent, expected in wrong:
+        print(f"  wrong: {message!r} -> {intent} (expected {expected})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--threshold", type=float, default=0.9)
+    parser.add_argument("--repeat", type=int, default=1000, help="Passes over the set for timing")
+    main(parser.parse_args())
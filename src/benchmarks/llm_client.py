@@ -0,0 +1,103 @@
+"""
+Sends bursts of concurrent chain calls through ChatOpenAI clients against a simulated
+provider that answers 429 above a concurrency limit, comparing the shared LLM client
+registry with independent unlimited clients.
+
+Usage (from src/):
+    python -m benchmarks.llm_client --calls 200 --provider-limit 8 --latency 0.2
+"""
+
+import json
+import time
+import asyncio
+import argparse
+
+import httpx
+
+from llm_client import LLMClientRegistry
+from chains import create_intent_chain
+
+
+class SimulatedProvider:
+    """
+    Chat completions endpoint with a fixed latency that rejects requests with 429 while
+    more than `limit` are in flight.
+    """
+
+    def __init__(self, limit: int, latency: float):
+        self.limit = limit
+        self.latency = latency
+        self.in_flight = 0
+        self.responses = {}
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.in_flight += 1
+        try:
+            if self.in_flight > self.limit:
+                status, body = 429, {"error": {"message": "Rate limit reached", "type": "requests"}}
+            else:
+                await asyncio.sleep(self.latency)
+                status, body = 200, self._completion(json.loads(request.content))
+            self.responses[status] = self.responses.get(status, 0) + 1
+            return httpx.Response(status, json=body)
+        finally:
+            self.in_flight -= 1
+
+    @staticmethod
+    def _completion(body: dict) -> dict:
+        message = {"role": "assistant", "content": None}
+        tools = body.get("tools")
+        if tools:
+            name = tools[0]["function"]["name"]
+            message["tool_calls"] = [{
+                "id": "call_0",
+                "type": "function",
+                "function": {"name": name, "arguments": json.dumps({"intent": "other"})},
+            }]
+        else:
+            message["content"] = "ok"
+        return {
+            "id": "chatcmpl-0",
+            "object": "chat.completion",
+            "created": 0,
+            "model": body["model"],
+            "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 10, "completion_tokens": 5, "total_tokens": 15},
+        }
+
+
+async def burst(registry: LLMClientRegistry, calls: int) -> tuple[float, int]:
+    chain = create_intent_chain(registry.chat_model("gpt-4o", temperature=0, api_key="test"))
+    payload = {"assistant_question": "How can I help you?", "answer": "hello"}
+    start = time.perf_counter()
+    results = await asyncio.gather(
+        *(chain.ainvoke(payload) for _ in range(calls)), return_exceptions=True
+    )
+    failures = sum(isinstance(result, Exception) for result in results)
+    return time.perf_counter() - start, failures
+
+
+async def main(args):
+    runs = [
+        # No shared limit and no retries beyond the SDK default, like one client per chain
+        ("unlimited", dict(max_concurrency=0, max_retries=2, backoff_base=0.05)),
+        ("shared", dict(max_concurrency=args.provider_limit, backoff_base=0.05)),
+    ]
+    print(f"{'clients':<11}{'seconds':>9}{'failed':>8}{'429s':>7}")
+    for name, settings in runs:
+        provider = SimulatedProvider(args.provider_limit, args.latency)
+        registry = LLMClientRegistry(
+            async_transport=httpx.MockTransport(provider), **settings
+        )
+        seconds, failures = await burst(registry, args.calls)
+        print(f"{name:<11}{seconds:>9.2f}{failures:>8}{provider.responses.get(429, 0):>7}")
+        print(f"  {registry.stats()}")
+        await registry.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--provider-limit", type=int, default=8, help="Requests in flight before 429s")
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds per completion")
+    asyncio.run(main(parser.parse_args()))
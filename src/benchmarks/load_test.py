@@ -0,0 +1,415 @@
+"""
+Load test: replays scripted multi-turn booking conversations at fixed concurrency levels
+against BookingWorkflow directly and against the FastAPI app in-process, with a scripted
+fake chat model whose latency follows a configurable distribution. Reports turns/s, turn
+and per-node p50/p95/p99, checkpoint bytes and memory, and writes them as JSON so runs can
+be compared.
+
+Usage (from src/):
+    python -m benchmarks.load_test --concurrency 1 10 50 --output results.json
+    python -m benchmarks.load_test --compare baseline.json results.json
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import platform
+import resource
+import tempfile
+from typing import Callable
+
+from agent import BookingWorkflow
+from instrumentation import Instrumentation, trace_logger
+from benchmarks.fake_llm import FakeChatModel
+from benchmarks.checkpoint_durability import file_size, table_stats
+
+MAKE, CHECK, CHANGE, OTHER = (
+    "make a reservation",
+    "check reservation",
+    "change reservation",
+    "other",
+)
+
+# Each turn is (user message, intent, booking fields the model extracts from it)
+CONVERSATIONS = {
+    "booking": [
+        ("Hi, I would like to book a room", MAKE, {}),
+        ("My name is Hugo Albuquerque", MAKE, {"full_name": "Hugo Albuquerque"}),
+        (
+            "From 2030-12-01 to 2030-12-05",
+            MAKE,
+            {"check_in_date": "2030-12-01", "check_out_date": "2030-12-05"},
+        ),
+        ("We are 2 guests", MAKE, {"num_guests": 2}),
+        ("I will pay by credit card", MAKE, {"payment_method": "credit card"}),
+        ("Yes, with breakfast please", MAKE, {"breakfast_included": True}),
+        ("Can you show me my reservation?", CHECK, {}),
+    ],
+    "booking_with_correction": [
+        ("I need a room for Maria Silva", MAKE, {"full_name": "Maria Silva"}),
+        (
+            "Check in 2030-12-10, check out 2030-12-08",
+            MAKE,
+            {"check_in_date": "2030-12-10", "check_out_date": "2030-12-08"},
+        ),
+        (
+            "Sorry, check in 2030-12-08 and check out 2030-12-10",
+            MAKE,
+            {"check_in_date": "2030-12-08", "check_out_date": "2030-12-10"},
+        ),
+        ("Just 1 guest, paying with cash", MAKE, {"num_guests": 1, "payment_method": "cash"}),
+        ("No breakfast", MAKE, {"breakfast_included": False}),
+    ],
+    "change": [
+        ("Book a room for Ana Costa", MAKE, {"full_name": "Ana Costa"}),
+        (
+            "From 2031-01-03 to 2031-01-06, 3 guests",
+            MAKE,
+            {"check_in_date": "2031-01-03", "check_out_date": "2031-01-06", "num_guests": 3},
+        ),
+        (
+            "Debit card, with breakfast",
+            MAKE,
+            {"payment_method": "debit card", "breakfast_included": True},
+        ),
+        ("Please change the check-out date to 2031-01-07", CHANGE, {"check_out_date": "2031-01-07"}),
+    ],
+    "questions": [
+        ("What time is breakfast served?", OTHER, {}),
+        ("Do you have parking?", OTHER, {}),
+        ("Is my reservation confirmed?", CHECK, {}),
+    ],
+}
+
+SCRIPT = {message: (intent, fields) for turns in CONVERSATIONS.values() for message, intent, fields in turns}
+
+RESPONSE = (
+    "Thank you! I have noted that. Could you please tell me the next detail of your "
+    "booking so I can complete the reservation for you?"
+)
+
+
+def scripted_responder(messages, schema):
+    """
+    Answers every chain as the scripted conversations expect: the intent and booking
+    fields of the user's message for structured calls, a fixed reply for free text.
+    """
+    if schema is None:
+        return RESPONSE
+    match = re.search(r"User's (?:reply|message): (.*)", messages[-1].content)
+    intent, fields = SCRIPT.get(match.group(1).strip() if match else "", (OTHER, {}))
+    values = {key: value for key, value in fields.items() if key in schema.model_fields}
+    if "intent" in schema.model_fields:
+        values["intent"] = intent
+    return schema(**values)
+
+
+def latency_sampler(args) -> Callable[[], float]:
+    """
+    Returns the first-token latency distribution of the fake model, with a share of
+    slow calls on top.
+    """
+
+    def base() -> float:
+        if args.distribution == "fixed":
+            return args.median_latency
+        if args.distribution == "exponential":
+            return random.expovariate(1 / args.median_latency)
+        return random.lognormvariate(0, args.sigma) * args.median_latency
+
+    def sample() -> float:
+        if args.slow_share and random.random() < args.slow_share:
+            return args.slow_latency
+        return base()
+
+    return sample
+
+
+def percentiles(values: list[float]) -> dict:
+    if not values:
+        return {}
+    ordered = sorted(values)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {
+        "count": len(ordered),
+        "p50_ms": round(pick(0.5) * 1000, 3),
+        "p95_ms": round(pick(0.95) * 1000, 3),
+        "p99_ms": round(pick(0.99) * 1000, 3),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 3),
+    }
+
+
+def rss_mb() -> float:
+    # Resident set size from /proc where available, the peak otherwise
+    try:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class SpanCollector(logging.Handler):
+    """
+    Collects the node spans of the turn traces logged by the instrumentation.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.nodes: dict[str, list[float]] = {}
+        self.llm_calls = 0
+
+    def emit(self, record):
+        for span in json.loads(record.getMessage())["spans"]:
+            if "node" in span:
+                self.nodes.setdefault(span["node"], []).append(span["ms"] / 1000)
+            else:
+                self.llm_calls += 1
+
+
+def conversation_plan(count: int, seed: int) -> list[list[str]]:
+    rng = random.Random(seed)
+    names = sorted(CONVERSATIONS)
+    return [[message for message, _, _ in CONVERSATIONS[rng.choice(names)]] for _ in range(count)]
+
+
+async def drive(create_session, run_turn, plan: list[list[str]], concurrency: int) -> tuple[list, int]:
+    """
+    Runs the conversations of the plan with at most `concurrency` in flight.
+
+    Returns:
+        tuple: The latency of every turn, and the number of failed turns.
+    """
+    queue = asyncio.Queue()
+    for messages in plan:
+        queue.put_nowait(messages)
+    latencies, failures = [], 0
+
+    async def worker():
+        nonlocal failures
+        while not queue.empty():
+            messages = queue.get_nowait()
+            thread_id = await create_session()
+            for message in messages:
+                start = time.perf_counter()
+                try:
+                    await run_turn(thread_id, message)
+                except Exception:
+                    failures += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies, failures
+
+
+def workflow_target(workflow: BookingWorkflow):
+    async def run_turn(thread_id, message):
+        await workflow.arun_turn(thread_id, message)
+
+    return workflow.acreate_session, run_turn
+
+
+def api_target(workflow: BookingWorkflow):
+    import httpx
+    import hotel_booking_api
+
+    # The endpoints look the workflow up at call time, so the fake one takes its place
+    hotel_booking_api.get_services().workflow = workflow
+    client = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=hotel_booking_api.app), base_url="http://load-test"
+    )
+
+    async def create_session():
+        response = await client.post("/sessions/")
+        response.raise_for_status()
+        return response.json()["thread_id"]
+
+    async def run_turn(thread_id, message):
+        response = await client.post(
+            "/run_turn/", json={"thread_id": thread_id, "user_message": message}
+        )
+        response.raise_for_status()
+
+    return create_session, run_turn, client
+
+
+async def run_level(target: str, concurrency: int, args, directory: str) -> dict:
+    random.seed(args.seed)
+    db_path = os.path.join(directory, f"{target}-{concurrency}.db")
+    collector = SpanCollector()
+    trace_logger.addHandler(collector)
+    llm = FakeChatModel(
+        latency_sampler=latency_sampler(args),
+        token_latency=args.token_latency,
+        responder=scripted_responder,
+    )
+    workflow = BookingWorkflow(
+        db_path=db_path,
+        llm=llm,
+        durability=args.durability,
+        instrumentation=Instrumentation(trace_sample_rate=1.0),
+    )
+    client = None
+    if target == "api":
+        create_session, run_turn, client = api_target(workflow)
+    else:
+        create_session, run_turn = workflow_target(workflow)
+
+    plan = conversation_plan(max(args.conversations, concurrency), args.seed)
+    rss_before = rss_mb()
+    start = time.perf_counter()
+    latencies, failures = await drive(create_session, run_turn, plan, concurrency)
+    elapsed = time.perf_counter() - start
+    rss_after = rss_mb()
+
+    if client is not None:
+        await client.aclose()
+    await workflow.aclose()
+    trace_logger.removeHandler(collector)
+    rows, payload_bytes = table_stats(workflow.conn)
+    workflow.conn.close()
+
+    turns = len(latencies)
+    return {
+        "target": target,
+        "concurrency": concurrency,
+        "conversations": len(plan),
+        "turns": turns,
+        "failures": failures,
+        "seconds": round(elapsed, 3),
+        "turns_per_second": round(turns / elapsed, 2),
+        "turn": percentiles(latencies),
+        "nodes": {name: percentiles(values) for name, values in sorted(collector.nodes.items())},
+        "llm_calls_per_turn": round(collector.llm_calls / turns, 3) if turns else 0.0,
+        "checkpoint": {
+            "rows": rows,
+            "payload_bytes": payload_bytes,
+            "payload_bytes_per_turn": round(payload_bytes / turns) if turns else 0,
+            "file_bytes": file_size(db_path),
+        },
+        "memory": {
+            "rss_mb_before": round(rss_before, 1),
+            "rss_mb_after": round(rss_after, 1),
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+        },
+    }
+
+
+def format_results(results: list[dict]) -> str:
+    lines = [
+        f"{'target':<10}{'conc':>6}{'turns':>7}{'fail':>6}{'turns/s':>9}"
+        f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'ckpt B/turn':>13}{'rss MB':>9}"
+    ]
+    for result in results:
+        lines.append(
+            f"{result['target']:<10}{result['concurrency']:>6}{result['turns']:>7}"
+            f"{result['failures']:>6}{result['turns_per_second']:>9.1f}"
+            f"{result['turn']['p50_ms']:>9.1f}{result['turn']['p95_ms']:>9.1f}"
+            f"{result['turn']['p99_ms']:>9.1f}"
+            f"{result['checkpoint']['payload_bytes_per_turn']:>13}"
+            f"{result['memory']['rss_mb_after']:>9.1f}"
+        )
+    for result in results:
+        lines.append(f"\n{result['target']} at concurrency {result['concurrency']}:")
+        lines.append(f"  {'node':<22}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        for name, node in result["nodes"].items():
+            lines.append(
+                f"  {name:<22}{node['p50_ms']:>9.2f}{node['p95_ms']:>9.2f}{node['p99_ms']:>9.2f}"
+            )
+    return "\n".join(lines)
+
+
+def compare(baseline_path: str, current_path: str) -> str:
+    """
+    Returns the change in throughput and turn latency of every run present in both files.
+    """
+    with open(baseline_path) as file:
+        baseline = {(r["target"], r["concurrency"]): r for r in json.load(file)["results"]}
+    with open(current_path) as file:
+        current = json.load(file)["results"]
+    lines = [f"{'target':<10}{'conc':>6}{'turns/s':>12}{'p50':>10}{'p95':>10}{'p99':>10}"]
+    change = lambda new, old: f"{(new / old - 1) * 100:+.1f}%" if old else "n/a"
+    for result in current:
+        before = baseline.get((result["target"], result["concurrency"]))
+        if before is None:
+            continue
+        lines.append(
+            f"{result['target']:<10}{result['concurrency']:>6}"
+            f"{change(result['turns_per_second'], before['turns_per_second']):>12}"
+            + "".join(
+                f"{change(result['turn'][key], before['turn'][key]):>10}"
+                for key in ("p50_ms", "p95_ms", "p99_ms")
+            )
+        )
+    return "\n".join(lines)
+
+
+async def main(args):
+    trace_logger.setLevel(logging.INFO)
+    trace_logger.propagate = False
+
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for target in args.targets:
+            for concurrency in args.concurrency:
+                results.append(await run_level(target, concurrency, args, directory))
+                print(
+                    f"{target} x{concurrency}: {results[-1]['turns_per_second']} turns/s",
+                    file=sys.stderr,
+                )
+    print(format_results(results))
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(
+                {
+                    "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                    "python": platform.python_version(),
+                    "config": {
+                        key: value
+                        for key, value in vars(args).items()
+                        if key not in ("output", "compare")
+                    },
+                    "results": results,
+                },
+                file,
+                indent=2,
+            )
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--targets", nargs="+", choices=("workflow", "api"), default=["workflow", "api"])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 10, 50])
+    parser.add_argument("--conversations", type=int, default=50, help="Conversations per level")
+    parser.add_argument(
+        "--distribution", choices=("fixed", "lognormal", "exponential"), default="lognormal"
+    )
+    parser.add_argument("--median-latency", type=float, default=0.05, help="Seconds to the first token")
+    parser.add_argument("--sigma", type=float, default=0.5, help="Spread of the lognormal latency")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="Seconds between streamed words")
+    parser.add_argument("--slow-share", type=float, default=0.0, help="Share of slow calls")
+    parser.add_argument("--slow-latency", type=float, default=1.0, help="Seconds per slow call")
+    parser.add_argument("--durability", default="end_of_turn", choices=("per_node", "end_of_turn", "none"))
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Write the results to this JSON file")
+    parser.add_argument(
+        "--compare", nargs=2, metavar=("BASELINE", "CURRENT"), help="Compare two result files and exit"
+    )
+    args = parser.parse_args()
+
+    if args.compare:
+        print(compare(*args.compare))
+    else:
+        # The API module builds its own workflow on first use; keep its database out of the tree
+        os.environ.setdefault("CONVERSATION_DB", os.path.join(tempfile.gettempdir(), "load_test_api.db"))
+        os.environ.setdefault("OPENAI_API_KEY", "unused")
+        os.environ["TRACE_SAMPLE_RATE"] = "0"
+        asyncio.run(main(args))
@@ -0,0 +1,152 @@
+"""
+Per-field coverage and latency of the local booking extractor on a labelled set of
+messages, and collect_information latency with and without it against a fake chat model.
+
+Usage (from src/):
+    python -m benchmarks.local_extraction --latency 0.5
+"""
+
+import time
+import argparse
+import statistics
+from datetime import date
+
+from agent import BookingWorkflow
+from local_extraction import LocalBookingExtractor
+from benchmarks.fake_llm import FakeChatModel
+
+ALL_KEYS = [
+    "full_name",
+    "check_in_date",
+    "check_out_date",
+    "num_guests",
+    "payment_method",
+    "breakfast_included",
+]
+REFERENCE_DATE = date(2025, 11, 3)
+
+# (message, assistant's previous message, not_filled_keys, expected fields)
+LABELLED_MESSAGES = [
+    (
+        "I'd like a room from 2025-12-01 to 2025-12-05 for 2 guests",
+        None,
+        ALL_KEYS,
+        {"check_in_date": "2025-12-01", "check_out_date": "2025-12-05", "num_guests": 2},
+    ),
+    (
+        "2025-12-01",
+        "What is your check-in date (YYYY-MM-DD)?",
+        ALL_KEYS[1:],
+        {"check_in_date": "2025-12-01"},
+    ),
+    (
+        "2025-12-05",
+        "And your check-out date (YYYY-MM-DD)?",
+        ALL_KEYS[2:],
+        {"check_out_date": "2025-12-05"},
+    ),
+    (
+        "tomorrow, for 3 nights",
+        "When would you like to check in?",
+        ALL_KEYS[1:],
+        {"check_in_date": "2025-11-04", "check_out_date": "2025-11-07"},
+    ),
+    (
+        "next friday until 2025-11-10",
+        "When would you like to check in?",
+        ALL_KEYS[1:],
+        {"check_in_date": "2025-11-07", "check_out_date": "2025-11-10"},
+    ),
+    ("3", "How many guests will be staying?", ALL_KEYS[3:], {"num_guests": 3}),
+    ("two people", "How many guests will be staying?", ALL_KEYS[3:], {"num_guests": 2}),
+    ("credit card", "How would you like to pay?", ALL_KEYS[4:], {"payment_method": "credit card"}),
+    ("I'll pay with paypal", "Which payment method?", ALL_KEYS[4:], {"payment_method": "paypal"}),
+    ("yes please", "Would you like breakfast included?", ALL_KEYS[5:], {"breakfast_included": True}),
+    ("no", "Would you like breakfast included?", ALL_KEYS[5:], {"breakfast_included": False}),
+    (
+        "cash, and with breakfast",
+        None,
+        ALL_KEYS[4:],
+        {"payment_method": "cash", "breakfast_included": True},
+    ),
+    ("Hugo Albuquerque", "Could you tell me your full name?", ALL_KEYS, {"full_name": "Hugo Albuquerque"}),
+    (
+        "I'm Maria Silva and we are 2 guests",
+        "Could you tell me your full name?",
+        ALL_KEYS,
+        {"full_name": "Maria Silva", "num_guests": 2},
+    ),
+    (
+        "debit card, no breakfast",
+        "How would you like to pay?",
+        ALL_KEYS[4:],
+        {"payment_method": "debit card", "breakfast_included": False},
+    ),
+]
+
+
+def coverage_report(repeat: int):
+    extractor = LocalBookingExtractor()
+    expected_counts, correct_counts = {}, {}
+    for message, response, not_filled_keys, expected in LABELLED_MESSAGES:
+        info, _ = extractor.extract(message, list(not_filled_keys), response, REFERENCE_DATE)
+        for field, value in expected.items():
+            expected_counts[field] = expected_counts.get(field, 0) + 1
+            if getattr(info, field) == value:
+                correct_counts[field] = correct_counts.get(field, 0) + 1
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for message, response, not_filled_keys, _ in LABELLED_MESSAGES:
+            extractor.extract(message, list(not_filled_keys), response, REFERENCE_DATE)
+    elapsed = time.perf_counter() - start
+
+    print(f"{'field':<20}{'expected':>10}{'local':>10}{'coverage':>10}")
+    for field in ALL_KEYS:
+        expected = expected_counts.get(field, 0)
+        correct = correct_counts.get(field, 0)
+        coverage = f"{correct / expected:.0%}" if expected else "-"
+        print(f"{field:<20}{expected:>10}{correct:>10}{coverage:>10}")
+    stats = extractor.stats()
+    print(f"LLM call skipped for {stats['llm_skip_rate']:.0%} of messages")
+    print(f"local extraction: {elapsed / (repeat * len(LABELLED_MESSAGES)) * 1e6:.1f} us/message")
+
+
+def node_latency(latency: float, local_extraction: bool) -> float:
+    workflow = BookingWorkflow(
+        db_path=":memory:",
+        llm=FakeChatModel(latency=latency),
+        local_extraction=local_extraction,
+    )
+    timings = []
+    for message, response, not_filled_keys, _ in LABELLED_MESSAGES:
+        state = {
+            "user_message": message,
+            "not_filled_keys": list(not_filled_keys),
+            "intent": "make a reservation",
+        }
+        if response is not None:
+            state["response"] = response
+        start = time.perf_counter()
+        workflow.collect_information(state)
+        timings.append(time.perf_counter() - start)
+    workflow.conn.close()
+    return statistics.mean(timings)
+
+
+def main(args):
+    coverage_report(args.repeat)
+    print()
+    for local_extraction in (False, True):
+        mean = node_latency(args.latency, local_extraction)
+        print(
+            f"collect_information, local_extraction={local_extraction!s:<5}: "
+            f"{mean * 1000:.1f} ms mean ({args.latency * 1000:.0f} ms per LLM call)"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.5, help="Seconds per fake LLM call")
+    parser.add_argument("--repeat", type=int, default=1000, help="Passes over the set for timing")
+    main(parser.parse_args())
@@ -0,0 +1,76 @@
+"""
+Compares running every chain on the large model with fast-model-first routing, where
+intent and booking information extraction escalate to the large model when their output
+is rejected, against fake fast and large chat models.
+
+Usage (from src/):
+    python -m benchmarks.model_routing --fast-latency 0.1 --large-latency 0.4
+"""
+
+import re
+import time
+import argparse
+
+from agent import BookingWorkflow
+from model_routing import ModelRouter
+from benchmarks.fake_llm import FakeChatModel, default_responder
+
+CONVERSATION = [
+    "Hi, I would like to book a room",
+    "Hugo Albuquerque",
+    "From 2025-12-01 to 2025-12-05",
+    "2 guests",
+    "credit card",
+    "yes, with breakfast",
+]
+
+
+def fast_responder(messages, schema):
+    # The fast model misreads the number of guests, which validate_information rejects
+    user_message = re.search(r"User's message: (.*)", messages[-1].content)
+    if (
+        schema is not None
+        and "num_guests" in schema.model_fields
+        and user_message
+        and "guests" in user_message.group(1)
+    ):
+        return schema(num_guests=0)
+    return default_responder(messages, schema)
+
+
+def replay(router, llm, conversations: int):
+    workflow = BookingWorkflow(db_path=":memory:", llm=llm, model_router=router)
+    turns = 0
+    start = time.perf_counter()
+    for _ in range(conversations):
+        thread_id = workflow.create_session()
+        for message in CONVERSATION:
+            workflow.run_turn(thread_id, message)
+            turns += 1
+    elapsed = time.perf_counter() - start
+    workflow.conn.close()
+    return elapsed / turns
+
+
+def main(args):
+    large = FakeChatModel(latency=args.large_latency)
+    fast = FakeChatModel(latency=args.fast_latency, responder=fast_responder)
+    routed = ModelRouter(models={"fast": fast, "large": large})
+    large_only = ModelRouter(
+        chain_tiers={"intent": "large", "booking_info": "large"}, models={"large": large}
+    )
+    runs = [("large only", large_only), ("fast first", routed)]
+    print(f"{'routing':<12}{'ms/turn':>10}")
+    for name, router in runs:
+        seconds = replay(router, large, args.conversations)
+        print(f"{name:<12}{seconds * 1000:>10.1f}")
+        for chain, stats in router.stats().items():
+            print(f"  {chain:<14}{stats}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--fast-latency", type=float, default=0.1, help="Seconds per fast model call")
+    parser.add_argument("--large-latency", type=float, default=0.4, help="Seconds per large model call")
+    parser.add_argument("--conversations", type=int, default=2)
+    main(parser.parse_args())
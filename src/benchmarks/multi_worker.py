@@ -0,0 +1,196 @@
+"""
+Multi-worker run: forks 1..N worker processes sharing one conversation database, the way
+gunicorn --preload forks the API's workers, and sends every turn to whichever worker is
+free, so most conversations move between processes from one turn to the next. Reports
+turns/s and turn p50/p95 per worker count, how many turns ran on another worker than the
+previous turn of their conversation, and whether every conversation ended in the same
+state as when it runs in a single process.
+
+Usage (from src/):
+    python -m benchmarks.multi_worker --workers 1 2 4 --threads 4 --conversations 40
+"""
+
+import os
+import time
+import random
+import argparse
+import tempfile
+import threading
+import multiprocessing
+
+from agent import BookingWorkflow
+from benchmarks.fake_llm import FakeChatModel
+from benchmarks.load_test import conversation_plan, percentiles, scripted_responder
+
+# Fields compared between the multi-worker run and the single-process reference
+STATE_KEYS = ("intent", "booking_information", "not_filled_keys")
+
+_workflow = None
+
+
+def get_workflow(args, db_path: str) -> BookingWorkflow:
+    """
+    Returns the workflow of the current worker, created after the fork like the API's.
+    """
+    global _workflow
+    if _workflow is None:
+        llm = FakeChatModel(
+            latency_sampler=lambda: random.lognormvariate(0, 0.5) * args.median_latency,
+            responder=scripted_responder,
+        )
+        _workflow = BookingWorkflow(
+            db_path=db_path,
+            llm=llm,
+            durability="end_of_turn",
+            busy_timeout=30.0,
+            connection_per_thread=True,
+        )
+    return _workflow
+
+
+def final_state(state: dict) -> dict:
+    return {key: state.get(key) for key in STATE_KEYS}
+
+
+def worker(args, db_path: str, jobs, results):
+    """
+    Serves jobs with `args.threads` threads, like a worker process handling several requests
+    at a time. A job is (conversation, thread_id, message); without a thread_id it opens a
+    session instead of running a turn.
+    """
+
+    def serve():
+        workflow = get_workflow(args, db_path)
+        while True:
+            job = jobs.get()
+            if job is None:
+                return
+            conversation, thread_id, message = job
+            start = time.perf_counter()
+            try:
+                if thread_id is None:
+                    results.put((conversation, os.getpid(), workflow.create_session(), None, None))
+                    continue
+                state = final_state(workflow.run_turn(thread_id, message))
+                results.put((conversation, os.getpid(), thread_id, state, time.perf_counter() - start))
+            except Exception as e:
+                results.put((conversation, os.getpid(), thread_id, repr(e), None))
+
+    threads = [threading.Thread(target=serve) for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def reference_states(plan: list[list[str]], directory: str) -> list[dict]:
+    """
+    Runs every distinct conversation of the plan in this process and returns its final state.
+    """
+    workflow = BookingWorkflow(
+        db_path=os.path.join(directory, "reference.db"),
+        llm=FakeChatModel(responder=scripted_responder),
+        durability="end_of_turn",
+    )
+    finals = {}
+    for messages in {tuple(messages) for messages in plan}:
+        thread_id = workflow.create_session()
+        for message in messages:
+            state = workflow.run_turn(thread_id, message)
+        finals[messages] = final_state(state)
+    workflow.conn.close()
+    return [finals[tuple(messages)] for messages in plan]
+
+
+def run(workers: int, plan: list[list[str]], expected: list[dict], args, directory: str) -> dict:
+    db_path = os.path.join(directory, f"workers-{workers}.db")
+    # Create the checkpoint tables once, as a deployment would before starting its workers
+    setup = BookingWorkflow(db_path=db_path, llm=FakeChatModel())
+    setup.saver.setup()
+    setup.conn.close()
+
+    context = multiprocessing.get_context("fork")
+    jobs, results = context.Queue(), context.Queue()
+    processes = [
+        context.Process(target=worker, args=(args, db_path, jobs, results)) for _ in range(workers)
+    ]
+    for process in processes:
+        process.start()
+
+    # Dispatch: every conversation opens a session, then sends its next turn when the
+    # previous one is answered; at most `args.concurrency` conversations are in flight
+    pending = list(range(len(plan)))
+    position = [0] * len(plan)
+    last_worker = [None] * len(plan)
+    finals = [None] * len(plan)
+    latencies, moved, errors = [], 0, []
+    in_flight = 0
+    start = time.perf_counter()
+    while pending or in_flight:
+        while pending and in_flight < args.concurrency:
+            jobs.put((pending.pop(0), None, None))
+            in_flight += 1
+        conversation, pid, thread_id, state, seconds = results.get()
+        if isinstance(state, str):
+            errors.append(state)
+            in_flight -= 1
+            continue
+        if state is not None:
+            latencies.append(seconds)
+            moved += last_worker[conversation] not in (None, pid)
+            finals[conversation] = state
+        last_worker[conversation] = pid
+        messages = plan[conversation]
+        if position[conversation] < len(messages):
+            jobs.put((conversation, thread_id, messages[position[conversation]]))
+            position[conversation] += 1
+        else:
+            in_flight -= 1
+    elapsed = time.perf_counter() - start
+
+    for _ in range(workers * args.threads):
+        jobs.put(None)
+    for process in processes:
+        process.join()
+
+    return {
+        "workers": workers,
+        "turns": len(latencies),
+        "turns_per_second": round(len(latencies) / elapsed, 2),
+        "turn": percentiles(latencies),
+        "moved": moved,
+        "errors": errors,
+        "consistent": sum(final == reference for final, reference in zip(finals, expected)),
+    }
+
+
+def main(args):
+    plan = conversation_plan(args.conversations, args.seed)
+    print(
+        f"{len(plan)} conversations, {sum(map(len, plan))} turns, {args.threads} threads per "
+        f"worker, {os.cpu_count()} CPUs\n"
+    )
+    print(f"{'workers':>8}{'turns/s':>10}{'p50 ms':>9}{'p95 ms':>9}{'moved':>8}{'errors':>8}{'consistent':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        expected = reference_states(plan, directory)
+        for workers in args.workers:
+            result = run(workers, plan, expected, args, directory)
+            print(
+                f"{workers:>8}{result['turns_per_second']:>10}"
+                f"{result['turn']['p50_ms']:>9}{result['turn']['p95_ms']:>9}"
+                f"{result['moved']:>8}{len(result['errors']):>8}"
+                f"{result['consistent']:>7}/{len(plan)}"
+            )
+            for error in result["errors"][:3]:
+                print(f"    {error}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--threads", type=int, default=4, help="Concurrent turns per worker")
+    parser.add_argument("--conversations", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=16, help="Conversations in flight")
+    parser.add_argument("--median-latency", type=float, default=0.05, help="Seconds per model call")
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
@@ -0,0 +1,195 @@
+"""
+Fuzzy guest-name lookup at millions of names: build time and memory of the trigram index,
+top-5 lookup latency and how often the intended guest ranks first or in the top 5 for
+misspelled, abbreviated and partial names, incremental adds and removes, and a full scan
+of the names for comparison.
+
+Usage (from src/):
+    python -m benchmarks.name_search --names 100000 1000000 2000000
+"""
+
+import time
+import random
+import argparse
+import resource
+
+from name_index import NameIndex, trigrams
+from benchmarks.load_test import percentiles
+
+FIRST_NAMES = [
+    "Hugo", "Maria", "Ana", "João", "Pedro", "Lucas", "Julia", "Beatriz", "Rafael", "Camila",
+    "Gabriel", "Laura", "Mateus", "Sofia", "Thiago", "Helena", "Bruno", "Alice", "Diego", "Clara",
+    "Miguel", "Valentina", "Arthur", "Isabela", "Heitor", "Manuela", "Davi", "Giovanna", "Bernardo",
+    "Luiza", "Samuel", "Mariana", "Enzo", "Larissa", "Gustavo", "Fernanda", "Felipe", "Carolina",
+    "Leonardo", "Amanda", "Daniel", "Bianca", "Eduardo", "Letícia", "Vinícius", "Natália",
+]
+# Surnames are two to four syllables of Portuguese-like spelling, e.g. "Brandeiro"
+SYLLABLES = [
+    onset + vowel + coda
+    for onset in ("", "b", "c", "d", "f", "g", "j", "l", "m", "n", "p", "r", "s", "t", "v", "z",
+                  "br", "cr", "dr", "fr", "gr", "pr", "tr", "ch", "lh", "nh", "qu", "gu")
+    for vowel in ("a", "e", "i", "o", "u", "ei", "ou", "ai", "ão")
+    for coda in ("", "", "r", "s", "l", "n", "m")
+]
+QUERY_KINDS = ("exact", "typo", "two typos", "initial", "surname only")
+
+
+def random_surname(rng: random.Random) -> str:
+    return "".join(rng.choice(SYLLABLES) for _ in range(rng.choice((2, 3, 3, 4)))).capitalize()
+
+
+def random_names(count: int, rng: random.Random) -> list[str]:
+    """
+    Returns `count` distinct names: a first name and one or two surnames.
+    """
+    names = set()
+    while len(names) < count:
+        surnames = [random_surname(rng) for _ in range(rng.choice((1, 2)))]
+        names.add(" ".join([rng.choice(FIRST_NAMES), *surnames]).lower())
+    return list(names)
+
+
+def typo(text: str, rng: random.Random) -> str:
+    position = rng.randrange(1, len(text) - 1)
+    kind = rng.choice(("replace", "delete", "swap", "insert"))
+    letter = rng.choice("abcdefghijklmnopqrstuvwxyz")
+    if kind == "replace":
+        return text[:position] + letter + text[position + 1 :]
+    if kind == "delete":
+        return text[:position] + text[position + 1 :]
+    if kind == "swap":
+        return text[: position - 1] + text[position] + text[position - 1] + text[position + 1 :]
+    return text[:position] + letter + text[position:]
+
+
+def query_for(name: str, kind: str, rng: random.Random) -> str:
+    words = name.title().split()
+    if kind == "typo":
+        return typo(" ".join(words), rng)
+    if kind == "two typos":
+        return typo(typo(" ".join(words), rng), rng)
+    if kind == "initial":
+        return " ".join([f"{words[0][0]}.", *words[1:]])
+    if kind == "surname only":
+        return " ".join(words[1:])
+    return " ".join(words)
+
+
+def max_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def scan(
+    names: list[str], query: str, limit: int = 5, min_score: float = 0.3
+) -> list[tuple[str, float]]:
+    """
+    The index's ranking computed name by name, without the index.
+    """
+    grams = trigrams(query)
+    scored = []
+    for name in names:
+        other = trigrams(name)
+        shared = len(grams & other)
+        score = shared / (len(grams) + len(other) - shared)
+        if score >= min_score:
+            scored.append((name, score))
+    return sorted(scored, key=lambda pair: -pair[1])[:limit]
+
+
+def run(count: int, args, rng: random.Random):
+    names = random_names(count, rng)
+    rss = max_rss_mb()
+    start = time.perf_counter()
+    index = NameIndex(names)
+    build = time.perf_counter() - start
+    stats = index.stats()
+    print(
+        f"{count:,} names: built in {build:.1f}s ({count / build:,.0f} names/s), "
+        f"{stats['trigrams']:,} trigrams, id arrays {stats['postings_bytes'] / count:.0f} "
+        f"bytes per name, resident memory +{max_rss_mb() - rss:,.0f} MB"
+    )
+
+    # "top 5" is a ranked list as /reservations/search returns it, names within --within of the
+    # best one, and "best" the single closest name that resolving a guest starts from
+    print(
+        f"{'query':<14}{'top-1':>8}{'top-5':>8}{'top 5 p50':>11}{'p95':>8}{'p99':>8}"
+        f"{'best p50':>10}{'p95':>8}{'p99':>8}  (ms)"
+    )
+    exact = []
+    for kind in QUERY_KINDS:
+        targets = [rng.choice(names) for _ in range(args.queries)]
+        queries = [query_for(name, kind, rng) for name in targets]
+        latencies, best, first, top = [], [], 0, 0
+        for target, query in zip(targets, queries):
+            start = time.perf_counter()
+            matches = index.search(query, limit=5, within=args.within)
+            latencies.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            index.search(query, limit=1)
+            best.append(time.perf_counter() - start)
+            if len(exact) < args.queries:
+                start = time.perf_counter()
+                index.search(query, limit=5)
+                exact.append(time.perf_counter() - start)
+            found = [name for name, _ in matches]
+            first += bool(found) and found[0] == target
+            top += target in found
+        top5, best = percentiles(latencies), percentiles(best)
+        print(
+            f"{kind:<14}{first / len(queries):>8.1%}{top / len(queries):>8.1%}"
+            f"{top5['p50_ms']:>11.2f}{top5['p95_ms']:>8.2f}{top5['p99_ms']:>8.2f}"
+            f"{best['p50_ms']:>10.2f}{best['p95_ms']:>8.2f}{best['p99_ms']:>8.2f}"
+        )
+
+    exact = percentiles(exact)
+    print(
+        f"exact top 5, every name down to 0.3: p50 {exact['p50_ms']:.2f} ms, "
+        f"p95 {exact['p95_ms']:.2f} ms\n"
+    )
+
+    added = random_names(args.updates, rng)
+    start = time.perf_counter()
+    for name in added:
+        index.add(name)
+    add_us = (time.perf_counter() - start) / len(added) * 1e6
+    start = time.perf_counter()
+    for name in added:
+        index.remove(name)
+    remove_us = (time.perf_counter() - start) / len(added) * 1e6
+    print(f"add: {add_us:.1f} us per name, remove: {remove_us:.1f} us per name")
+
+    if args.scans:
+        elapsed, same = 0.0, 0
+        for _ in range(args.scans):
+            query = query_for(rng.choice(names), rng.choice(QUERY_KINDS), rng)
+            start = time.perf_counter()
+            expected = scan(names, query)
+            elapsed += time.perf_counter() - start
+            # Names with equal scores can come in any order
+            same += {round(score, 9) for _, score in index.search(query, limit=5)} == {
+                round(score, 9) for _, score in expected
+            }
+        print(
+            f"full scan: {elapsed / args.scans * 1000:,.0f} ms per query, "
+            f"same top 5 scores as the index: {same}/{args.scans}"
+        )
+    print()
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    for count in args.names:
+        run(count, args, rng)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--names", type=int, nargs="+", default=[100_000, 1_000_000, 2_000_000])
+    parser.add_argument("--queries", type=int, default=1000, help="Lookups timed per query kind")
+    parser.add_argument(
+        "--within", type=float, default=0.2, help="Score range below the best match of a top 5"
+    )
+    parser.add_argument("--updates", type=int, default=10_000, help="Names added then removed")
+    parser.add_argument("--scans", type=int, default=3, help="Queries answered by a full scan too")
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
@@ -0,0 +1,75 @@
+"""
+booking_errors as it was before the rules were compiled once and shared with
+bulk_validation.py, kept unchanged as the baseline of benchmarks.bulk_validation. Like the
+original, it raises ValueError when both dates are given and one is malformed.
+"""
+
+import re
+from datetime import datetime
+
+from intent_rules import VALID_PAYMENT_METHODS
+
+
+def is_valid_date_format(date_string: str) -> bool:
+    pattern = r"^\d{4}-\d{2}-\d{2}$"
+    if not re.match(pattern, date_string):
+        return False
+    try:
+        datetime.strptime(date_string, "%Y-%m-%d")
+        return True
+    except ValueError:
+        return False
+
+
+def booking_errors(info: dict) -> list[tuple[str, list[str]]]:
+    """
+    Checks the booking fields present in `info`, as done by validate_information.
+
+    Args:
+        info (dict): Booking fields, e.g. the conversation state or freshly extracted values.
+
+    Returns:
+        list: One (error message, fields to ask for again) pair per failed rule.
+    """
+    errors = []
+
+    # Validate full_name
+    if "full_name" in info and len(info["full_name"]) < 3:
+        errors.append(("Full name must be at least 3 characters long.", ["full_name"]))
+
+    # Validate check_in_date
+    if "check_in_date" in info:
+        if not is_valid_date_format(info["check_in_date"]):
+            errors.append(("Check-in date format is invalid (YYYY-MM-DD).", ["check_in_date"]))
+        elif datetime.strptime(info["check_in_date"], "%Y-%m-%d") < datetime.today():
+            errors.append(("Check-in date cannot be in the past.", ["check_in_date"]))
+
+    # Validate check_out_date
+    if "check_out_date" in info:
+        if not is_valid_date_format(info["check_out_date"]):
+            errors.append(("Check-out date format is invalid (YYYY-MM-DD).", ["check_out_date"]))
+        elif datetime.strptime(info["check_out_date"], "%Y-%m-%d") < datetime.today():
+            errors.append(("Check-out date cannot be in the past.", ["check_out_date"]))
+
+    # Validate date order
+    if "check_in_date" in info and "check_out_date" in info:
+        if datetime.strptime(info["check_out_date"], "%Y-%m-%d") <= datetime.strptime(
+            info["check_in_date"], "%Y-%m-%d"
+        ):
+            errors.append((
+                "Check-out date must be after check-in date.",
+                ["check_in_date", "check_out_date"],
+            ))
+
+    # Validate num_guests
+    if "num_guests" in info and info["num_guests"] <= 0:
+        errors.append(("Number of guests must be positive.", ["num_guests"]))
+
+    # Validate payment_method
+    if "payment_method" in info and info["payment_method"].lower() not in VALID_PAYMENT_METHODS:
+        errors.append((
+            f"Invalid payment method. Please choose from: {', '.join(VALID_PAYMENT_METHODS)}.",
+            ["payment_method"],
+        ))
+
+    return errors
@@ -0,0 +1,123 @@
+"""
+Insert and lookup costs of the reservations store at a million rows: bulk load rate,
+single-booking saves as validate_information makes them, and lookups by booking reference,
+guest name and check-in/check-out date, with a full scan of the table for comparison.
+
+Usage (from src/):
+    python -m benchmarks.reservations --rows 1000000
+"""
+
+import os
+import time
+import random
+import argparse
+import tempfile
+from datetime import date, timedelta
+
+from reservations import ReservationStore
+from benchmarks.checkpoint_durability import file_size
+from benchmarks.load_test import percentiles
+
+FIRST_NAMES = [
+    "Hugo", "Maria", "Ana", "João", "Pedro", "Lucas", "Julia", "Beatriz", "Rafael", "Camila",
+    "Gabriel", "Laura", "Mateus", "Sofia", "Thiago", "Helena", "Bruno", "Alice", "Diego", "Clara",
+]
+LAST_NAMES = [
+    "Albuquerque", "Silva", "Costa", "Santos", "Oliveira", "Souza", "Lima", "Pereira", "Ferreira",
+    "Almeida", "Ribeiro", "Carvalho", "Gomes", "Martins", "Rocha", "Barbosa", "Teixeira", "Moreira",
+]
+PAYMENT_METHODS = ["credit card", "debit card", "cash", "paypal"]
+
+
+def random_booking(rng: random.Random) -> dict:
+    check_in = date(2030, 1, 1) + timedelta(days=rng.randrange(3 * 365))
+    # A middle name number keeps roughly ten bookings per distinct guest at a million rows
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {rng.randrange(300)}"
+    return {
+        "full_name": name,
+        "check_in_date": check_in.isoformat(),
+        "check_out_date": (check_in + timedelta(days=rng.randint(1, 14))).isoformat(),
+        "num_guests": rng.randint(1, 4),
+        "payment_method": rng.choice(PAYMENT_METHODS),
+        "breakfast_included": rng.random() < 0.5,
+    }
+
+
+def timed(calls: int, call) -> dict:
+    latencies = []
+    for index in range(calls):
+        start = time.perf_counter()
+        call(index)
+        latencies.append(time.perf_counter() - start)
+    return percentiles(latencies)
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "reservations.db")
+        store = ReservationStore(path)
+
+        start = time.perf_counter()
+        references, bookings = [], []
+        loaded = 0
+        while loaded < args.rows:
+            chunk = [random_booking(rng) for _ in range(min(args.chunk, args.rows - loaded))]
+            references.extend(store.insert_many(chunk))
+            bookings.extend(chunk[:: max(1, len(chunk) // 100)])
+            loaded += len(chunk)
+        elapsed = time.perf_counter() - start
+        # The store has no room types, as in the API by default
+        stored = store.count()
+        if stored != loaded or len(set(references)) != loaded:
+            raise SystemExit(f"bulk load stored {stored} of {loaded} rows")
+        print(
+            f"bulk load: {loaded} rows in {elapsed:.1f}s ({loaded / elapsed:,.0f} rows/s), "
+            f"{file_size(path) / loaded:.0f} bytes per row\n"
+        )
+
+        samples = [rng.randrange(len(references)) for _ in range(args.lookups)]
+        names = [rng.choice(bookings)["full_name"] for _ in range(args.lookups)]
+        days = [rng.choice(bookings) for _ in range(args.lookups)]
+        results = {
+            "save (new)": timed(args.saves, lambda i: store.save(random_booking(rng))),
+            "save (update)": timed(
+                args.saves, lambda i: store.save(random_booking(rng), references[samples[i]])
+            ),
+            "get reference": timed(args.lookups, lambda i: store.get(references[samples[i]])),
+            "find name": timed(args.lookups, lambda i: store.find_by_name(names[i])),
+            "find check-in": timed(
+                args.lookups, lambda i: store.find_by_dates(check_in_date=days[i]["check_in_date"])
+            ),
+            "find check-out": timed(
+                args.lookups,
+                lambda i: store.find_by_dates(check_out_date=days[i]["check_out_date"]),
+            ),
+            "scan name": timed(
+                args.scans,
+                lambda i: store.conn.execute(
+                    # The unary plus keeps SQLite from using the name index
+                    "SELECT reference FROM reservations WHERE +name_key = ?",
+                    (names[i].lower(),),
+                ).fetchall(),
+            ),
+        }
+        print(f"{'operation':<16}{'calls':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+        for name, stats in results.items():
+            print(
+                f"{name:<16}{stats['count']:>7}{stats['p50_ms']:>9.3f}"
+                f"{stats['p95_ms']:>9.3f}{stats['p99_ms']:>9.3f}"
+            )
+        print(f"\nrows: {store.count()}")
+        store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--chunk", type=int, default=50_000, help="Rows per bulk insert")
+    parser.add_argument("--saves", type=int, default=1000, help="Single saves timed")
+    parser.add_argument("--lookups", type=int, default=10_000, help="Lookups timed per kind")
+    parser.add_argument("--scans", type=int, default=5, help="Unindexed lookups timed")
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
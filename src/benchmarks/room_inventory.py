@@ -0,0 +1,337 @@
+"""
+Room availability at 10,000 rooms over 365 nights: filling the inventory to a target
+occupancy, "is there a room for num_guests from check-in to check-out" lookups on the
+segment trees against a scan of the nightly counts and a scan of all the holds, bulk loads
+and saves of the reservations store with its rooms, and threads and processes racing for
+the last rooms of a night.
+
+Usage (from src/):
+    python -m benchmarks.room_inventory --rooms 10000 --nights 365
+"""
+
+import os
+import time
+import random
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+import numpy as np
+
+from inventory import RoomInventory, RoomUnavailableError
+from reservations import ReservationStore
+from benchmarks.checkpoint_durability import file_size
+from benchmarks.load_test import percentiles
+
+# Share of the rooms of each type, and guests per room
+ROOM_MIX = {"single": (1, 0.2), "double": (2, 0.5), "family": (4, 0.2), "suite": (6, 0.1)}
+GUESTS = [1] * 25 + [2] * 50 + [3] * 8 + [4] * 10 + [5] * 4 + [6] * 3
+PAYMENT_METHODS = ["credit card", "debit card", "cash", "paypal"]
+
+
+def room_types(rooms: int) -> dict[str, tuple[int, int]]:
+    return {name: (capacity, round(rooms * share)) for name, (capacity, share) in ROOM_MIX.items()}
+
+
+def day(offset: int) -> str:
+    return (date.today() + timedelta(days=offset)).isoformat()
+
+
+def random_stay(rng: random.Random, nights: int, longest: int = 14) -> tuple[int, int, int]:
+    length = rng.randint(1, min(longest, nights - 1))
+    start = rng.randint(1, nights - length)
+    return rng.choice(GUESTS), start, start + length
+
+
+def booking(guests: int, start: int, stop: int, index: int) -> dict:
+    return {
+        "full_name": f"Guest {index}",
+        "check_in_date": day(start),
+        "check_out_date": day(stop),
+        "num_guests": guests,
+        "payment_method": PAYMENT_METHODS[index % len(PAYMENT_METHODS)],
+        "breakfast_included": index % 2 == 0,
+    }
+
+
+def timed(calls: list, call) -> dict:
+    latencies = []
+    for args in calls:
+        start = time.perf_counter()
+        call(*args)
+        latencies.append(time.perf_counter() - start)
+    return percentiles(latencies)
+
+
+def fill(args, rng: random.Random):
+    """
+    Books random stays into an in-memory inventory until the target occupancy, keeping
+    the nightly counts and the list of holds of every type for the scans.
+    """
+    types = room_types(args.rooms)
+    inventory = RoomInventory(types, nights=args.nights + 1)
+    counts = {name: [0] * (args.nights + 1) for name in types}
+    holds = {name: [] for name in types}
+    accepted, refused, held = [], 0, 0
+    target = args.occupancy * args.rooms * args.nights
+    start_time = time.perf_counter()
+    # Refusals pile up as the hotel fills, so stop once most stays find no room
+    while held < target and refused < 20 * (len(accepted) + 1000):
+        guests, start, stop = random_stay(rng, args.nights)
+        reference = f"B{len(accepted)}"
+        try:
+            room_type = inventory.room_for(guests, day(start), day(stop))
+        except RoomUnavailableError:
+            refused += 1
+            continue
+        inventory.hold(reference, room_type, day(start), day(stop))
+        accepted.append((guests, start, stop))
+        holds[room_type].append((start, stop))
+        for night in range(start, stop):
+            counts[room_type][night] += 1
+        held += stop - start
+    elapsed = time.perf_counter() - start_time
+    print(
+        f"{args.rooms:,} rooms, {args.nights} nights: {len(accepted):,} bookings held, "
+        f"{refused:,} refused, {held / (args.rooms * args.nights):.1%} of the room nights "
+        f"taken, {(len(accepted) + refused) / elapsed:,.0f} checks/s while filling\n"
+    )
+    return inventory, counts, holds, accepted
+
+
+def scan_counts(counts: dict, types: dict, guests: int, start: int, stop: int):
+    for name, (capacity, rooms) in types.items():
+        if capacity >= guests and max(counts[name][start:stop]) < rooms:
+            return name
+    return None
+
+
+def scan_holds(arrays: dict, types: dict, guests: int, start: int, stop: int):
+    # Busiest night of the stay from every hold of the type that overlaps it
+    for name, (capacity, rooms) in types.items():
+        if capacity < guests:
+            continue
+        starts, stops = arrays[name]
+        overlap = (starts < stop) & (stops > start)
+        changes = np.zeros(stop - start + 1, dtype=np.int64)
+        np.add.at(changes, np.maximum(starts[overlap], start) - start, 1)
+        np.add.at(changes, np.minimum(stops[overlap], stop) - start, -1)
+        if np.cumsum(changes).max() < rooms:
+            return name
+    return None
+
+
+def lookups(args, rng: random.Random, inventory: RoomInventory, counts: dict, holds: dict):
+    types = inventory.room_types
+    arrays = {
+        name: (
+            np.array([start for start, _ in pairs], dtype=np.int64),
+            np.array([stop for _, stop in pairs], dtype=np.int64),
+        )
+        for name, pairs in holds.items()
+    }
+    print(f"{'lookup':<34}{'calls':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for label, longest in (("stays of 1-14 nights", 14), ("stays of up to 180 nights", 180)):
+        stays = [random_stay(rng, args.nights, longest) for _ in range(args.lookups)]
+        dates = [(guests, day(start), day(stop)) for guests, start, stop in stays]
+
+        def room_for(guests, check_in, check_out):
+            try:
+                return inventory.room_for(guests, check_in, check_out)
+            except RoomUnavailableError:
+                return None
+
+        answers = [room_for(*stay) for stay in dates]
+        same = sum(
+            answer == scan_counts(counts, types, *stay) for answer, stay in zip(answers, stays)
+        )
+        results = {
+            "segment trees": timed(dates, room_for),
+            "scan of the nightly counts": timed(
+                stays, lambda *stay: scan_counts(counts, types, *stay)
+            ),
+            "scan of the holds (numpy)": timed(
+                stays[: args.scans], lambda *stay: scan_holds(arrays, types, *stay)
+            ),
+        }
+        print(
+            f"{label}, {answers.count(None) / len(answers):.0%} refused, "
+            f"same answer as the scan: {same}/{len(stays)}"
+        )
+        for name, stats in results.items():
+            print(
+                f"  {name:<32}{stats['count']:>7}{stats['p50_ms']:>9.3f}"
+                f"{stats['p95_ms']:>9.3f}{stats['p99_ms']:>9.3f}"
+            )
+    stays = [random_stay(rng, args.nights) for _ in range(args.lookups)]
+    hold_ms = timed(
+        [(f"X{i}", "double", day(start), day(stop)) for i, (_, start, stop) in enumerate(stays)],
+        inventory.hold,
+    )
+    release_ms = timed([(f"X{i}",) for i in range(len(stays))], inventory.release)
+    print(
+        f"hold: p50 {hold_ms['p50_ms']:.3f} ms, release: p50 {release_ms['p50_ms']:.3f} ms\n"
+    )
+
+
+def store(args, rng: random.Random, accepted: list):
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "reservations.db")
+        reservations = ReservationStore(path, room_types=room_types(args.rooms))
+        start = time.perf_counter()
+        loaded = 0
+        for offset in range(0, len(accepted), args.chunk):
+            chunk = [
+                booking(guests, check_in, check_out, offset + i)
+                for i, (guests, check_in, check_out) in enumerate(
+                    accepted[offset : offset + args.chunk]
+                )
+            ]
+            reservations.insert_many(chunk)
+            loaded += len(chunk)
+        elapsed = time.perf_counter() - start
+        print(
+            f"store: {loaded:,} bookings loaded with their rooms in {elapsed:.1f}s "
+            f"({loaded / elapsed:,.0f} bookings/s), {file_size(path) / loaded:.0f} bytes each"
+        )
+        start = time.perf_counter()
+        reopened = ReservationStore(path, room_types=room_types(args.rooms))
+        print(f"reopened with {len(reopened.rooms):,} holds in {time.perf_counter() - start:.1f}s")
+        reopened.close()
+
+        stays = [random_stay(rng, args.nights) for _ in range(args.saves)]
+        saved = refused = 0
+
+        def save(guests, check_in, check_out):
+            nonlocal saved, refused
+            try:
+                reservations.save(booking(guests, check_in, check_out, saved))
+                saved += 1
+            except RoomUnavailableError:
+                refused += 1
+
+        save_ms = timed(stays, save)
+
+        def room_for(guests, check_in, check_out):
+            try:
+                reservations.room_for(guests, check_in, check_out)
+            except RoomUnavailableError:
+                pass
+
+        check_ms = timed(
+            [(guests, day(start), day(stop)) for guests, start, stop in stays], room_for
+        )
+        print(
+            f"save with a room check: p50 {save_ms['p50_ms']:.3f} ms, p95 "
+            f"{save_ms['p95_ms']:.3f} ms ({saved} saved, {refused} refused); "
+            f"room check alone: p50 {check_ms['p50_ms']:.3f} ms"
+        )
+        overbooked = overbooked_nights(reservations, args.nights)
+        print(f"nights with more bookings than rooms: {overbooked}\n")
+        reservations.close()
+
+
+def overbooked_nights(reservations: ReservationStore, nights: int) -> int:
+    """
+    Recounts the rooms held per night from the room_holds table.
+    """
+    first = date.today().toordinal()
+    overbooked = 0
+    for name, (_, rooms) in reservations.rooms.room_types.items():
+        changes = np.zeros(nights + 400, dtype=np.int64)
+        for check_in, check_out in reservations.conn.execute(
+            "SELECT check_in_date, check_out_date FROM room_holds WHERE room_type = ?", (name,)
+        ):
+            changes[date.fromisoformat(check_in).toordinal() - first] += 1
+            changes[date.fromisoformat(check_out).toordinal() - first] -= 1
+        overbooked += int((np.cumsum(changes) > rooms).sum())
+    return overbooked
+
+
+def race_worker(path: str, rooms: int, attempts: int, queue):
+    reservations = ReservationStore(path, room_types={"double": (2, rooms)})
+    booked = 0
+    for index in range(attempts):
+        try:
+            reservations.save(booking(2, 30, 32, index))
+            booked += 1
+        except RoomUnavailableError:
+            pass
+    queue.put(booked)
+
+
+def race(args):
+    """
+    Threads of one store, then processes with a store each, all booking the same two nights
+    of a hotel with args.race_rooms rooms; exactly that many bookings must go through.
+    """
+    for label in ("threads", "processes"):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "race.db")
+            reservations = ReservationStore(path, room_types={"double": (2, args.race_rooms)})
+            start = time.perf_counter()
+            if label == "threads":
+                with ThreadPoolExecutor(args.workers) as pool:
+                    outcomes = list(
+                        pool.map(
+                            lambda index: race_attempt(reservations, index),
+                            range(args.workers * args.attempts),
+                        )
+                    )
+                booked = sum(outcomes)
+            else:
+                queue = multiprocessing.Queue()
+                workers = [
+                    multiprocessing.Process(
+                        target=race_worker, args=(path, args.race_rooms, args.attempts, queue)
+                    )
+                    for _ in range(args.workers)
+                ]
+                for worker in workers:
+                    worker.start()
+                booked = sum(queue.get() for _ in workers)
+                for worker in workers:
+                    worker.join()
+            elapsed = time.perf_counter() - start
+            print(
+                f"{args.workers} {label} x {args.attempts} attempts on {args.race_rooms} rooms: "
+                f"{booked} booked in {elapsed:.2f}s, overbooked nights: "
+                f"{overbooked_nights(reservations, args.nights)}"
+            )
+            reservations.close()
+
+
+def race_attempt(reservations: ReservationStore, index: int) -> bool:
+    try:
+        reservations.save(booking(2, 30, 32, index))
+        return True
+    except RoomUnavailableError:
+        return False
+
+
+def main(args):
+    rng = random.Random(args.seed)
+    inventory, counts, holds, accepted = fill(args, rng)
+    lookups(args, rng, inventory, counts, holds)
+    store(args, rng, accepted)
+    race(args)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rooms", type=int, default=10_000)
+    parser.add_argument("--nights", type=int, default=365)
+    parser.add_argument(
+        "--occupancy", type=float, default=0.95, help="Share of the room nights to fill"
+    )
+    parser.add_argument("--lookups", type=int, default=10_000, help="Lookups timed per stay length")
+    parser.add_argument("--scans", type=int, default=200, help="Lookups timed on the hold scan")
+    parser.add_argument("--chunk", type=int, default=20_000, help="Bookings per bulk insert")
+    parser.add_argument("--saves", type=int, default=1000, help="Single saves timed")
+    parser.add_argument("--race-rooms", type=int, default=10, help="Rooms the racers compete for")
+    parser.add_argument("--workers", type=int, default=4, help="Racing threads and processes")
+    parser.add_argument("--attempts", type=int, default=25, help="Bookings tried per racer")
+    parser.add_argument("--seed", type=int, default=0)
+    main(parser.parse_args())
@@ -0,0 +1,68 @@
+"""
+Compares sequential intent detection and slot extraction with the speculative mode that
+runs both concurrently, reporting turn latency, speculation hit rate and wasted tokens
+against a fake chat model.
+
+Usage (from src/):
+    python -m benchmarks.speculative_extraction --latency 0.3
+"""
+
+import time
+import argparse
+
+from agent import BookingWorkflow
+from pydantic_classes import IntentClassification
+from benchmarks.fake_llm import FakeChatModel, default_responder
+
+# Questions in the middle of a reservation are classified as "other", so their
+# speculative extraction is dropped
+CONVERSATION = [
+    "Hi, I would like to book a room",
+    "Hugo Albuquerque",
+    "Is parking included?",
+    "From 2025-12-01 to 2025-12-05",
+    "2 guests",
+    "Do you accept pets?",
+    "credit card",
+    "yes, with breakfast",
+]
+
+
+def responder(messages, schema):
+    if schema is IntentClassification and "?" in messages[-1].content.split("User's reply:")[-1]:
+        return IntentClassification(intent="other")
+    return default_responder(messages, schema)
+
+
+def replay(speculative: bool, latency: float, conversations: int):
+    llm = FakeChatModel(latency=latency, responder=responder)
+    workflow = BookingWorkflow(
+        db_path=":memory:", llm=llm, speculative_extraction=speculative
+    )
+    turns = 0
+    start = time.perf_counter()
+    for _ in range(conversations):
+        thread_id = workflow.create_session()
+        for message in CONVERSATION:
+            workflow.run_turn(thread_id, message)
+            turns += 1
+    elapsed = time.perf_counter() - start
+    workflow.conn.close()
+    return elapsed / turns, llm.calls / turns, workflow.speculation_stats
+
+
+def main(args):
+    print(f"{'mode':<12}{'ms/turn':>10}{'LLM calls/turn':>16}")
+    for speculative in (False, True):
+        seconds, calls, stats = replay(speculative, args.latency, args.conversations)
+        mode = "speculative" if speculative else "sequential"
+        print(f"{mode:<12}{seconds * 1000:>10.1f}{calls:>16.2f}")
+        if stats is not None:
+            print(f"speculation: {stats.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.3, help="Seconds per fake LLM call")
+    parser.add_argument("--conversations", type=int, default=3)
+    main(parser.parse_args())
@@ -0,0 +1,81 @@
+"""
+Measures the latency users see with and without streaming: the time until the whole
+response is returned by arun_turn, and the time to first token of astream_turn, against
+a fake chat model that streams its answers word by word.
+
+Usage (from src/):
+    python -m benchmarks.streaming_ttft --latency 0.3 --token-latency 0.03
+"""
+
+import time
+import asyncio
+import argparse
+import statistics
+
+from agent import BookingWorkflow
+from benchmarks.fake_llm import FakeChatModel
+
+CONVERSATION = [
+    "Hi, I would like to book a room",
+    "Hugo Albuquerque",
+    "From 2025-12-01 to 2025-12-05",
+    "2 guests",
+    "credit card",
+    "yes, with breakfast",
+]
+
+
+async def blocking_turns(workflow: BookingWorkflow) -> list[float]:
+    thread_id = await workflow.acreate_session()
+    latencies = []
+    for message in CONVERSATION:
+        start = time.perf_counter()
+        await workflow.arun_turn(thread_id, message)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+async def streamed_turns(workflow: BookingWorkflow) -> tuple[list[float], list[float]]:
+    thread_id = await workflow.acreate_session()
+    first_tokens, totals = [], []
+    for message in CONVERSATION:
+        start = time.perf_counter()
+        first_token = None
+        async for kind, _ in workflow.astream_turn(thread_id, message):
+            if kind == "token" and first_token is None:
+                first_token = time.perf_counter() - start
+        first_tokens.append(first_token)
+        totals.append(time.perf_counter() - start)
+    return first_tokens, totals
+
+
+async def main(args):
+    llm = FakeChatModel(latency=args.latency, token_latency=args.token_latency)
+    workflow = BookingWorkflow(db_path=":memory:", llm=llm, durability="end_of_turn")
+
+    blocking = []
+    first_tokens, totals = [], []
+    for _ in range(args.conversations):
+        blocking += await blocking_turns(workflow)
+        streamed = await streamed_turns(workflow)
+        first_tokens += streamed[0]
+        totals += streamed[1]
+    await workflow.aclose()
+
+    print(f"{'':<28}{'p50 ms':>10}{'max ms':>10}")
+    for name, values in (
+        ("run_turn, full response", blocking),
+        ("stream_turn, first token", first_tokens),
+        ("stream_turn, full response", totals),
+    ):
+        print(
+            f"{name:<28}{statistics.median(values) * 1000:>10.1f}{max(values) * 1000:>10.1f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.3, help="Seconds before the first token")
+    parser.add_argument("--token-latency", type=float, default=0.03, help="Seconds between tokens")
+    parser.add_argument("--conversations", type=int, default=3)
+    asyncio.run(main(parser.parse_args()))
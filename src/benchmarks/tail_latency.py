@@ -0,0 +1,105 @@
+"""
+Turn latency percentiles with an injected long-tail LLM latency, for the plain workflow,
+hedged chain calls, per-node deadlines, and both.
+
+Usage (from src/):
+    python -m benchmarks.tail_latency --turns 300 --slow-share 0.05
+"""
+
+import os
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import statistics
+
+from agent import BookingWorkflow
+from hedging import HEDGED_CHAINS, Hedger
+from benchmarks.fake_llm import FakeChatModel
+
+CONVERSATION = [
+    "Hi, I would like to book a room",
+    "Hugo Albuquerque",
+    "From 2025-12-01 to 2025-12-05",
+    "2 guests",
+    "credit card",
+    "yes, with breakfast",
+]
+
+# arun_turn does not stream, so the response chains can be hedged as well
+BENCHMARK_HEDGED_CHAINS = HEDGED_CHAINS + ("response", "summarization", "correction")
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def replay(workflow: BookingWorkflow, turns: int, concurrency: int) -> list[float]:
+    latencies = []
+
+    async def conversation(count: int):
+        thread_id = await workflow.acreate_session()
+        for index in range(count):
+            start = time.perf_counter()
+            await workflow.arun_turn(thread_id, CONVERSATION[index % len(CONVERSATION)])
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(conversation(turns // concurrency) for _ in range(concurrency)))
+    return latencies
+
+
+async def main(args):
+    def sampler():
+        # Mostly fast calls around the median, with a share of very slow ones
+        if random.random() < args.slow_share:
+            return args.slow_latency
+        return random.lognormvariate(0, 0.3) * args.median_latency
+
+    deadlines = dict.fromkeys(BookingWorkflow.LLM_NODES, args.deadline)
+    runs = [
+        ("plain", {}),
+        ("hedged", {"hedger": Hedger(args.hedge_percentile, chains=BENCHMARK_HEDGED_CHAINS)}),
+        ("deadlines", {"node_deadlines": deadlines}),
+        (
+            "both",
+            {
+                "hedger": Hedger(args.hedge_percentile, chains=BENCHMARK_HEDGED_CHAINS),
+                "node_deadlines": deadlines,
+            },
+        ),
+    ]
+    print(f"{'mode':<11}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'mean ms':>9}{'LLM calls':>11}")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, options in runs:
+            random.seed(args.seed)
+            llm = FakeChatModel(latency_sampler=sampler)
+            workflow = BookingWorkflow(
+                db_path=os.path.join(directory, f"{name}.db"),
+                llm=llm,
+                durability="end_of_turn",
+                **options,
+            )
+            latencies = await replay(workflow, args.turns, args.concurrency)
+            await workflow.aclose()
+            print(
+                f"{name:<11}"
+                f"{percentile(latencies, 0.5) * 1000:>9.1f}"
+                f"{percentile(latencies, 0.95) * 1000:>9.1f}"
+                f"{percentile(latencies, 0.99) * 1000:>9.1f}"
+                f"{statistics.mean(latencies) * 1000:>9.1f}"
+                f"{llm.calls:>11}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--median-latency", type=float, default=0.05, help="Median seconds per call")
+    parser.add_argument("--slow-latency", type=float, default=1.0, help="Seconds per slow call")
+    parser.add_argument("--slow-share", type=float, default=0.05, help="Share of slow calls")
+    parser.add_argument("--hedge-percentile", type=float, default=0.9)
+    parser.add_argument("--deadline", type=float, default=0.3, help="Seconds per node")
+    parser.add_argument("--seed", type=int, default=0)
+    asyncio.run(main(parser.parse_args()))
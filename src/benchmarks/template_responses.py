@@ -0,0 +1,92 @@
+"""
+LLM responses against template responses: replays the scripted load-test conversations with
+a fake chat model whose free-text answers take longer than its structured ones, as with
+gpt-4o completions next to extraction calls, once with every response written by the LLM
+and once in template mode. Reports model calls, the share of turns served without any
+chat model call, and turn latency.
+
+Usage (from src/):
+    python -m benchmarks.template_responses --rounds 5
+"""
+
+import os
+import time
+import argparse
+import tempfile
+
+from agent import BookingWorkflow
+from benchmarks.fake_llm import FakeChatModel
+from benchmarks.load_test import CONVERSATIONS, percentiles, scripted_responder
+
+
+class TimedResponder:
+    """
+    Scripted answers, sleeping longer for free-text completions than for structured calls.
+    """
+
+    def __init__(self, completion_latency: float, structured_latency: float):
+        self.completion_latency = completion_latency
+        self.structured_latency = structured_latency
+
+    def __call__(self, messages, schema):
+        time.sleep(self.completion_latency if schema is None else self.structured_latency)
+        return scripted_responder(messages, schema)
+
+
+def main(args):
+    responder = TimedResponder(args.completion_latency, args.structured_latency)
+    print(
+        f"{'mode':<10}{'turns':>7}{'model calls':>13}{'llm-free':>10}"
+        f"{'p50 ms':>9}{'p95 ms':>9}{'mean ms':>9}"
+    )
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in ("llm", "template"):
+            llm = FakeChatModel(responder=responder)
+            workflow = BookingWorkflow(
+                db_path=os.path.join(directory, f"{mode}.db"),
+                llm=llm,
+                durability="end_of_turn",
+                intent_fast_path=True,
+                local_extraction=True,
+                dynamic_extraction_schema=True,
+                template_responses=mode == "template",
+            )
+            latencies = []
+            for _ in range(args.rounds):
+                for turns in CONVERSATIONS.values():
+                    thread_id = workflow.create_session()
+                    for message, _, _ in turns:
+                        start = time.perf_counter()
+                        workflow.run_turn(thread_id, message)
+                        latencies.append(time.perf_counter() - start)
+            workflow.conn.close()
+
+            stats = percentiles(latencies)
+            llm_free = (
+                f"{workflow.response_templates.stats()['llm_free_share']:.0%}"
+                if workflow.response_templates is not None
+                else "-"
+            )
+            print(
+                f"{mode:<10}{len(latencies):>7}{llm.calls:>13}{llm_free:>10}"
+                f"{stats['p50_ms']:>9}{stats['p95_ms']:>9}{stats['mean_ms']:>9}"
+            )
+            if workflow.response_templates is not None:
+                template_stats = workflow.response_templates.stats()
+                print(f"\n{'node':<22}{'templated':>10}{'llm':>6}")
+                for node, rendered in template_stats["rendered"].items():
+                    print(f"{node:<22}{rendered:>10}{template_stats['llm'][node]:>6}")
+                print(f"\n{'turns':<10}{'p50 ms':>9}{'p95 ms':>9}{'mean ms':>9}")
+                for kind, latency in template_stats["latency"].items():
+                    print(
+                        f"{kind:<10}{latency['p50_ms']:>9}{latency['p95_ms']:>9}"
+                        f"{latency['mean_ms']:>9}"
+                    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=5, help="Replays of every conversation")
+    parser.add_argument("--completion-latency", type=float, default=1.0, help="Seconds per free-text call")
+    parser.add_argument("--structured-latency", type=float, default=0.3, help="Seconds per structured call")
+    main(parser.parse_args())
@@ -0,0 +1,148 @@
+import gc
+from datetime import datetime
+from typing import Any, Mapping, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from validation import MIN_NAME_LENGTH, PAYMENT_METHODS, ERRORS, error, parse_date
+
+BOOKING_FIELDS = ("full_name", "check_in_date", "check_out_date", "num_guests", "payment_method")
+
+Columns = Union[Mapping[str, Any], np.ndarray, pd.DataFrame]
+
+
+def _columns(bookings: Columns) -> tuple[int, dict[str, np.ndarray]]:
+    """
+    Returns the number of rows and the booking fields present as 1-D arrays. Lists become
+    object arrays, so every value keeps the type it would have in a booking dict.
+    """
+    if isinstance(bookings, pd.DataFrame):
+        columns = {name: bookings[name].to_numpy() for name in BOOKING_FIELDS if name in bookings}
+        return len(bookings), columns
+    if isinstance(bookings, np.ndarray):
+        if bookings.dtype.names is None:
+            raise ValueError("A NumPy array of bookings needs named fields (a structured array).")
+        names = bookings.dtype.names
+        return len(bookings), {name: bookings[name] for name in BOOKING_FIELDS if name in names}
+    columns = {}
+    for name in BOOKING_FIELDS:
+        if name not in bookings:
+            continue
+        values = bookings[name]
+        if isinstance(values, pd.Series):
+            values = values.to_numpy()
+        elif not isinstance(values, np.ndarray):
+            values = np.array(values, dtype=object)
+        columns[name] = values
+    lengths = {len(values) for values in columns.values()}
+    if len(lengths) > 1:
+        raise ValueError("All booking columns must have the same length.")
+    return lengths.pop() if lengths else 0, columns
+
+
+def _present(values: np.ndarray) -> np.ndarray:
+    # None, NaN, NaT and pd.NA count as a missing field, like a key absent from a dict
+    if values.dtype.kind in "OfmM":
+        return ~pd.isna(values)
+    return np.ones(len(values), dtype=bool)
+
+
+def _each_distinct(values: np.ndarray, function, dtype) -> np.ndarray:
+    """
+    Applies `function` once per distinct value and spreads the results back over the rows,
+    for rules that need Python per value; dates and payment methods repeat a lot.
+    """
+    codes, uniques = pd.factorize(values)
+    results = np.fromiter(map(function, uniques), dtype=dtype, count=len(uniques))
+    return results[codes]
+
+
+def _dates(values: np.ndarray) -> np.ndarray:
+    # Dates as datetime64, NaT where a value is not a valid YYYY-MM-DD date
+    def parse(value):
+        parsed = parse_date(value)
+        return np.datetime64(parsed, "us") if parsed is not None else np.datetime64("NaT")
+
+    return _each_distinct(values, parse, "datetime64[us]")
+
+
+def bulk_booking_errors(
+    bookings: Columns, now: Optional[datetime] = None
+) -> list[list[tuple[str, list[str]]]]:
+    """
+    Checks many bookings at once with the rules of validation.booking_errors, a rule at a
+    time over whole columns: dates and payment methods are read once per distinct value,
+    then compared as arrays.
+
+    Args:
+        bookings: Columns of booking fields, as a dict of lists or arrays, a NumPy
+            structured array or a pandas DataFrame. A missing column, or a None, NaN or
+            NaT value, is a field the booking does not have yet, like a key absent from
+            the dict given to booking_errors.
+        now (datetime): Time the dates must not be before, defaults to datetime.today().
+
+    Returns:
+        list: For every row, the list booking_errors returns for the fields it has.
+    """
+    count, columns = _columns(bookings)
+    now = np.datetime64(now or datetime.today(), "us")
+    failed = {}
+
+    if "full_name" in columns:
+        values = columns["full_name"]
+        present = _present(values)
+        lengths = np.zeros(count, dtype=np.int64)
+        if values.dtype.kind == "U":
+            lengths[present] = np.char.str_len(values[present])
+        else:
+            lengths[present] = np.fromiter(map(len, values[present]), dtype=np.int64)
+        failed["full_name"] = present & (lengths < MIN_NAME_LENGTH)
+
+    dates = {}
+    for key, prefix in (("check_in_date", "check_in"), ("check_out_date", "check_out")):
+        if key not in columns:
+            continue
+        values = columns[key]
+        present = _present(values)
+        dates[key] = np.full(count, np.datetime64("NaT"), dtype="datetime64[us]")
+        dates[key][present] = _dates(values[present])
+        valid = ~np.isnat(dates[key])
+        failed[f"{prefix}_format"] = present & ~valid
+        failed[f"{prefix}_past"] = valid & (dates[key] < now)
+
+    if len(dates) == 2:
+        # NaT compares False, so only rows with two valid dates can fail
+        failed["date_order"] = dates["check_out_date"] <= dates["check_in_date"]
+
+    if "num_guests" in columns:
+        values = columns["num_guests"]
+        present = _present(values)
+        not_positive = np.zeros(count, dtype=bool)
+        not_positive[present] = values[present] <= 0
+        failed["num_guests"] = not_positive
+
+    if "payment_method" in columns:
+        values = columns["payment_method"]
+        present = _present(values)
+        invalid = np.zeros(count, dtype=bool)
+        invalid[present] = _each_distinct(
+            values[present], lambda method: method.lower() not in PAYMENT_METHODS, bool
+        )
+        failed["payment_method"] = invalid
+
+    # A list per row and a pair per error are many small objects with no reference cycles,
+    # which would only set off the cyclic garbage collector over and over
+    collecting = gc.isenabled()
+    gc.disable()
+    try:
+        errors = [[] for _ in range(count)]
+        # Rules in the order booking_errors checks them, so every row lists its errors alike
+        for rule in ERRORS:
+            if rule in failed:
+                for row in np.flatnonzero(failed[rule]).tolist():
+                    errors[row].append(error(rule))
+    finally:
+        if collecting:
+            gc.enable()
+    return errors
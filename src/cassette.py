@@ -0,0 +1,167 @@
+import os
+import json
+import gzip
+import time
+import asyncio
+import threading
+from typing import Any, Optional
+
+from langchain_core.runnables import RunnableLambda
+
+from chain_cache import ChainCache, dump_result, load_result, normalize_inputs
+
+CASSETTE_MODES = ("record", "replay")
+REPLAY_LATENCIES = ("original", "zero")
+
+
+class CassetteMissError(LookupError):
+    """
+    Raised in strict replay mode when a chain is called with inputs that were never recorded.
+    """
+
+    def __init__(self, name: str, key: str):
+        super().__init__(f"No recording of chain {name!r} for inputs {key[:16]}")
+        self.name = name
+        self.key = key
+
+
+class Cassette:
+    """
+    Record/replay layer for chain calls. In record mode every call goes to the chain and is
+    appended to a gzipped JSON-lines file with its normalized inputs, its output and how
+    long it took. In replay mode calls are answered from the file, keyed by a hash of the
+    chain name and the normalized inputs; inputs recorded several times replay their
+    outputs in order. A replay miss fails in strict mode and is recorded otherwise.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        mode: str = "replay",
+        strict: bool = False,
+        latency: str = "zero",
+    ):
+        """
+        Args:
+            path (str): Path of the cassette file, created on the first recording.
+            mode (str): "record" to call the chains and append their results, "replay" to
+                answer from the cassette.
+            strict (bool): If True, a replay miss raises CassetteMissError instead of calling
+                the chain, so a run never reaches the network.
+            latency (str): "original" to wait as long as the recorded call took, "zero" to
+                answer immediately.
+        """
+        if mode not in CASSETTE_MODES:
+            raise ValueError(f"Invalid mode {mode!r}. Choose from: {', '.join(CASSETTE_MODES)}.")
+        if latency not in REPLAY_LATENCIES:
+            raise ValueError(
+                f"Invalid latency {latency!r}. Choose from: {', '.join(REPLAY_LATENCIES)}."
+            )
+        self.path = path
+        self.mode = mode
+        self.strict = strict
+        self.latency = latency
+        # key -> recorded entries, and the index of the next one to replay
+        self._recordings: dict[str, list[dict]] = {}
+        self._cursors: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+        self.recorded = 0
+        self.replayed = 0
+        self.misses = 0
+
+        if os.path.exists(path):
+            with gzip.open(path, "rt", encoding="utf-8") as file:
+                for line in file:
+                    entry = json.loads(line)
+                    self._recordings.setdefault(entry["key"], []).append(entry)
+        elif mode == "replay" and strict:
+            raise FileNotFoundError(f"Cassette not found: {path}")
+
+    def _next(self, name: str, key: str) -> Optional[dict]:
+        """
+        Returns the next recorded entry for the key, None on a miss outside strict mode.
+        """
+        with self._lock:
+            entries = self._recordings.get(key)
+            if not entries:
+                self.misses += 1
+                if self.strict:
+                    raise CassetteMissError(name, key)
+                return None
+            index = self._cursors.get(key, 0)
+            self._cursors[key] = index + 1
+            self.replayed += 1
+            return entries[index % len(entries)]
+
+    def _record(self, name: str, key: str, inputs: Any, value: Any, seconds: float):
+        entry = {
+            "key": key,
+            "chain": name,
+            "inputs": normalize_inputs(inputs),
+            "output": dump_result(value),
+            "latency": round(seconds, 4),
+        }
+        line = json.dumps(entry, separators=(",", ":"), default=str) + "\n"
+        with self._lock:
+            # Every line is written as its own gzip member, so a run that stops halfway
+            # keeps everything recorded up to then
+            with gzip.open(self.path, "at", encoding="utf-8") as file:
+                file.write(line)
+            self._recordings.setdefault(key, []).append(entry)
+            self.recorded += 1
+
+    def wrap(self, chain, name: str, output_type: Optional[type] = None):
+        """
+        Wraps a chain so its calls are recorded to, or replayed from, the cassette.
+
+        Args:
+            chain: The chain to record.
+            name (str): Name separating this chain's recordings from other chains'.
+            output_type (type): Pydantic model returned by the chain, if it is a structured chain.
+
+        Returns:
+            Runnable: A runnable with the same input and output as `chain`.
+        """
+
+        def invoke(inputs, config=None):
+            key = ChainCache.make_key(name, inputs)
+            if self.mode == "replay":
+                entry = self._next(name, key)
+                if entry is not None:
+                    if self.latency == "original":
+                        time.sleep(entry["latency"])
+                    return load_result(entry["output"], output_type)
+            start = time.perf_counter()
+            value = chain.invoke(inputs, config=config)
+            self._record(name, key, inputs, value, time.perf_counter() - start)
+            return value
+
+        async def ainvoke(inputs, config=None):
+            key = ChainCache.make_key(name, inputs)
+            if self.mode == "replay":
+                entry = self._next(name, key)
+                if entry is not None:
+                    if self.latency == "original":
+                        await asyncio.sleep(entry["latency"])
+                    return load_result(entry["output"], output_type)
+            start = time.perf_counter()
+            value = await chain.ainvoke(inputs, config=config)
+            # File writes are short and rare next to the chain call they follow
+            self._record(name, key, inputs, value, time.perf_counter() - start)
+            return value
+
+        return RunnableLambda(invoke, afunc=ainvoke, name=f"cassette_{name}")
+
+    def stats(self) -> dict:
+        """
+        Returns the number of recorded inputs and the record, replay and miss counters.
+        """
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "keys": len(self._recordings),
+                "recorded": self.recorded,
+                "replayed": self.replayed,
+                "misses": self.misses,
+            }
@@ -0,0 +1,200 @@
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+
+from langchain_core.runnables import RunnableLambda
+
+
+def normalize_inputs(inputs: Any) -> Any:
+    """
+    Normalizes chain inputs for use in a cache key: surrounding and repeated whitespace
+    in strings is collapsed, everything else is kept as is.
+    """
+    if isinstance(inputs, str):
+        return " ".join(inputs.split())
+    if isinstance(inputs, dict):
+        return {key: normalize_inputs(value) for key, value in inputs.items()}
+    if isinstance(inputs, (list, tuple)):
+        return [normalize_inputs(value) for value in inputs]
+    return inputs
+
+
+def dump_result(value: Any) -> dict:
+    """
+    Returns a chain result as JSON-serializable data: a string, or the fields of a
+    structured output.
+    """
+    if isinstance(value, str):
+        return {"type": "str", "value": value}
+    return {"type": "model", "value": value.model_dump()}
+
+
+def load_result(payload: dict, output_type: Optional[type] = None) -> Any:
+    """
+    Rebuilds a chain result stored by dump_result, as `output_type` if it is structured.
+    """
+    if payload["type"] == "str" or output_type is None:
+        return payload["value"]
+    return output_type(**payload["value"])
+
+
+class ChainCache:
+    """
+    Result cache for deterministic (temperature 0) chains: an in-memory LRU with a TTL,
+    optionally backed by a SQLite table that survives restarts and is shared by workers.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 10_000,
+        ttl_seconds: Optional[float] = 24 * 3600,
+        db_path: Optional[str] = None,
+    ):
+        """
+        Args:
+            max_size (int): Maximum number of results kept in memory.
+            ttl_seconds (float): Age after which a result is no longer served, None to keep forever.
+            db_path (str): Path of the SQLite file for the on-disk tier, None for memory only.
+        """
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        self.conn = None
+        if db_path is not None:
+            self.conn = sqlite3.connect(db_path, check_same_thread=False)
+            with self.conn:
+                self.conn.execute(
+                    "CREATE TABLE IF NOT EXISTS chain_cache "
+                    "(key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+                )
+
+    @staticmethod
+    def make_key(name: str, inputs: Any) -> str:
+        payload = json.dumps(
+            [name, normalize_inputs(inputs)], sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _expired(self, created_at: float) -> bool:
+        return self.ttl_seconds is not None and time.time() - created_at > self.ttl_seconds
+
+    def get(self, key: str, output_type: Optional[type] = None) -> tuple[bool, Any]:
+        """
+        Looks a result up in memory, then on disk.
+
+        Args:
+            key (str): Cache key from make_key.
+            output_type (type): Pydantic model used to rebuild structured results read from disk.
+
+        Returns:
+            tuple: Whether the key was found, and the cached result.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if not self._expired(entry[0]):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, entry[1]
+                del self._entries[key]
+                self.expirations += 1
+
+            if self.conn is not None:
+                row = self.conn.execute(
+                    "SELECT value, created_at FROM chain_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None and not self._expired(row[1]):
+                    value = self._loads(row[0], output_type)
+                    self._store(key, row[1], value)
+                    self.disk_hits += 1
+                    return True, value
+
+            self.misses += 1
+            return False, None
+
+    def set(self, key: str, value: Any):
+        created_at = time.time()
+        with self._lock:
+            self._store(key, created_at, value)
+            if self.conn is not None:
+                with self.conn:
+                    self.conn.execute(
+                        "INSERT OR REPLACE INTO chain_cache (key, value, created_at) VALUES (?, ?, ?)",
+                        (key, self._dumps(value), created_at),
+                    )
+
+    def _store(self, key: str, created_at: float, value: Any):
+        self._entries[key] = (created_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    @staticmethod
+    def _dumps(value: Any) -> str:
+        return json.dumps(dump_result(value))
+
+    @staticmethod
+    def _loads(data: str, output_type: Optional[type]) -> Any:
+        return load_result(json.loads(data), output_type)
+
+    def wrap(self, chain, name: str, output_type: Optional[type] = None):
+        """
+        Wraps a chain so identical (normalized) inputs are answered from the cache.
+
+        Args:
+            chain: The chain to cache.
+            name (str): Name separating this chain's entries from other chains'.
+            output_type (type): Pydantic model returned by the chain, if it is a structured chain.
+
+        Returns:
+            Runnable: A runnable with the same input and output as `chain`.
+        """
+
+        def invoke(inputs, config=None):
+            key = self.make_key(name, inputs)
+            found, value = self.get(key, output_type)
+            if found:
+                return value
+            value = chain.invoke(inputs, config=config)
+            self.set(key, value)
+            return value
+
+        async def ainvoke(inputs, config=None):
+            key = self.make_key(name, inputs)
+            found, value = self.get(key, output_type)
+            if found:
+                return value
+            value = await chain.ainvoke(inputs, config=config)
+            self.set(key, value)
+            return value
+
+        return RunnableLambda(invoke, afunc=ainvoke, name=f"cached_{name}")
+
+    def stats(self) -> dict:
+        """
+        Returns the hit, miss, eviction and expiration counters.
+        """
+        with self._lock:
+            lookups = self.hits + self.disk_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
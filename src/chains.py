@@ -1,12 +1,19 @@
 from dotenv import load_dotenv
 from langchain.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
 from langchain_core.output_parsers import StrOutputParser
 from langchain.prompts import SystemMessagePromptTemplate, HumanMessagePromptTemplate
-from pydantic_classes import IntentClassification, BookingInfo
+from llm_client import get_chat_model
+from pydantic_classes import (
+    IntentClassification,
+    BookingInfo,
+    IntentWithBookingInfo,
+    create_booking_info_model,
+)
 from prompts import (
     intent_prompt,
+    intent_and_booking_info_prompt,
     booking_info_prompt,
+    create_booking_info_prompt,
     booking_change_prompt,
     response_chain_sys_prompt,
     response_chain_human_message,
@@ -18,67 +25,181 @@ from prompts import (
 load_dotenv()
 
 
-# LangChain setup for intent detection
-def create_intent_chain():
-    # LangChain setup for intent detection
-    llm = ChatOpenAI(model="gpt-4o", temperature=0)
+def build_chain(build, name, llm=None, router=None, hedger=None, temperature=0):
+    """
+    Builds a chain with `build(llm)`: on the models of its tier if a ModelRouter is given,
+    otherwise on `llm` or the shared gpt-4o client. Slow calls are hedged if a Hedger is given.
+    """
+    if router is not None:
+        chain = router.route(name, build, temperature=temperature)
+    else:
+        llm = get_chat_model("gpt-4o", temperature=temperature) if llm is None else llm
+        chain = build(llm)
+
+    # Hedging goes inside the result cache, so cache hits do not count as calls
+    if hedger is not None:
+        chain = hedger.wrap(chain, name)
+    return chain
 
+
+# LangChain setup for intent detection
+def create_intent_chain(llm=None, cache=None, router=None, hedger=None, cassette=None):
     # Create a structured output chain for intent detection
-    intent_chain = intent_prompt | llm.with_structured_output(IntentClassification)
+    intent_chain = build_chain(
+        lambda llm: intent_prompt | llm.with_structured_output(IntentClassification),
+        "intent",
+        llm,
+        router,
+        hedger,
+    )
 
-    return intent_chain
+    # Record or replay the calls, then serve repeated inputs from the result cache
+    if cassette is not None:
+        intent_chain = cassette.wrap(intent_chain, "intent", IntentClassification)
+    if cache is not None:
+        intent_chain = cache.wrap(intent_chain, "intent", IntentClassification)
 
+    return intent_chain
 
-def create_booking_info_chain():
-    # LangChain setup for booking information extraction
-    llm = ChatOpenAI(model="gpt-4o", temperature=0)
 
+def create_booking_info_chain(
+    llm=None, fields=None, cache=None, router=None, hedger=None, cassette=None
+):
     # Create a structured output chain for booking information extraction
-    booking_info_chain = booking_info_prompt | llm.with_structured_output(BookingInfo)
+    if fields is None:
+        output_type = BookingInfo
+        prompt = booking_info_prompt
+    else:
+        # Prompt and output schema restricted to the given fields
+        output_type = create_booking_info_model(fields)
+        prompt = create_booking_info_prompt(fields)
+    booking_info_chain = build_chain(
+        lambda llm: prompt | llm.with_structured_output(output_type),
+        "booking_info",
+        llm,
+        router,
+        hedger,
+    )
+
+    # Record or replay the calls, then serve repeated inputs from the result cache,
+    # separately for every field subset
+    name = "booking_info" if fields is None else "booking_info:" + ",".join(fields)
+    if cassette is not None:
+        booking_info_chain = cassette.wrap(booking_info_chain, name, output_type)
+    if cache is not None:
+        booking_info_chain = cache.wrap(booking_info_chain, name, output_type)
 
     return booking_info_chain
 
 
-def create_booking_change_chain():
-    # LangChain setup for changing information characteristics
-    llm = ChatOpenAI(model="gpt-4o", temperature=0)
+def create_intent_and_booking_info_chain(
+    llm=None, cache=None, router=None, hedger=None, cassette=None
+):
+    # Create a structured output chain returning the intent together with the booking fields,
+    # for intent detection and booking information extraction in one call
+    intent_and_booking_info_chain = build_chain(
+        lambda llm: intent_and_booking_info_prompt
+        | llm.with_structured_output(IntentWithBookingInfo),
+        "intent_and_booking_info",
+        llm,
+        router,
+        hedger,
+    )
 
-    # Create a structured output chain for booking information extraction
-    booking_change_chain = booking_change_prompt | llm.with_structured_output(
-        BookingInfo
+    # Record or replay the calls, then serve repeated inputs from the result cache
+    if cassette is not None:
+        intent_and_booking_info_chain = cassette.wrap(
+            intent_and_booking_info_chain, "intent_and_booking_info", IntentWithBookingInfo
+        )
+    if cache is not None:
+        intent_and_booking_info_chain = cache.wrap(
+            intent_and_booking_info_chain, "intent_and_booking_info", IntentWithBookingInfo
+        )
+
+    return intent_and_booking_info_chain
+
+
+def create_booking_change_chain(llm=None, cache=None, router=None, hedger=None, cassette=None):
+    # Create a structured output chain for changing information characteristics
+    booking_change_chain = build_chain(
+        lambda llm: booking_change_prompt | llm.with_structured_output(BookingInfo),
+        "booking_change",
+        llm,
+        router,
+        hedger,
     )
 
+    # Record or replay the calls, then serve repeated inputs from the result cache
+    if cassette is not None:
+        booking_change_chain = cassette.wrap(booking_change_chain, "booking_change", BookingInfo)
+    if cache is not None:
+        booking_change_chain = cache.wrap(booking_change_chain, "booking_change", BookingInfo)
+
     return booking_change_chain
 
 
-def create_response_generation_chain():
+def create_response_generation_chain(
+    llm=None, cache=None, router=None, hedger=None, cassette=None
+):
     # Create the chat prompt template
     generate_response_prompt = ChatPromptTemplate.from_messages([
         SystemMessagePromptTemplate.from_template(response_chain_sys_prompt),
         HumanMessagePromptTemplate.from_template(response_chain_human_message),
     ])
 
-    llm = ChatOpenAI(model="gpt-4o", temperature=0)
-    response_chain = generate_response_prompt | llm | StrOutputParser()
+    response_chain = build_chain(
+        lambda llm: generate_response_prompt | llm | StrOutputParser(),
+        "response",
+        llm,
+        router,
+        hedger,
+    )
+
+    # Record or replay the calls, then serve repeated inputs from the result cache
+    if cassette is not None:
+        response_chain = cassette.wrap(response_chain, "response")
+    if cache is not None:
+        response_chain = cache.wrap(response_chain, "response")
 
     return response_chain
 
 
-def create_summarization_chain():
+def create_summarization_chain(llm=None, cache=None, router=None, hedger=None, cassette=None):
     # Create the chat prompt template
     summarize_booking_prompt = ChatPromptTemplate.from_messages([
         SystemMessagePromptTemplate.from_template(summarization_chain_sys_prompt),
         HumanMessagePromptTemplate.from_template(summarization_chain_human_message),
     ])
 
-    llm = ChatOpenAI(model="gpt-4o", temperature=0)
-    summarize_booking_chain = summarize_booking_prompt | llm | StrOutputParser()
+    summarize_booking_chain = build_chain(
+        lambda llm: summarize_booking_prompt | llm | StrOutputParser(),
+        "summarization",
+        llm,
+        router,
+        hedger,
+    )
+
+    # Record or replay the calls, then serve repeated inputs from the result cache
+    if cassette is not None:
+        summarize_booking_chain = cassette.wrap(summarize_booking_chain, "summarization")
+    if cache is not None:
+        summarize_booking_chain = cache.wrap(summarize_booking_chain, "summarization")
 
     return summarize_booking_chain
 
 
-def create_correction_chain():
-    # Create the chain
-    llm = ChatOpenAI(model="gpt-4o", temperature=0.7)
-    correction_chain = correction_chain_prompt | llm | StrOutputParser()
+def create_correction_chain(llm=None, router=None, hedger=None, cassette=None):
+    # Create the chain (never cached, its temperature makes every answer different)
+    correction_chain = build_chain(
+        lambda llm: correction_chain_prompt | llm | StrOutputParser(),
+        "correction",
+        llm,
+        router,
+        hedger,
+        temperature=0.7,
+    )
+
+    # Record or replay the calls; answers recorded for the same inputs replay in order
+    if cassette is not None:
+        correction_chain = cassette.wrap(correction_chain, "correction")
     return correction_chain
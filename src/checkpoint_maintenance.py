@@ -0,0 +1,297 @@
+"""
+Retention and compaction for the SqliteSaver checkpoint store (conversation_history.db).
+
+Usage (from src/):
+    python checkpoint_maintenance.py --db conversation_history.db --keep-last 10 --ttl-hours 168
+
+The incremental vacuum needs the database in auto_vacuum=INCREMENTAL mode. Switching an
+existing database to it takes one full VACUUM, which rewrites the file under an exclusive
+lock, so it is only done from here, once, with the API stopped:
+    python checkpoint_maintenance.py --db conversation_history.db --convert-auto-vacuum
+"""
+
+import os
+import time
+import logging
+import uuid
+import sqlite3
+import argparse
+import threading
+from contextlib import nullcontext
+from typing import Optional
+
+CHECKPOINT_TABLES = ("checkpoints", "writes")
+
+logger = logging.getLogger(__name__)
+
+# Offset between the UUID epoch (1582-10-15) and the Unix epoch, in 100 ns intervals
+_UUID_EPOCH_OFFSET = 0x01B21DD213814000
+
+
+def checkpoint_timestamp(checkpoint_id: str) -> float:
+    """
+    Returns the Unix time encoded in a LangGraph checkpoint id (a version 6 UUID).
+
+    Args:
+        checkpoint_id (str): The checkpoint id.
+
+    Returns:
+        float: Seconds since the Unix epoch at which the checkpoint was created.
+    """
+    high = uuid.UUID(checkpoint_id).int >> 64
+    timestamp = (
+        ((high >> 32) << 28) | (((high >> 16) & 0xFFFF) << 12) | (high & 0x0FFF)
+    )
+    return (timestamp - _UUID_EPOCH_OFFSET) / 1e7
+
+
+def _existing_tables(conn: sqlite3.Connection) -> set[str]:
+    return {
+        row[0]
+        for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")
+    }
+
+
+def size_report(conn: sqlite3.Connection, db_path: Optional[str] = None) -> dict:
+    """
+    Reports the size of the checkpoint store.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the checkpoint database.
+        db_path (str): Path of the database file, used to measure the WAL file.
+
+    Returns:
+        dict: Rows and bytes per checkpoint table, plus database, free-list and WAL sizes in bytes.
+    """
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    freelist_count = conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+    existing = _existing_tables(conn)
+    tables = {}
+    for table in CHECKPOINT_TABLES:
+        if table not in existing:
+            tables[table] = {"rows": 0, "bytes": 0}
+            continue
+        rows = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        try:
+            # dbstat is only available when SQLite is compiled with SQLITE_ENABLE_DBSTAT_VTAB
+            size = conn.execute(
+                "SELECT COALESCE(SUM(pgsize), 0) FROM dbstat WHERE name = ?", (table,)
+            ).fetchone()[0]
+        except sqlite3.OperationalError:
+            blob = "LENGTH(checkpoint) + LENGTH(metadata)" if table == "checkpoints" else "LENGTH(value)"
+            size = conn.execute(
+                f"SELECT COALESCE(SUM({blob}), 0) FROM {table}"
+            ).fetchone()[0]
+        tables[table] = {"rows": rows, "bytes": size}
+
+    wal_path = f"{db_path}-wal" if db_path else None
+    return {
+        "tables": tables,
+        "db_bytes": page_size * page_count,
+        "free_bytes": page_size * freelist_count,
+        "wal_bytes": os.path.getsize(wal_path)
+        if wal_path and os.path.exists(wal_path)
+        else 0,
+    }
+
+
+def keep_latest_checkpoints(conn: sqlite3.Connection, keep_last: int) -> int:
+    """
+    Deletes all but the latest `keep_last` checkpoints of every thread, with their pending writes.
+
+    Returns:
+        int: Number of checkpoints deleted.
+    """
+    if keep_last < 1:
+        raise ValueError("keep_last must be at least 1, the latest checkpoint holds the session state.")
+    if "checkpoints" not in _existing_tables(conn):
+        return 0
+
+    # Checkpoint ids are time-ordered UUIDs, so their string order is their creation order
+    stale = """
+        SELECT thread_id, checkpoint_ns, checkpoint_id FROM (
+            SELECT thread_id, checkpoint_ns, checkpoint_id,
+                   ROW_NUMBER() OVER (
+                       PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC
+                   ) AS position
+            FROM checkpoints
+        ) WHERE position > ?
+    """
+    with conn:
+        conn.execute("DROP TABLE IF EXISTS temp.stale_checkpoints")
+        conn.execute(f"CREATE TEMP TABLE stale_checkpoints AS {stale}", (keep_last,))
+        conn.execute("""
+            DELETE FROM writes WHERE (thread_id, checkpoint_ns, checkpoint_id) IN (
+                SELECT thread_id, checkpoint_ns, checkpoint_id FROM temp.stale_checkpoints
+            )
+        """)
+        deleted = conn.execute("""
+            DELETE FROM checkpoints WHERE (thread_id, checkpoint_ns, checkpoint_id) IN (
+                SELECT thread_id, checkpoint_ns, checkpoint_id FROM temp.stale_checkpoints
+            )
+        """).rowcount
+        conn.execute("DROP TABLE temp.stale_checkpoints")
+    return deleted
+
+
+def expire_idle_threads(
+    conn: sqlite3.Connection, ttl_seconds: float, now: Optional[float] = None
+) -> int:
+    """
+    Deletes every thread whose latest checkpoint is older than `ttl_seconds`.
+
+    Returns:
+        int: Number of threads deleted.
+    """
+    if "checkpoints" not in _existing_tables(conn):
+        return 0
+    now = time.time() if now is None else now
+
+    latest = conn.execute(
+        "SELECT thread_id, MAX(checkpoint_id) FROM checkpoints GROUP BY thread_id"
+    ).fetchall()
+    expired = [
+        (thread_id,)
+        for thread_id, checkpoint_id in latest
+        if now - checkpoint_timestamp(checkpoint_id) > ttl_seconds
+    ]
+    with conn:
+        conn.executemany("DELETE FROM writes WHERE thread_id = ?", expired)
+        conn.executemany("DELETE FROM checkpoints WHERE thread_id = ?", expired)
+    return len(expired)
+
+
+def checkpoint_wal(conn: sqlite3.Connection) -> tuple[int, int, int]:
+    """
+    Copies the WAL into the database file and truncates it to zero bytes.
+
+    Returns:
+        tuple: (busy, WAL frames, frames checkpointed) as reported by SQLite.
+    """
+    return tuple(conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone())
+
+
+def incremental_vacuum(
+    conn: sqlite3.Connection, pages: Optional[int] = None, convert: bool = False
+) -> bool:
+    """
+    Returns free pages to the file system, if the database is in auto_vacuum=INCREMENTAL
+    mode. Otherwise it logs a warning and does nothing, unless `convert` is set.
+
+    Args:
+        pages (int): Maximum number of free pages to release, all of them if None.
+        convert (bool): Switch the database to auto_vacuum=INCREMENTAL first if needed. This
+            runs a full VACUUM, rewriting the file under an exclusive lock: do it offline.
+
+    Returns:
+        bool: Whether the vacuum ran.
+    """
+    conn.commit()
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        if not convert:
+            logger.warning(
+                "Checkpoint database is not in auto_vacuum=INCREMENTAL mode, free pages are "
+                "kept; convert it once with checkpoint_maintenance.py --convert-auto-vacuum"
+            )
+            return False
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+    # Each step of the pragma frees one page, and executescript steps it to completion
+    if pages is None:
+        conn.executescript("PRAGMA incremental_vacuum;")
+    else:
+        conn.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+    return True
+
+
+def run_maintenance(
+    conn: sqlite3.Connection,
+    db_path: Optional[str] = None,
+    keep_last: Optional[int] = 10,
+    ttl_seconds: Optional[float] = 7 * 24 * 3600,
+    vacuum_pages: Optional[int] = None,
+    lock: Optional[threading.Lock] = None,
+    convert_auto_vacuum: bool = False,
+) -> dict:
+    """
+    Prunes and compacts the checkpoint store.
+
+    Args:
+        conn (sqlite3.Connection): Connection to the checkpoint database.
+        db_path (str): Path of the database file, used to measure the WAL file.
+        keep_last (int): Checkpoints kept per thread, no pruning if None.
+        ttl_seconds (float): Threads idle for longer than this are deleted, no expiry if None.
+        vacuum_pages (int): Maximum number of pages released by the incremental vacuum.
+        lock (threading.Lock): Lock guarding `conn` when it is shared, e.g. SqliteSaver.lock.
+        convert_auto_vacuum (bool): Switch the database to auto_vacuum=INCREMENTAL with a
+            full VACUUM if needed; only for a database not in use, see incremental_vacuum.
+
+    Returns:
+        dict: Sizes before and after, how many checkpoints and threads were deleted, and
+        whether the free pages were vacuumed.
+    """
+    with lock if lock is not None else nullcontext():
+        before = size_report(conn, db_path)
+        expired = expire_idle_threads(conn, ttl_seconds) if ttl_seconds is not None else 0
+        pruned = keep_latest_checkpoints(conn, keep_last) if keep_last is not None else 0
+        vacuumed = incremental_vacuum(conn, vacuum_pages, convert=convert_auto_vacuum)
+        checkpoint_wal(conn)
+        after = size_report(conn, db_path)
+
+    return {
+        "expired_threads": expired,
+        "pruned_checkpoints": pruned,
+        "vacuumed": vacuumed,
+        "before": before,
+        "after": after,
+    }
+
+
+def format_report(report: dict) -> str:
+    lines = [
+        f"expired threads: {report['expired_threads']}",
+        f"pruned checkpoints: {report['pruned_checkpoints']}",
+        f"vacuumed: {report['vacuumed']}",
+        f"{'':<12}{'before':>14}{'after':>14}",
+    ]
+    for table in CHECKPOINT_TABLES:
+        for field in ("rows", "bytes"):
+            lines.append(
+                f"{table + ' ' + field:<12}"
+                f"{report['before']['tables'][table][field]:>14}"
+                f"{report['after']['tables'][table][field]:>14}"
+            )
+    for field in ("db_bytes", "free_bytes", "wal_bytes"):
+        lines.append(
+            f"{field:<12}{report['before'][field]:>14}{report['after'][field]:>14}"
+        )
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prune and compact the checkpoint store.")
+    parser.add_argument("--db", default="conversation_history.db", help="Path to the SQLite database")
+    parser.add_argument("--keep-last", type=int, default=10, help="Checkpoints kept per thread")
+    parser.add_argument("--ttl-hours", type=float, default=168, help="Idle time before a thread is deleted")
+    parser.add_argument("--vacuum-pages", type=int, default=None, help="Pages released per run (all by default)")
+    parser.add_argument(
+        "--convert-auto-vacuum",
+        action="store_true",
+        help="Switch the database to auto_vacuum=INCREMENTAL with a full VACUUM (stop the API first)",
+    )
+    args = parser.parse_args()
+    logging.basicConfig()
+
+    conn = sqlite3.connect(args.db)
+    report = run_maintenance(
+        conn,
+        db_path=args.db,
+        keep_last=args.keep_last,
+        ttl_seconds=args.ttl_hours * 3600,
+        vacuum_pages=args.vacuum_pages,
+        convert_auto_vacuum=args.convert_auto_vacuum,
+    )
+    print(format_report(report))
+    conn.close()
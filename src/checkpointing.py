@@ -0,0 +1,277 @@
+import zlib
+import sqlite3
+import threading
+from typing import Any, Optional, Sequence
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+)
+from langgraph.checkpoint.sqlite import SqliteSaver
+
+# How often the conversation state is persisted during a turn:
+#   "per_node"    - a checkpoint after every graph step (LangGraph's default behaviour)
+#   "end_of_turn" - only the final checkpoint of the turn, written when the graph reaches END
+#   "none"        - nothing is persisted, sessions are not available
+DURABILITY_MODES = ("per_node", "end_of_turn", "none")
+
+
+class EndOfTurnCheckpointSaver(BaseCheckpointSaver):
+    """
+    Wraps a checkpoint saver and keeps the checkpoints produced during a turn in memory.
+    Only the latest one is handed to the wrapped saver when the turn is flushed, so each
+    turn costs a single checkpoint write instead of one per node.
+    """
+
+    def __init__(self, saver: BaseCheckpointSaver):
+        super().__init__(serde=saver.serde)
+        self.saver = saver
+        self._lock = threading.Lock()
+        # (thread_id, checkpoint_ns) -> pending checkpoint of the running turn
+        self._pending: dict[tuple[str, str], dict[str, Any]] = {}
+
+    @staticmethod
+    def _key(config: RunnableConfig) -> tuple[str, str]:
+        configurable = config["configurable"]
+        return str(configurable["thread_id"]), configurable.get("checkpoint_ns", "")
+
+    def get_next_version(self, current, channel):
+        return self.saver.get_next_version(current, channel)
+
+    def get_tuple(self, config: RunnableConfig):
+        return self.saver.get_tuple(config)
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        return self.saver.list(config, filter=filter, before=before, limit=limit)
+
+    async def aget_tuple(self, config: RunnableConfig):
+        return await self.saver.aget_tuple(config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        async for item in self.saver.alist(
+            config, filter=filter, before=before, limit=limit
+        ):
+            yield item
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        key = self._key(config)
+        with self._lock:
+            pending = self._pending.get(key)
+            # The parent of the persisted checkpoint is the one the turn started from,
+            # not the intermediate checkpoints that are never written
+            parent_config = pending["config"] if pending else config
+            self._pending[key] = {
+                "config": parent_config,
+                "checkpoint": checkpoint,
+                "metadata": metadata,
+                "new_versions": new_versions,
+                "writes": [],
+            }
+        return {
+            "configurable": {
+                "thread_id": key[0],
+                "checkpoint_ns": key[1],
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+    ) -> None:
+        with self._lock:
+            pending = self._pending.get(self._key(config))
+            # Writes of intermediate steps are only useful to resume a crashed turn,
+            # which end-of-turn durability gives up on purpose
+            if pending and pending["checkpoint"]["id"] == config["configurable"].get(
+                "checkpoint_id"
+            ):
+                pending["writes"].append((writes, task_id))
+
+    async def aput(self, config, checkpoint, metadata, new_versions) -> RunnableConfig:
+        return self.put(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id) -> None:
+        self.put_writes(config, writes, task_id)
+
+    def _pop(self, config: RunnableConfig) -> Optional[dict[str, Any]]:
+        with self._lock:
+            return self._pending.pop(self._key(config), None)
+
+    def discard(self, config: RunnableConfig) -> None:
+        """
+        Drops the checkpoints buffered for a turn that did not complete.
+        """
+        self._pop(config)
+
+    def flush(self, config: RunnableConfig) -> None:
+        """
+        Persists the last checkpoint of the turn running on the thread of `config`.
+        """
+        pending = self._pop(config)
+        if pending is None:
+            return
+        saved_config = self.saver.put(
+            pending["config"],
+            pending["checkpoint"],
+            pending["metadata"],
+            pending["new_versions"],
+        )
+        for writes, task_id in pending["writes"]:
+            self.saver.put_writes(saved_config, writes, task_id)
+
+    async def aflush(self, config: RunnableConfig) -> None:
+        """
+        Asynchronous version of flush.
+        """
+        pending = self._pop(config)
+        if pending is None:
+            return
+        saved_config = await self.saver.aput(
+            pending["config"],
+            pending["checkpoint"],
+            pending["metadata"],
+            pending["new_versions"],
+        )
+        for writes, task_id in pending["writes"]:
+            await self.saver.aput_writes(saved_config, writes, task_id)
+
+
+def connect_sqlite(db_path: str, busy_timeout: float = 5.0) -> sqlite3.Connection:
+    """
+    Opens a connection to the checkpoint database in WAL mode, so readers do not block the
+    writer, waiting up to `busy_timeout` seconds for a lock held by another connection or
+    process instead of failing with "database is locked". A new database is created in
+    auto_vacuum=INCREMENTAL mode, so checkpoint maintenance can release its free pages.
+    """
+    conn = sqlite3.connect(db_path, check_same_thread=False, timeout=busy_timeout)
+    if db_path != ":memory:":
+        # Only takes effect before the first table is created, a no-op afterwards
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+class ThreadLocalSqliteSaver(SqliteSaver):
+    """
+    SqliteSaver with one connection per thread instead of one connection shared behind a
+    lock, so checkpoint reads and writes of turns running in different threads go to
+    SQLite concurrently. Every connection uses WAL mode and a busy timeout.
+    """
+
+    def __init__(self, db_path: str, busy_timeout: float = 5.0, *, serde=None):
+        """
+        Args:
+            db_path (str): Path to the SQLite database, which must be a file.
+            busy_timeout (float): Seconds a connection waits for a lock held by another one.
+        """
+        if db_path == ":memory:":
+            raise ValueError("Every connection to :memory: opens a different database.")
+        self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        self._local = threading.local()
+        self._connections: list[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        super().__init__(self.conn, serde=serde)
+
+    def _thread_connection(self) -> tuple[sqlite3.Connection, threading.Lock]:
+        # The connection of the current thread and the lock guarding it, opened on first use
+        if not hasattr(self._local, "conn"):
+            self._local.conn = connect_sqlite(self.db_path, self.busy_timeout)
+            self._local.lock = threading.Lock()
+            with self._connections_lock:
+                self._connections.append(self._local.conn)
+        return self._local.conn, self._local.lock
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        return self._thread_connection()[0]
+
+    @conn.setter
+    def conn(self, conn):
+        # SqliteSaver.__init__ assigns the connection it is given, which is this thread's
+        pass
+
+    @property
+    def lock(self) -> threading.Lock:
+        return self._thread_connection()[1]
+
+    @lock.setter
+    def lock(self, lock):
+        pass
+
+    def close(self):
+        """
+        Closes the connections of every thread.
+        """
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+class ShardedCheckpointSaver(BaseCheckpointSaver):
+    """
+    Spreads conversations over several checkpoint savers, each with its own connection, by
+    a hash of their thread_id. A conversation always goes to the same saver, so its
+    checkpoints stay in order, while different conversations use different connections.
+    """
+
+    def __init__(self, savers: Sequence[BaseCheckpointSaver]):
+        super().__init__(serde=savers[0].serde)
+        self.savers = list(savers)
+
+    def _saver(self, config: RunnableConfig) -> BaseCheckpointSaver:
+        thread_id = str(config["configurable"]["thread_id"])
+        return self.savers[zlib.crc32(thread_id.encode()) % len(self.savers)]
+
+    def get_next_version(self, current, channel):
+        return self.savers[0].get_next_version(current, channel)
+
+    def get_tuple(self, config):
+        return self._saver(config).get_tuple(config)
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        if config and "thread_id" in config.get("configurable", {}):
+            return self._saver(config).list(config, filter=filter, before=before, limit=limit)
+        return (
+            item
+            for saver in self.savers
+            for item in saver.list(config, filter=filter, before=before, limit=limit)
+        )
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        return self._saver(config).put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(self, config, writes, task_id):
+        return self._saver(config).put_writes(config, writes, task_id)
+
+    async def aget_tuple(self, config):
+        return await self._saver(config).aget_tuple(config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        if config and "thread_id" in config.get("configurable", {}):
+            savers = [self._saver(config)]
+        else:
+            savers = self.savers
+        for saver in savers:
+            async for item in saver.alist(config, filter=filter, before=before, limit=limit):
+                yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        return await self._saver(config).aput(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id):
+        return await self._saver(config).aput_writes(config, writes, task_id)
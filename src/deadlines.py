@@ -0,0 +1,73 @@
+import copy
+import asyncio
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Callable
+
+from prompts import (
+    field_questions,
+    deadline_fallback_prompt,
+    deadline_fallback_retry,
+    deadline_fallback_booking,
+)
+
+
+class NodeDeadlineExceeded(TimeoutError):
+    """Raised when a graph node does not finish within its deadline."""
+
+    def __init__(self, node: str, deadline: float):
+        super().__init__(f"Node {node} exceeded its deadline of {deadline:.2f}s")
+        self.node = node
+        self.deadline = deadline
+
+
+def with_deadline(
+    node: str, func: Callable, afunc: Callable, deadline: float, executor: ThreadPoolExecutor
+) -> tuple[Callable, Callable]:
+    """
+    Wraps the sync and async implementations of a node so they raise NodeDeadlineExceeded
+    after `deadline` seconds. The node works on a copy of the state, so a sync call that is
+    left running in its thread cannot change the state of the turn afterwards. Nothing else
+    is undone, so the node must not write anywhere but its state.
+    """
+
+    def run(state):
+        # The context carries the callbacks of the graph run, e.g. the token stream
+        context = contextvars.copy_context()
+        future = executor.submit(context.run, func, copy.deepcopy(state))
+        try:
+            return future.result(timeout=deadline)
+        except FutureTimeoutError:
+            future.cancel()
+            raise NodeDeadlineExceeded(node, deadline) from None
+
+    async def arun(state):
+        try:
+            return await asyncio.wait_for(afunc(copy.deepcopy(state)), timeout=deadline)
+        except asyncio.TimeoutError:
+            raise NodeDeadlineExceeded(node, deadline) from None
+
+    return run, arun
+
+
+def fallback_response(state: dict, node: str, turn_saved: bool) -> str:
+    """
+    Returns the template answer for a turn whose node missed its deadline.
+
+    Args:
+        state (dict): The latest stored state of the conversation.
+        node (str): The node that missed its deadline.
+        turn_saved (bool): Whether the nodes that finished before it were checkpointed, so
+            `state` already holds what the user said in this turn.
+
+    Returns:
+        str: The question for the next missing field if the turn's information was kept,
+        otherwise an apology asking the user to send the message again.
+    """
+    if node in ("summarize_booking", "change_information"):
+        return f"{deadline_fallback_prompt} {deadline_fallback_booking}"
+    not_filled_keys = state.get("not_filled_keys") or []
+    answered = node in ("generate_response", "ask_for_correction")
+    if turn_saved and answered and state.get("intent") == "make a reservation" and not_filled_keys:
+        return f"{deadline_fallback_prompt} {field_questions[not_filled_keys[0]]}"
+    return f"{deadline_fallback_prompt} {deadline_fallback_retry}"
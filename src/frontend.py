@@ -1,12 +1,14 @@
+import json
+
 import streamlit as st
 import requests
 
 # Initialize chat history
 if "messages" not in st.session_state:
     st.session_state.messages = []
-# session state variable to track whether we are doing the first question
-if "first_query" not in st.session_state:
-    st.session_state.first_query = True
+# thread_id of the server-side conversation, created on the first question
+if "thread_id" not in st.session_state:
+    st.session_state.thread_id = None
 # stores the current state of the hotel assistant
 if "hotel_assitant_state" not in st.session_state:
     st.session_state.hotel_assitant_state = None
@@ -18,22 +20,47 @@ if "developer_view" not in st.session_state:
 BASE_URL = "http://127.0.0.1:8000"
 
 
-# Function to interact with the /run_workflow/ endpoint
-def interact_with_workflow(state):
+# Function to create a new conversation with the /sessions/ endpoint
+def create_session():
     try:
-        # Send a POST request to the /run_workflow/ endpoint
-        response = requests.post(f"{BASE_URL}/run_workflow/", json=state)
-        # Check if the request was successful
+        response = requests.post(f"{BASE_URL}/sessions/")
         if response.status_code == 200:
-            # Parse and return the JSON response
-            parsed_response = response.json()
-            parsed_response = {
-                k: v for k, v in parsed_response.items() if v is not None
-            }
-            return parsed_response
+            return response.json()["thread_id"]
         else:
-            # If the request failed, print the error details
             print(f"Error: {response.status_code}, Detail: {response.text}")
+    except requests.exceptions.RequestException as e:
+        print(f"Request failed: {e}")
+
+
+# Function to stream a turn from the /run_turn/stream endpoint
+def stream_workflow(thread_id, user_message):
+    try:
+        # Only the thread_id and the new message are sent, the server keeps the state
+        with requests.post(
+            f"{BASE_URL}/run_turn/stream",
+            json={"thread_id": thread_id, "user_message": user_message},
+            stream=True,
+        ) as response:
+            if response.status_code != 200:
+                # If the request failed, print the error details
+                print(f"Error: {response.status_code}, Detail: {response.text}")
+                return
+            # Server-sent events: the response arrives as "token" events, then the
+            # updated state as a closing "state" event
+            event = None
+            for line in response.iter_lines(decode_unicode=True):
+                if line.startswith("event: "):
+                    event = line[len("event: "):]
+                elif line.startswith("data: "):
+                    data = json.loads(line[len("data: "):])
+                    if event == "token":
+                        yield data["text"]
+                    elif event == "state":
+                        st.session_state.hotel_assitant_state = {
+                            k: v for k, v in data.items() if v is not None
+                        }
+                    elif event == "error":
+                        print(f"Error: {data['detail']}")
     except requests.exceptions.RequestException as e:
         # Handle any request exceptions that may occur
         print(f"Request failed: {e}")
@@ -42,36 +69,20 @@ def interact_with_workflow(state):
 def process_text(prompt):
     # Add user message to chat history
     st.session_state.messages.append({"role": "user", "content": prompt})
-    with st.spinner("processing your request..."):
-        # If this is the first message the user is sending to the assistant, we build the payload
-        if st.session_state.first_query:
-            state = {
-                "user_message": prompt,
-                "not_filled_keys": [
-                    "full_name",
-                    "check_in_date",
-                    "check_out_date",
-                    "num_guests",
-                    "payment_method",
-                    "breakfast_included",
-                ],
-            }
-            st.session_state.first_query = False
-        else:
-            state = st.session_state.hotel_assitant_state
-            state["user_message"] = prompt
-
-        # Query the api endpoint
-        updated_state = interact_with_workflow(state)
-        # Update the state
-        st.session_state.hotel_assitant_state = updated_state
-        # Add assistant response to chat history
-        st.session_state.messages.append({
-            "role": "assistant",
-            "content": updated_state["response"],
-        })
-
-    return updated_state["response"]
+    with st.chat_message("user"):
+        st.markdown(prompt)
+
+    # If this is the first message the user is sending to the assistant, we open a session
+    if st.session_state.thread_id is None:
+        st.session_state.thread_id = create_session()
+
+    # Render the assistant response as it is generated, the stream also updates the state
+    with st.chat_message("assistant"):
+        response = st.write_stream(stream_workflow(st.session_state.thread_id, prompt))
+    # Add assistant response to chat history
+    st.session_state.messages.append({"role": "assistant", "content": response})
+
+    return response
 
 
 # Streamlit UI
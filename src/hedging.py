@@ -0,0 +1,173 @@
+import time
+import asyncio
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Optional
+
+from langchain_core.runnables import RunnableLambda
+
+# Chains hedged by default. The response chains are left out: their tokens are streamed
+# to the user, and a duplicate request would stream a second copy of the answer.
+HEDGED_CHAINS = ("intent", "booking_info", "intent_and_booking_info", "booking_change")
+
+
+class LatencyTracker:
+    """
+    Latencies of the most recent calls of a chain.
+    """
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if not self.samples:
+                return None
+            ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def __len__(self):
+        return len(self.samples)
+
+
+class Hedger:
+    """
+    Hedged requests for chain calls: once a call has taken longer than the given percentile
+    of the recent calls of its chain, a duplicate is sent and the first answer is used.
+    """
+
+    def __init__(
+        self,
+        percentile: float = 0.95,
+        window: int = 200,
+        min_samples: int = 20,
+        chains: tuple[str, ...] = HEDGED_CHAINS,
+        max_workers: int = 32,
+    ):
+        """
+        Args:
+            percentile (float): Latency percentile after which the duplicate is sent.
+            window (int): Number of recent calls the percentile is computed over.
+            min_samples (int): Calls needed before a chain is hedged.
+            chains (tuple): Names of the chains to hedge, the others are returned unchanged.
+            max_workers (int): Threads running sync calls, which are waited on with a timeout.
+        """
+        self.percentile = percentile
+        self.window = window
+        self.min_samples = min_samples
+        self.chains = chains
+        self.trackers: dict[str, LatencyTracker] = {}
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+        self.calls = {}
+        self.hedged = {}
+        self.hedge_wins = {}
+        self._lock = threading.Lock()
+
+    def _tracker(self, name: str) -> LatencyTracker:
+        with self._lock:
+            if name not in self.trackers:
+                self.trackers[name] = LatencyTracker(self.window)
+                self.calls[name] = self.hedged[name] = self.hedge_wins[name] = 0
+            return self.trackers[name]
+
+    def _count(self, name: str, hedged: bool, hedge_won: bool):
+        with self._lock:
+            self.calls[name] += 1
+            self.hedged[name] += hedged
+            self.hedge_wins[name] += hedge_won
+
+    @staticmethod
+    def _record(tracker: LatencyTracker, started: dict):
+        # A request overtaken by its duplicate is recorded with its time so far, which keeps
+        # the slow calls in the window instead of only the answers that won
+        now = time.perf_counter()
+        for start in started.values():
+            tracker.record(now - start)
+
+    def delay(self, name: str) -> Optional[float]:
+        """
+        Returns how long a call of the chain runs before it is hedged, None while there
+        are too few samples.
+        """
+        tracker = self._tracker(name)
+        if len(tracker) < self.min_samples:
+            return None
+        return tracker.percentile(self.percentile)
+
+    def wrap(self, chain, name: str):
+        """
+        Returns the chain with hedged calls if its name is one of the hedged chains.
+        """
+        if name not in self.chains:
+            return chain
+        tracker = self._tracker(name)
+
+        def submit(inputs, config):
+            # Each request runs in a copy of the caller's context, which carries the callbacks
+            context = contextvars.copy_context()
+            return self.executor.submit(context.run, chain.invoke, inputs, config=config)
+
+        def invoke(inputs, config=None):
+            delay = self.delay(name)
+            started = {submit(inputs, config): time.perf_counter()}
+            done, _ = wait(started, timeout=delay)
+            if not done:
+                started[submit(inputs, config)] = time.perf_counter()
+            pending = set(started)
+            while True:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                # Successful answers first, an error is only raised once both requests failed
+                for future in sorted(done, key=lambda future: future.exception() is not None):
+                    if future.exception() is None or not pending:
+                        self._record(tracker, started)
+                        self._count(name, len(started) > 1, future is not next(iter(started)))
+                        # A request that is still running finishes in the background
+                        return future.result()
+
+        async def ainvoke(inputs, config=None):
+            delay = self.delay(name)
+            first = asyncio.ensure_future(chain.ainvoke(inputs, config=config))
+            started = {first: time.perf_counter()}
+            pending = set(started)
+            try:
+                done, _ = await asyncio.wait(pending, timeout=delay)
+                if not done:
+                    second = asyncio.ensure_future(chain.ainvoke(inputs, config=config))
+                    started[second] = time.perf_counter()
+                    pending.add(second)
+                while True:
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in sorted(done, key=lambda task: task.exception() is not None):
+                        if task.exception() is None or not pending:
+                            self._record(tracker, started)
+                            self._count(name, len(started) > 1, task is not first)
+                            return task.result()
+            finally:
+                for task in pending:
+                    task.cancel()
+
+        return RunnableLambda(invoke, afunc=ainvoke, name=f"hedged_{name}")
+
+    def stats(self) -> dict:
+        """
+        Returns, per chain, the calls, how many were hedged, how many the duplicate won,
+        and the current hedging delay.
+        """
+        with self._lock:
+            names = list(self.trackers)
+        return {
+            name: {
+                "calls": self.calls[name],
+                "hedged": self.hedged[name],
+                "hedge_wins": self.hedge_wins[name],
+                "hedge_delay_seconds": self.delay(name),
+            }
+            for name in names
+        }
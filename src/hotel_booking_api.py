@@ -1,13 +1,201 @@
-from fastapi import FastAPI, HTTPException
+import os
+import json
+import asyncio
+import logging
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, Literal, List
-from agent import BookingWorkflow
+from agent import BookingWorkflow, SessionNotFoundError
+from bulk_validation import bulk_booking_errors
+from cassette import Cassette
+from chain_cache import ChainCache
+from checkpointing import ThreadLocalSqliteSaver
+from llm_client import LLMClientRegistry, set_registry
+from model_routing import ModelRouter
+from hedging import Hedger
+from instrumentation import Instrumentation, trace_logger
+from profiling import Profiler
+from inventory import RoomUnavailableError, parse_room_types
+from reservations import ReservationStore
+from validation import booking_errors
 
 # Initialize FastAPI app
 app = FastAPI()
 
-# Initialize the BookingWorkflow instance
-workflow = BookingWorkflow(debug=True)
+# Shared LLM clients: concurrency limits, rate limits (0 for none) and retries
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 16))
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", 0))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", 0))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 4))
+
+# Model tiers, only if FAST_MODEL is set (e.g. "gpt-4o-mini"): intent and booking
+# information extraction then start on the fast model and escalate to LARGE_MODEL when
+# their output is rejected. Unset, every chain keeps the default model
+FAST_MODEL = os.getenv("FAST_MODEL")
+LARGE_MODEL = os.getenv("LARGE_MODEL", "gpt-4o")
+
+# Per-node deadlines answered with a template fallback, and hedging of slow chain calls
+# once they pass the given latency percentile (0 disables either). Hedging is off by
+# default: every hedge is a duplicate paid completion that also counts against the rate
+# limits, e.g. about 5% more LLM calls at HEDGE_PERCENTILE=0.95
+NODE_DEADLINE_SECONDS = float(os.getenv("NODE_DEADLINE_SECONDS", 20))
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", 0))
+
+# Result cache for the temperature 0 chains, on disk only if CHAIN_CACHE_DB is set
+CHAIN_CACHE_SIZE = int(os.getenv("CHAIN_CACHE_SIZE", 10_000))
+CHAIN_CACHE_TTL_SECONDS = float(os.getenv("CHAIN_CACHE_TTL_SECONDS", 24 * 3600))
+CHAIN_CACHE_DB = os.getenv("CHAIN_CACHE_DB")
+
+# Record/replay of every chain call, only if CASSETTE_PATH is set. CASSETTE_MODE is
+# "record" or "replay"; CASSETTE_STRICT=1 fails replay misses instead of calling the model
+CASSETTE_PATH = os.getenv("CASSETTE_PATH")
+CASSETTE_MODE = os.getenv("CASSETTE_MODE", "replay")
+CASSETTE_STRICT = os.getenv("CASSETTE_STRICT") == "1"
+CASSETTE_LATENCY = os.getenv("CASSETTE_LATENCY", "zero")
+
+# Next questions, booking summaries and correction requests rendered from templates instead
+# of the LLM if TEMPLATE_RESPONSES=1, except for the comma-separated LLM_RESPONSE_NODES
+TEMPLATE_RESPONSES = os.getenv("TEMPLATE_RESPONSES") == "1"
+LLM_RESPONSE_NODES = tuple(filter(None, os.getenv("LLM_RESPONSE_NODES", "").split(",")))
+
+# Per-node timing served at /metrics, and the share of turns logged as structured traces
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 0.01))
+
+if TRACE_SAMPLE_RATE > 0:
+    trace_logger.setLevel(logging.INFO)
+    trace_logger.addHandler(logging.StreamHandler())
+
+# Per-turn profiles, written for requests with an "X-Profile: 1" header or "?profile=1",
+# and for a PROFILE_SAMPLE_RATE share of all turns
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+
+# Conversation database, shared by all worker processes: WAL mode, a busy timeout, one
+# connection per thread for the sync graph and several connections for the async one
+CONVERSATION_DB = os.getenv("CONVERSATION_DB", "conversation_history.db")
+SQLITE_BUSY_TIMEOUT_SECONDS = float(os.getenv("SQLITE_BUSY_TIMEOUT_SECONDS", 30))
+SQLITE_ASYNC_CONNECTIONS = int(os.getenv("SQLITE_ASYNC_CONNECTIONS", 4))
+
+# Confirmed bookings, looked up by booking reference or guest name; in the conversation
+# database unless RESERVATIONS_DB is set
+RESERVATIONS_DB = os.getenv("RESERVATIONS_DB", CONVERSATION_DB)
+# In-memory trigram index of the guest names for /reservations/search, which lists the
+# names closest to a misspelled or partial one. Off unless RESERVATIONS_NAME_INDEX=1: the
+# endpoint has no authentication, so only turn it on where its callers are trusted
+RESERVATIONS_NAME_INDEX = os.getenv("RESERVATIONS_NAME_INDEX", "0") == "1"
+# /reservations/search: how far below the best match a name may score and still be listed
+SEARCH_WITHIN = float(os.getenv("SEARCH_WITHIN", 0.2))
+# Rooms of the hotel as "name:guests:rooms" pairs separated by commas, e.g.
+# "single:1:10,double:2:30"; every confirmed booking holds one, and dates no room is free
+# for are sent back for correction. The room inventory is off unless ROOM_TYPES is set
+ROOM_TYPES = parse_room_types(os.getenv("ROOM_TYPES", ""))
+
+# /run_workflow/batch: largest accepted batch, and most items of a batch running at once
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", 1000))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", 32))
+# /validate/bulk: most bookings checked in one request
+VALIDATE_MAX_ROWS = int(os.getenv("VALIDATE_MAX_ROWS", 100_000))
+
+
+class Services:
+    """
+    The BookingWorkflow of a worker process and the components it shares.
+    """
+
+    def __init__(self):
+        self.llm_clients = LLMClientRegistry(
+            max_concurrency=LLM_MAX_CONCURRENCY,
+            requests_per_minute=LLM_REQUESTS_PER_MINUTE or None,
+            tokens_per_minute=LLM_TOKENS_PER_MINUTE or None,
+            max_retries=LLM_MAX_RETRIES,
+        )
+        set_registry(self.llm_clients)
+        self.model_router = (
+            ModelRouter(model_tiers={"fast": FAST_MODEL, "large": LARGE_MODEL})
+            if FAST_MODEL
+            else None
+        )
+        self.hedger = Hedger(percentile=HEDGE_PERCENTILE) if HEDGE_PERCENTILE > 0 else None
+        self.chain_cache = ChainCache(
+            max_size=CHAIN_CACHE_SIZE,
+            ttl_seconds=CHAIN_CACHE_TTL_SECONDS,
+            db_path=CHAIN_CACHE_DB,
+        )
+        self.cassette = (
+            Cassette(
+                CASSETTE_PATH,
+                mode=CASSETTE_MODE,
+                strict=CASSETTE_STRICT,
+                latency=CASSETTE_LATENCY,
+            )
+            if CASSETTE_PATH
+            else None
+        )
+        self.instrumentation = Instrumentation(trace_sample_rate=TRACE_SAMPLE_RATE)
+        self.profiler = Profiler(directory=PROFILE_DIR, sample_rate=PROFILE_SAMPLE_RATE)
+        self.reservations = ReservationStore(
+            RESERVATIONS_DB,
+            busy_timeout=SQLITE_BUSY_TIMEOUT_SECONDS,
+            name_index=RESERVATIONS_NAME_INDEX,
+            room_types=ROOM_TYPES,
+        )
+        self.workflow = BookingWorkflow(
+            db_path=CONVERSATION_DB,
+            durability="end_of_turn",
+            intent_fast_path=True,
+            local_extraction=True,
+            dynamic_extraction_schema=True,
+            chain_cache=self.chain_cache,
+            model_router=self.model_router,
+            node_deadlines=dict.fromkeys(BookingWorkflow.LLM_NODES, NODE_DEADLINE_SECONDS)
+            if NODE_DEADLINE_SECONDS > 0
+            else None,
+            hedger=self.hedger,
+            instrumentation=self.instrumentation,
+            profiler=self.profiler,
+            cassette=self.cassette,
+            busy_timeout=SQLITE_BUSY_TIMEOUT_SECONDS,
+            connection_per_thread=True,
+            async_connections=SQLITE_ASYNC_CONNECTIONS,
+            template_responses=TEMPLATE_RESPONSES,
+            llm_response_nodes=LLM_RESPONSE_NODES,
+            reservations=self.reservations,
+        )
+
+    async def aclose(self):
+        await self.workflow.aclose()
+        if isinstance(self.workflow.saver, ThreadLocalSqliteSaver):
+            self.workflow.saver.close()
+        self.reservations.close()
+        await self.llm_clients.aclose()
+        self.llm_clients.close()
+
+
+_services: Optional[Services] = None
+_services_pid: Optional[int] = None
+
+
+def get_services() -> Services:
+    """
+    Returns the services of the current process, creating them on first use. Nothing is
+    created on import, and a process forked after they were created (e.g. by gunicorn
+    --preload) builds its own: SQLite connections, HTTP connection pools and worker
+    threads do not survive a fork. Any worker can resume any thread_id, since the
+    conversation state is read from the shared database on every turn.
+    """
+    global _services, _services_pid
+    if _services_pid != os.getpid():
+        _services = Services()
+        _services_pid = os.getpid()
+    return _services
+
+
+# Checkpoint store maintenance, run periodically in the background
+MAINTENANCE_INTERVAL_SECONDS = float(os.getenv("MAINTENANCE_INTERVAL_SECONDS", 3600))
+KEEP_LAST_CHECKPOINTS = int(os.getenv("KEEP_LAST_CHECKPOINTS", 10))
+THREAD_TTL_SECONDS = float(os.getenv("THREAD_TTL_SECONDS", 7 * 24 * 3600))
 
 
 # Define the request and response models for FastAPI
@@ -28,16 +216,327 @@ class BookingState(BaseModel):
     error: Optional[List[str]] = None
     not_filled_keys: Optional[List[str]] = None
     response: Optional[str] = None
+    booking_reference: Optional[str] = None
+
+
+def profile_requested(request: Request) -> bool:
+    flag = request.headers.get("X-Profile") or request.query_params.get("profile")
+    return get_services().profiler.should_profile(flag in ("1", "true", "yes"))
+
+
+def run_profiled(label: str, run, *args) -> BookingState:
+    # Profiled turns run the sync graph in their own worker thread, so the samples are not
+    # mixed with the other requests served by the event loop
+    with get_services().profiler.profile(label):
+        return BookingState(**run(*args))
 
 
 @app.post("/run_workflow/", response_model=BookingState)
-async def run_workflow(state: BookingState):
+async def run_workflow(state: BookingState, request: Request):
+    workflow = get_services().workflow
     try:
         # Convert Pydantic model to dictionary
         state_dict = state.dict(exclude_unset=True)
-        # Run the workflow graph with the given state
-        updated_state = workflow.run_graph(state_dict)
+        if profile_requested(request):
+            return await asyncio.to_thread(
+                run_profiled, "run_graph", workflow.run_graph, state_dict
+            )
+        # Run the workflow graph with the given state without blocking the event loop
+        updated_state = await workflow.arun_graph(state_dict)
         # Return the updated state
         return BookingState(**updated_state)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+class Session(BaseModel):
+    thread_id: str
+
+
+class SessionTurn(BaseModel):
+    thread_id: str
+    user_message: str
+
+
+@app.post("/sessions/", response_model=Session)
+async def create_session():
+    try:
+        # The conversation state lives in the checkpointer, the client only keeps the thread_id
+        thread_id = await get_services().workflow.acreate_session()
+        return Session(thread_id=thread_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/run_turn/", response_model=BookingState)
+async def run_turn(turn: SessionTurn, request: Request):
+    workflow = get_services().workflow
+    try:
+        if profile_requested(request):
+            # Only turns of existing sessions are profiled
+            if not await asyncio.to_thread(workflow.has_session, turn.thread_id):
+                raise SessionNotFoundError(turn.thread_id)
+            return await asyncio.to_thread(
+                run_profiled, turn.thread_id, workflow.run_turn, turn.thread_id, turn.user_message
+            )
+        # Resume the conversation from its last checkpoint with the new message
+        updated_state = await workflow.arun_turn(turn.thread_id, turn.user_message)
+        return BookingState(**updated_state)
+    except SessionNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Unknown session: {turn.thread_id}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+class BatchItem(BaseModel):
+    # Either a session turn (thread_id and user_message) or a state run like /run_workflow/
+    thread_id: Optional[str] = None
+    user_message: Optional[str] = None
+    state: Optional[BookingState] = None
+
+
+class BatchRequest(BaseModel):
+    items: List[BatchItem]
+    max_concurrency: Optional[int] = None
+
+
+class BatchItemResult(BaseModel):
+    status: int
+    state: Optional[BookingState] = None
+    error: Optional[str] = None
+
+
+def batch_payload(item: BatchItem) -> Optional[dict]:
+    if item.state is not None and item.thread_id is None:
+        return item.state.dict(exclude_unset=True)
+    if item.thread_id is not None and item.user_message is not None and item.state is None:
+        return {"thread_id": item.thread_id, "user_message": item.user_message}
+    return None
+
+
+def batch_item_result(payload: dict, result) -> BatchItemResult:
+    if isinstance(result, SessionNotFoundError):
+        return BatchItemResult(status=404, error=f"Unknown session: {payload['thread_id']}")
+    if isinstance(result, Exception):
+        return BatchItemResult(status=500, error=str(result))
+    return BatchItemResult(status=200, state=BookingState(**result))
+
+
+@app.post("/run_workflow/batch", response_model=List[BatchItemResult])
+async def run_workflow_batch(batch: BatchRequest):
+    if len(batch.items) > BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413, detail=f"A batch holds at most {BATCH_MAX_ITEMS} items"
+        )
+    payloads = [batch_payload(item) for item in batch.items]
+    valid = [payload for payload in payloads if payload is not None]
+    concurrency = max(1, min(batch.max_concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    # The items run concurrently, the turns of one session in the order they were sent
+    results = iter(
+        await get_services().workflow.arun_graph_batch(valid, max_concurrency=concurrency)
+    )
+    return [
+        batch_item_result(payload, next(results))
+        if payload is not None
+        else BatchItemResult(
+            status=422, error="An item needs either a state, or a thread_id and a user_message"
+        )
+        for payload in payloads
+    ]
+
+
+class BulkValidationRequest(BaseModel):
+    # One column per booking field, all of the same length; null where a booking lacks it
+    full_name: Optional[List[Optional[str]]] = None
+    check_in_date: Optional[List[Optional[str]]] = None
+    check_out_date: Optional[List[Optional[str]]] = None
+    num_guests: Optional[List[Optional[int]]] = None
+    payment_method: Optional[List[Optional[str]]] = None
+
+
+class RowError(BaseModel):
+    message: str
+    fields: List[str]
+
+
+class BulkValidationResult(BaseModel):
+    rows: int
+    invalid_rows: int
+    errors: List[List[RowError]]
+
+
+@app.post("/validate/bulk", response_model=BulkValidationResult)
+async def validate_bulk(request: BulkValidationRequest):
+    # The rules of validate_information over many bookings, e.g. a group or an import
+    columns = request.dict(exclude_none=True)
+    if any(len(values) > VALIDATE_MAX_ROWS for values in columns.values()):
+        raise HTTPException(
+            status_code=413, detail=f"A request holds at most {VALIDATE_MAX_ROWS} bookings"
+        )
+    try:
+        errors = await asyncio.to_thread(bulk_booking_errors, columns)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return BulkValidationResult(
+        rows=len(errors),
+        invalid_rows=sum(map(bool, errors)),
+        errors=[
+            [RowError(message=message, fields=fields) for message, fields in row]
+            for row in errors
+        ],
+    )
+
+
+def server_sent_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/run_turn/stream")
+async def stream_turn(turn: SessionTurn):
+    events = get_services().workflow.astream_turn(turn.thread_id, turn.user_message)
+    try:
+        # The first event is awaited here so an unknown session still gets a 404
+        first_event = await events.__anext__()
+    except SessionNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Unknown session: {turn.thread_id}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    async def event_stream():
+        # Server-sent events: "token" for every piece of the response, then "state"
+        try:
+            kind, value = first_event
+            while True:
+                if kind == "token":
+                    yield server_sent_event("token", {"text": value})
+                else:
+                    yield server_sent_event("state", BookingState(**value).dict())
+                kind, value = await events.__anext__()
+        except StopAsyncIteration:
+            pass
+        except Exception as e:
+            yield server_sent_event("error", {"detail": str(e)})
+        finally:
+            # Also runs when the client disconnects, so the unfinished turn is discarded
+            await events.aclose()
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+
+@app.get("/reservations/search")
+async def search_reservations(name: str, limit: int = 5):
+    # Guest names closest to a possibly misspelled or partial name, with their similarity.
+    # No bookings or references: a reference is all it takes to load and change a booking
+    reservations = get_services().reservations
+    if reservations.names is None:
+        raise HTTPException(status_code=404, detail="The name index is disabled")
+    matches = reservations.match_name(name, limit=min(max(limit, 1), 50), within=SEARCH_WITHIN)
+    return [{"name": key, "score": round(score, 3)} for key, score in matches]
+
+
+@app.get("/reservations/{reference}")
+async def get_reservation(reference: str):
+    booking = get_services().reservations.get(reference)
+    if booking is None:
+        raise HTTPException(status_code=404, detail=f"Unknown booking reference: {reference}")
+    return booking
+
+
+@app.get("/rooms/availability")
+async def room_availability(check_in_date: str, check_out_date: str, num_guests: int = 1):
+    # Rooms of each type free for a stay, and the one a booking for num_guests would hold
+    reservations = get_services().reservations
+    if reservations.rooms is None:
+        raise HTTPException(status_code=404, detail="The room inventory is disabled")
+    stay = {"check_in_date": check_in_date, "check_out_date": check_out_date}
+    errors = booking_errors({**stay, "num_guests": num_guests})
+    if errors:
+        raise HTTPException(status_code=422, detail=[message for message, _ in errors])
+    try:
+        room_type, error = reservations.room_for(num_guests, **stay), None
+    except RoomUnavailableError as e:
+        room_type, error = None, str(e)
+    return {
+        "room_type": room_type,
+        "error": error,
+        "rooms_left": reservations.rooms_left(**stay),
+    }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    # Node, chat model, token and checkpoint histograms in the Prometheus text format
+    return PlainTextResponse(
+        get_services().instrumentation.render(), media_type="text/plain; version=0.0.4"
+    )
+
+
+@app.get("/llm_client/stats")
+async def llm_client_stats():
+    # Queue depth, wait times and retries of the shared LLM clients
+    return get_services().llm_clients.stats()
+
+
+@app.get("/model_routing/stats")
+async def model_routing_stats():
+    # Per-chain model usage, escalation rate and latency
+    model_router = get_services().model_router
+    return model_router.stats() if model_router is not None else {}
+
+
+@app.get("/hedging/stats")
+async def hedging_stats():
+    # Hedged calls per chain and the current hedging delays
+    hedger = get_services().hedger
+    return hedger.stats() if hedger is not None else {}
+
+
+@app.get("/templates/stats")
+async def template_stats():
+    # Templated and LLM answers per node, and the share and latency of LLM-free turns
+    templates = get_services().workflow.response_templates
+    return templates.stats() if templates is not None else {}
+
+
+@app.get("/chain_cache/stats")
+async def chain_cache_stats():
+    # Hit, miss and eviction counters of the chain result cache
+    return get_services().chain_cache.stats()
+
+
+async def maintain_checkpoints_periodically():
+    while True:
+        await asyncio.sleep(MAINTENANCE_INTERVAL_SECONDS)
+        try:
+            # SQLite calls block, so the maintenance runs in a worker thread
+            report = await asyncio.to_thread(
+                get_services().workflow.maintain_checkpoints,
+                keep_last=KEEP_LAST_CHECKPOINTS,
+                ttl_seconds=THREAD_TTL_SECONDS,
+            )
+            print(
+                f"Checkpoint maintenance: {report['expired_threads']} threads expired, "
+                f"{report['pruned_checkpoints']} checkpoints pruned, "
+                f"{report['before']['db_bytes'] + report['before']['wal_bytes']} -> "
+                f"{report['after']['db_bytes'] + report['after']['wal_bytes']} bytes"
+            )
+        except Exception as e:
+            print(f"Checkpoint maintenance failed: {e}")
+
+
+@app.on_event("startup")
+async def start_maintenance():
+    # Startup runs in every worker process, after any fork
+    get_services()
+    if MAINTENANCE_INTERVAL_SECONDS > 0:
+        app.state.maintenance_task = asyncio.create_task(
+            maintain_checkpoints_periodically()
+        )
+
+
+@app.on_event("shutdown")
+async def close_workflow():
+    task = getattr(app.state, "maintenance_task", None)
+    if task is not None:
+        task.cancel()
+    await get_services().aclose()
@@ -0,0 +1,377 @@
+import json
+import time
+import random
+import logging
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Any, Sequence
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langgraph.checkpoint.base import BaseCheckpointSaver
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+TOKEN_BUCKETS = (16, 32, 64, 128, 256, 512, 1024, 2048, 4096, 8192)
+
+trace_logger = logging.getLogger("booking_workflow.trace")
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Histogram:
+    """
+    Prometheus-style histogram with fixed buckets and one series per label combination.
+    """
+
+    def __init__(self, name: str, help: str, labels: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [counts per bucket (the last one is +Inf), sum]
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {key: (list(counts), total) for key, (counts, total) in self._series.items()}
+        for label_values, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = _labels(self.labels, label_values, f'le="{bound}"')
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            labels = _labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Counter:
+    """
+    Prometheus-style counter with one series per label combination.
+    """
+
+    def __init__(self, name: str, help: str, labels: Sequence[str]):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._series: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            series = dict(self._series)
+        for label_values, value in sorted(series.items()):
+            lines.append(f"{self.name}{_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+def _token_usage(response) -> tuple[int, int]:
+    input_tokens = output_tokens = 0
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if usage:
+                input_tokens += usage["input_tokens"]
+                output_tokens += usage["output_tokens"]
+    return input_tokens, output_tokens
+
+
+class _LLMCallback(BaseCallbackHandler):
+    """
+    Records the duration and tokens of every chat model call under the graph node it ran in.
+    """
+
+    # Called in the thread of the run instead of being handed to an executor
+    run_inline = True
+
+    def __init__(self, instrumentation: "Instrumentation"):
+        self.instrumentation = instrumentation
+        # run_id -> (node, start time)
+        self._runs: dict[Any, tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        node = (metadata or {}).get("langgraph_node", "none")
+        with self._lock:
+            self._runs[run_id] = (node, time.perf_counter())
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        with self._lock:
+            run = self._runs.pop(run_id, None)
+        if run is not None:
+            node, start = run
+            self.instrumentation.observe_llm(
+                node, time.perf_counter() - start, *_token_usage(response)
+            )
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        with self._lock:
+            self._runs.pop(run_id, None)
+
+
+class _TraceCallback(BaseCallbackHandler):
+    """
+    Collects the spans of one sampled turn: every node run and every chat model call.
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self.spans: list[dict] = []
+        # run_id -> (span, start time)
+        self._open: dict[Any, tuple[dict, float]] = {}
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def _begin(self, run_id, span: dict):
+        now = time.perf_counter()
+        span["start_ms"] = round((now - self._started) * 1000, 2)
+        with self._lock:
+            self._open[run_id] = (span, now)
+
+    def _end(self, run_id, **fields):
+        with self._lock:
+            entry = self._open.pop(run_id, None)
+            if entry is None:
+                return
+            span, start = entry
+            span["ms"] = round((time.perf_counter() - start) * 1000, 2)
+            span.update(fields)
+            self.spans.append(span)
+
+    def on_chain_start(
+        self, serialized, inputs, *, run_id, parent_run_id=None, metadata=None, name=None, **kwargs
+    ):
+        # Only the outermost run of a node, not the runnables of the same name it wraps,
+        # the chains inside it or the graph's own __start__ step
+        node = (metadata or {}).get("langgraph_node")
+        if node is None or node != name or node.startswith("__"):
+            return
+        with self._lock:
+            if parent_run_id in self._open:
+                return
+        self._begin(run_id, {"node": node})
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs):
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=type(error).__name__)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        self._begin(run_id, {"llm": (metadata or {}).get("langgraph_node", "none")})
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        input_tokens, output_tokens = _token_usage(response)
+        self._end(run_id, input_tokens=input_tokens, output_tokens=output_tokens)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._end(run_id, error=type(error).__name__)
+
+
+class TimedCheckpointSaver(BaseCheckpointSaver):
+    """
+    Wraps a checkpoint saver and records how long its reads and writes take.
+    """
+
+    def __init__(self, saver: BaseCheckpointSaver, instrumentation: "Instrumentation"):
+        super().__init__(serde=saver.serde)
+        self.saver = saver
+        self.instrumentation = instrumentation
+
+    def __getattr__(self, name):
+        # setup(), lock, conn and the other attributes of the wrapped saver
+        return getattr(self.saver, name)
+
+    def get_next_version(self, current, channel):
+        return self.saver.get_next_version(current, channel)
+
+    def get_tuple(self, config):
+        with self.instrumentation.checkpoint_timer("get"):
+            return self.saver.get_tuple(config)
+
+    def list(self, config, *, filter=None, before=None, limit=None):
+        return self.saver.list(config, filter=filter, before=before, limit=limit)
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        with self.instrumentation.checkpoint_timer("put"):
+            return self.saver.put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(self, config, writes, task_id):
+        with self.instrumentation.checkpoint_timer("put_writes"):
+            return self.saver.put_writes(config, writes, task_id)
+
+    async def aget_tuple(self, config):
+        with self.instrumentation.checkpoint_timer("get"):
+            return await self.saver.aget_tuple(config)
+
+    async def alist(self, config, *, filter=None, before=None, limit=None):
+        async for item in self.saver.alist(config, filter=filter, before=before, limit=limit):
+            yield item
+
+    async def aput(self, config, checkpoint, metadata, new_versions):
+        with self.instrumentation.checkpoint_timer("put"):
+            return await self.saver.aput(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(self, config, writes, task_id):
+        with self.instrumentation.checkpoint_timer("put_writes"):
+            return await self.saver.aput_writes(config, writes, task_id)
+
+
+class Instrumentation:
+    """
+    Per-node timing for BookingWorkflow: wall time of every node, duration and tokens of
+    the chat model calls made in it, checkpoint reads and writes, and turn duration, kept in
+    histograms served in the Prometheus text format. A sampled share of the turns is also
+    logged as one structured trace per turn. Workflows built without it pay nothing, and
+    unsampled turns pay for a few clock reads and histogram updates.
+    """
+
+    def __init__(self, trace_sample_rate: float = 0.0, prefix: str = "booking"):
+        """
+        Args:
+            trace_sample_rate (float): Share of turns logged as a structured trace.
+            prefix (str): Prefix of the metric names.
+        """
+        self.trace_sample_rate = trace_sample_rate
+        self.turn_seconds = Histogram(
+            f"{prefix}_turn_duration_seconds", "Duration of a conversation turn.", (), SECONDS_BUCKETS
+        )
+        self.node_seconds = Histogram(
+            f"{prefix}_node_duration_seconds", "Wall time of a graph node.", ("node",), SECONDS_BUCKETS
+        )
+        self.llm_seconds = Histogram(
+            f"{prefix}_llm_duration_seconds",
+            "Duration of a chat model call, by the node that made it.",
+            ("node",),
+            SECONDS_BUCKETS,
+        )
+        self.llm_tokens = Histogram(
+            f"{prefix}_llm_tokens",
+            "Tokens of a chat model call, by node and direction.",
+            ("node", "direction"),
+            TOKEN_BUCKETS,
+        )
+        self.checkpoint_seconds = Histogram(
+            f"{prefix}_checkpoint_duration_seconds",
+            "Duration of a checkpoint read or write.",
+            ("operation",),
+            SECONDS_BUCKETS,
+        )
+        self.node_errors = Counter(
+            f"{prefix}_node_errors_total", "Graph node calls that raised.", ("node",)
+        )
+        self.callback = _LLMCallback(self)
+
+    def wrap_node(self, name: str, func, afunc=None):
+        """
+        Returns the sync and async implementations of a node, timed. A node without an
+        async implementation keeps None.
+        """
+
+        def run(state):
+            start = time.perf_counter()
+            try:
+                return func(state)
+            except BaseException:
+                self.node_errors.inc(name)
+                raise
+            finally:
+                self.node_seconds.observe(time.perf_counter() - start, name)
+
+        async def arun(state):
+            start = time.perf_counter()
+            try:
+                return await afunc(state)
+            except BaseException:
+                self.node_errors.inc(name)
+                raise
+            finally:
+                self.node_seconds.observe(time.perf_counter() - start, name)
+
+        return run, arun if afunc is not None else None
+
+    def observe_llm(self, node: str, seconds: float, input_tokens: int, output_tokens: int):
+        self.llm_seconds.observe(seconds, node)
+        self.llm_tokens.observe(input_tokens, node, "input")
+        self.llm_tokens.observe(output_tokens, node, "output")
+
+    @contextmanager
+    def checkpoint_timer(self, operation: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.checkpoint_seconds.observe(time.perf_counter() - start, operation)
+
+    @contextmanager
+    def turn(self, config: dict):
+        """
+        Times a turn of the graph.
+
+        Args:
+            config (dict): Config of the graph run.
+
+        Yields:
+            dict: The config to run the graph with, carrying the chat model callback and,
+            if the turn is sampled, the callback collecting its trace.
+        """
+        trace = None
+        if self.trace_sample_rate > 0 and random.random() < self.trace_sample_rate:
+            trace = _TraceCallback()
+        callbacks = [self.callback] if trace is None else [self.callback, trace]
+        run_config = {**config, "callbacks": [*(config.get("callbacks") or []), *callbacks]}
+        start = time.perf_counter()
+        error = None
+        try:
+            yield run_config
+        except BaseException as e:
+            error = type(e).__name__
+            raise
+        finally:
+            seconds = time.perf_counter() - start
+            self.turn_seconds.observe(seconds)
+            if trace is not None:
+                trace_logger.info(json.dumps({
+                    "thread_id": config.get("configurable", {}).get("thread_id"),
+                    "ms": round(seconds * 1000, 2),
+                    "error": error,
+                    "spans": trace.spans,
+                }))
+
+    def render(self) -> str:
+        """
+        Returns all metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        for metric in (
+            self.turn_seconds,
+            self.node_seconds,
+            self.llm_seconds,
+            self.llm_tokens,
+            self.checkpoint_seconds,
+            self.node_errors,
+        ):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
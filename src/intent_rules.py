@@ -0,0 +1,211 @@
+import re
+import threading
+from typing import Optional
+
+# Intents the rules can settle without calling intent_chain
+MAKE = "make a reservation"
+CHECK = "check reservation"
+CHANGE = "change reservation"
+
+VALID_PAYMENT_METHODS = ["credit card", "debit card", "cash", "paypal"]
+
+_DATE = re.compile(r"\b\d{4}-\d{2}-\d{2}\b")
+_GUESTS = re.compile(
+    r"^(?:we are |we're |for |just )?(\d{1,2}|one|two|three|four|five|six)"
+    r"(?: (?:guests?|people|persons?|adults?|of us))?[.!]?$"
+)
+_PAYMENT = re.compile(
+    r"^(?:i(?:'ll| will)? (?:pay|use) |pay |by |with |using )?(?:with |by |in )?(?:a |my )?"
+    r"(" + "|".join(re.escape(method) for method in VALID_PAYMENT_METHODS) + r")[.!]?$"
+)
+_YES_NO = re.compile(
+    r"^(?:yes|yeah|yep|sure|of course|please|no|nope|no thanks|no, thanks|no thank you)"
+    r"(?:[,.!]? ?(?:please|thanks|thank you))?[.!]?$"
+)
+_NAME = re.compile(
+    r"^(?:my name is |i am |i'm |it's )?([a-z][a-z'.-]+(?: [a-z][a-z'.-]+){1,3})[.!]?$"
+)
+# Words that make a short reply unlikely to be a name
+_NOT_NAME_WORDS = {
+    "hi", "hello", "hey", "there", "thanks", "thank", "you", "yes", "no", "ok", "okay",
+    "what", "why", "how", "when", "where", "who", "is", "are", "the", "a", "an", "do",
+    "can", "please", "room", "hotel", "booking", "reservation", "breakfast", "not",
+}
+
+_CHANGE = re.compile(
+    r"\b(?:change|modify|update|switch|move|reschedule|correct)\b.*"
+    r"\b(?:booking|reservation|date|name|guests?|payment|breakfast|check-?in|check-?out)\b"
+)
+# "the booking" is only the guest's booking when it is not part of a compound noun such as
+# "the booking fee" or "the reservation desk"
+_CHECK = re.compile(
+    r"\b(?:check|see|show|view|confirm|review|what is|what's)\b.*"
+    r"\b(?:(?:my|our) (?:booking|reservation)\b|the (?:booking|reservation)\b(?! (?:form|fees?"
+    r"|polic(?:y|ies)|desk|number|page|site|website|system|process|office|line|email|terms"
+    r"|conditions|options?|requirements?|rules?|deadline)\b))"
+    r"|\b(?:booking|reservation) (?:details|status|summary)\b"
+)
+# A request to book, at the start of the message or of a clause: "I'd like to book a room",
+# "hi, can I reserve a double room for two nights", "I want to make a reservation"
+_MAKE = re.compile(
+    r"(?:^|[,.!;] )(?:(?:hi|hello|hey|ok|okay|yes|so)[,!]? )?(?P<request>"
+    r"(?:i|we)(?:'d| would)? (?:like|want|need|wish|love)(?: to)? |(?:can|could|may) (?:i|we) "
+    r"|please |let's )?"
+    r"(?:(?:book|reserve)(?: (?:me|us))? (?:[a-z0-9-]+ ){0,3}?(?:rooms?|stay|suite|nights?)\b"
+    r"|(?:make|get) (?:a|an) (?:new )?(?:reservation|booking)\b)"
+)
+# Words that turn an explicit request into something the rules should not settle
+_NEGATION = re.compile(
+    r"\b(?:not|no|never|nothing|don't|dont|doesn't|didn't|won't|wouldn't|can't|cannot)\b"
+)
+_CANCEL = re.compile(r"\b(?:cancel\w*|refund\w*|delete|remove)\b")
+# A question about a booking is only about the guest's own with "my" or "our"
+_POSSESSIVE = re.compile(r"\b(?:my|our)\b")
+_QUESTION = re.compile(
+    r"\?|^(?:do|does|is|are|will|would|should|what|when|where|why|how|who|which)\b"
+)
+
+# Words in the assistant's last question that tell which field it asked for
+_QUESTION_KEYS = {
+    "full_name": ("name",),
+    "check_in_date": ("check-in", "check in", "arrival", "date"),
+    "check_out_date": ("check-out", "check out", "departure", "date"),
+    "num_guests": ("guest", "people", "persons", "how many"),
+    "payment_method": ("payment", "pay"),
+    "breakfast_included": ("breakfast",),
+}
+
+
+class IntentPreClassifier:
+    """
+    Rule-based intent classifier for the obvious turns: explicit requests to book, check or
+    change a reservation, and short answers that fit the field the assistant just asked for
+    while a reservation is in progress. Confident predictions skip the intent_chain call.
+    """
+
+    def __init__(self, threshold: float = 0.9):
+        """
+        Args:
+            threshold (float): Minimum confidence for a rule prediction to be used.
+        """
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _asked_keys(not_filled_keys: list[str], last_response: Optional[str]) -> list[str]:
+        if not last_response:
+            return []
+        question = last_response.lower()
+        return [
+            key
+            for key in not_filled_keys
+            if any(word in question for word in _QUESTION_KEYS.get(key, ()))
+        ]
+
+    def classify(
+        self,
+        message: str,
+        not_filled_keys: Optional[list[str]] = None,
+        last_response: Optional[str] = None,
+        previous_intent: Optional[str] = None,
+    ) -> tuple[Optional[str], float]:
+        """
+        Classifies a message with the local rules.
+
+        Args:
+            message (str): The user's message.
+            not_filled_keys (list): Booking fields still missing.
+            last_response (str): The assistant's previous message.
+            previous_intent (str): The intent of the previous turn.
+
+        Returns:
+            tuple: The predicted intent (None if no rule applies) and its confidence.
+        """
+        text = " ".join(message.lower().split())
+        not_filled_keys = not_filled_keys or []
+
+        make = _MAKE.search(text)
+        # Questions are not requests to book, except the polite "can I book a room?"
+        if make and _QUESTION.search(text) and not (make.group("request") or "").startswith(
+            ("can ", "could ", "may ")
+        ):
+            make = None
+        explicit = [
+            intent
+            for intent, matched in (
+                (CHANGE, _CHANGE.search(text)),
+                (CHECK, _CHECK.search(text)),
+                (MAKE, make),
+            )
+            if matched
+        ]
+        if explicit:
+            # Several requests at once, a negation or a cancellation: leave it to intent_chain
+            if len(explicit) > 1 or _NEGATION.search(text) or _CANCEL.search(text):
+                return explicit[0], 0.5
+            if explicit[0] == MAKE:
+                return MAKE, 0.95
+            # "What is the booking fee?" or "how do I change a reservation?" ask about the
+            # hotel's rules rather than for the guest's booking
+            if _QUESTION.search(text) and not _POSSESSIVE.search(text):
+                return explicit[0], 0.7
+            return explicit[0], 0.9
+
+        in_progress = previous_intent == MAKE and len(not_filled_keys) > 0
+        if not in_progress:
+            return None, 0.0
+
+        # Short answers matching the format of a field that is still missing
+        asked = self._asked_keys(not_filled_keys, last_response)
+        missing_dates = {"check_in_date", "check_out_date"} & set(not_filled_keys)
+        if missing_dates and _DATE.search(text):
+            return MAKE, 0.95
+        if "num_guests" in not_filled_keys and _GUESTS.match(text):
+            return MAKE, 0.95
+        if "payment_method" in not_filled_keys and _PAYMENT.match(text):
+            return MAKE, 0.95
+        if "breakfast_included" in asked and _YES_NO.match(text):
+            return MAKE, 0.95
+        name = _NAME.match(text)
+        if "full_name" in asked and name and not _NOT_NAME_WORDS & set(name.group(1).split()):
+            return MAKE, 0.9
+        if asked and len(text.split()) <= 4:
+            return MAKE, 0.6
+
+        return None, 0.0
+
+    def predict(
+        self,
+        message: str,
+        not_filled_keys: Optional[list[str]] = None,
+        last_response: Optional[str] = None,
+        previous_intent: Optional[str] = None,
+    ) -> Optional[str]:
+        """
+        Returns the intent if the rules are confident enough, otherwise None so the
+        caller falls back to intent_chain. Updates the hit and miss counters.
+        """
+        intent, confidence = self.classify(
+            message, not_filled_keys, last_response, previous_intent
+        )
+        settled = intent is not None and confidence >= self.threshold
+        with self._lock:
+            if settled:
+                self.hits += 1
+            else:
+                self.misses += 1
+        return intent if settled else None
+
+    def stats(self) -> dict:
+        """
+        Returns the hit and miss counters and the share of messages settled locally.
+        """
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
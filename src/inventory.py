@@ -0,0 +1,305 @@
+import threading
+from datetime import date
+from itertools import accumulate
+from typing import Iterable, Optional
+
+# Example room types in the ROOM_TYPES format: name, guests per room and number of rooms
+DEFAULT_ROOM_TYPES = "single:1:10,double:2:30,family:4:10,suite:6:4"
+
+
+class RoomUnavailableError(ValueError):
+    """
+    No room fits the booking; `fields` are the booking fields to ask the guest for again.
+    """
+
+    def __init__(self, message: str, fields: list[str]):
+        super().__init__(message)
+        self.fields = fields
+
+
+def parse_room_types(spec: str) -> dict[str, tuple[int, int]]:
+    """
+    Parses room types given as "name:guests:rooms" separated by commas, e.g.
+    "single:1:10,double:2:30", into {name: (guests per room, number of rooms)}.
+    """
+    room_types = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        try:
+            name, capacity, rooms = item.split(":")
+            room_types[name] = (int(capacity), int(rooms))
+        except ValueError:
+            raise ValueError(f"Invalid room type {item!r}, expected name:guests:rooms.") from None
+    return room_types
+
+
+class OccupancyTree:
+    """
+    Number of rooms booked on each night, in a segment tree: adding a booked range and
+    reading the busiest night of a range both take O(log n) steps, whatever the length of
+    the stay. Every node holds the maximum of its range plus the additions pending for its
+    whole range, which are pushed down to the children before a lookup goes through it.
+    """
+
+    def __init__(self, size: int, counts: Optional[list[int]] = None):
+        """
+        Args:
+            size (int): Number of nights covered, rounded up to a power of two.
+            counts (list): Starting value of each night, if not 0.
+        """
+        self.height = max(size - 1, 1).bit_length()
+        self.size = 1 << self.height
+        self._max = [0] * (2 * self.size)
+        self._pending = [0] * self.size
+        if counts:
+            counts = counts[: self.size]
+            self._max[self.size : self.size + len(counts)] = counts
+            for node in range(self.size - 1, 0, -1):
+                self._max[node] = max(self._max[2 * node], self._max[2 * node + 1])
+
+    def _apply(self, node: int, value: int):
+        self._max[node] += value
+        if node < self.size:
+            self._pending[node] += value
+
+    def _pull(self, node: int):
+        # Recomputes the ancestors of a leaf from their children
+        while node > 1:
+            node >>= 1
+            self._max[node] = (
+                max(self._max[2 * node], self._max[2 * node + 1]) + self._pending[node]
+            )
+
+    def _push(self, node: int):
+        # Moves the pending additions of the ancestors of a leaf down to their children
+        for shift in range(self.height, 0, -1):
+            parent = node >> shift
+            value = self._pending[parent]
+            if value:
+                self._apply(2 * parent, value)
+                self._apply(2 * parent + 1, value)
+                self._pending[parent] = 0
+
+    def add(self, start: int, stop: int, value: int = 1):
+        """
+        Adds `value` to the nights start to stop - 1.
+        """
+        if start >= stop:
+            return
+        low, high = start + self.size, stop + self.size
+        first, last = low, high - 1
+        while low < high:
+            if low & 1:
+                self._apply(low, value)
+                low += 1
+            if high & 1:
+                high -= 1
+                self._apply(high, value)
+            low >>= 1
+            high >>= 1
+        self._pull(first)
+        self._pull(last)
+
+    def max(self, start: int, stop: int) -> int:
+        """
+        Returns the largest value of the nights start to stop - 1.
+        """
+        if start >= stop:
+            return 0
+        low, high = start + self.size, stop + self.size
+        self._push(low)
+        self._push(high - 1)
+        result = 0
+        while low < high:
+            if low & 1:
+                result = max(result, self._max[low])
+                low += 1
+            if high & 1:
+                high -= 1
+                result = max(result, self._max[high])
+            low >>= 1
+            high >>= 1
+        return result
+
+
+class RoomInventory:
+    """
+    Rooms of the hotel by type and the nights they are held by bookings.
+
+    Each room type has one OccupancyTree counting its rooms held per night, so whether a
+    room is free from check-in to check-out is one O(log n) lookup per type. Rooms are not
+    numbered: as long as no night has more bookings than rooms, the bookings of a type can
+    always be spread over its rooms. Nights are counted from the day the inventory was
+    created; the trees double when a booking goes past their last night.
+
+    The inventory only lives in memory. ReservationStore keeps the holds in its database,
+    loads them into the inventory and checks and holds rooms under the database's write
+    lock, so bookings made by several processes cannot take the same room.
+    """
+
+    def __init__(
+        self,
+        room_types: dict[str, tuple[int, int]],
+        nights: int = 512,
+        today: Optional[date] = None,
+    ):
+        """
+        Args:
+            room_types (dict): {name: (guests per room, number of rooms)}.
+            nights (int): Nights covered from the start; more are added as needed.
+            today (date): First night covered, defaults to today. Earlier nights are ignored.
+        """
+        if not room_types:
+            raise ValueError("Give at least one room type.")
+        # Smallest rooms first, so a booking takes the smallest free room that fits
+        self.room_types = dict(sorted(room_types.items(), key=lambda item: (item[1][0], item[0])))
+        self._first = (today or date.today()).toordinal()
+        self._trees = {name: OccupancyTree(nights) for name in self.room_types}
+        # Room type and nights of every hold, by booking reference
+        self._holds: dict[str, tuple[str, int, int]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._holds)
+
+    def _nights(self, check_in_date: str, check_out_date: str) -> tuple[int, int]:
+        start = date.fromisoformat(check_in_date).toordinal() - self._first
+        stop = date.fromisoformat(check_out_date).toordinal() - self._first
+        return max(start, 0), max(stop, 0)
+
+    def _rebuild(self, stop: int = 0):
+        # Called with the lock held: rebuilds the trees from the holds, in time linear in
+        # the holds and nights, doubling them until they cover `stop`
+        size = next(iter(self._trees.values())).size
+        while size < stop:
+            size *= 2
+        changes = {name: [0] * (size + 1) for name in self.room_types}
+        for room_type, start, end in self._holds.values():
+            if room_type in changes:
+                changes[room_type][start] += 1
+                changes[room_type][end] -= 1
+        self._trees = {
+            name: OccupancyTree(size, list(accumulate(changes[name][:size])))
+            for name in self.room_types
+        }
+
+    def _booked(self, room_type: str, start: int, stop: int) -> int:
+        tree = self._trees[room_type]
+        return tree.max(min(start, tree.size), min(stop, tree.size))
+
+    def room_for(
+        self,
+        num_guests: int,
+        check_in_date: str,
+        check_out_date: str,
+        reference: Optional[str] = None,
+    ) -> str:
+        """
+        Returns the smallest room type with a room free for the whole stay.
+
+        Args:
+            num_guests (int): Guests in the room.
+            check_in_date (str): First night, YYYY-MM-DD.
+            check_out_date (str): Day of departure, YYYY-MM-DD.
+            reference (str): Booking being changed, whose own hold does not count.
+
+        Raises:
+            RoomUnavailableError: No room takes that many guests, or none is free.
+        """
+        fitting = [
+            name for name, (capacity, _) in self.room_types.items() if capacity >= num_guests
+        ]
+        if not fitting:
+            largest = max(capacity for capacity, _ in self.room_types.values())
+            raise RoomUnavailableError(
+                f"Our largest rooms take {largest} guests.", ["num_guests"]
+            )
+        start, stop = self._nights(check_in_date, check_out_date)
+        with self._lock:
+            own = self._holds.get(reference) if reference is not None else None
+            if own is not None and own[0] in self._trees:
+                self._trees[own[0]].add(own[1], own[2], -1)
+            try:
+                for name in fitting:
+                    if self._booked(name, start, stop) < self.room_types[name][1]:
+                        return name
+            finally:
+                if own is not None and own[0] in self._trees:
+                    self._trees[own[0]].add(own[1], own[2])
+        raise RoomUnavailableError(
+            f"No room for {num_guests} guests is free from {check_in_date} to {check_out_date}.",
+            ["check_in_date", "check_out_date"],
+        )
+
+    def rooms_left(self, check_in_date: str, check_out_date: str) -> dict[str, int]:
+        """
+        Returns the rooms of each type free for the whole stay.
+        """
+        start, stop = self._nights(check_in_date, check_out_date)
+        with self._lock:
+            return {
+                name: max(rooms - self._booked(name, start, stop), 0)
+                for name, (_, rooms) in self.room_types.items()
+            }
+
+    def _hold(self, reference: str, room_type: str, check_in_date: str, check_out_date: str):
+        start, stop = self._nights(check_in_date, check_out_date)
+        self._release(reference)
+        self._holds[reference] = (room_type, start, stop)
+        tree = self._trees.get(room_type)
+        if tree is None:
+            # A type no longer offered still keeps its holds, in case it comes back
+            return
+        if stop > tree.size:
+            self._rebuild(stop)
+        else:
+            tree.add(start, stop)
+
+    def hold(self, reference: str, room_type: str, check_in_date: str, check_out_date: str):
+        """
+        Holds a room of the given type for a booking, moving the booking's earlier hold.
+        It does not check that the room is free: see room_for.
+        """
+        with self._lock:
+            self._hold(reference, room_type, check_in_date, check_out_date)
+
+    def hold_many(self, holds: Iterable[tuple[str, str, str, str]]):
+        """
+        Holds rooms for many bookings, given as (reference, room type, check-in date,
+        check-out date). Past as many holds as nights, the trees are rebuilt once instead
+        of being updated hold by hold, e.g. when a store loads its holds.
+        """
+        holds = list(holds)
+        with self._lock:
+            if len(holds) <= next(iter(self._trees.values())).size:
+                for hold in holds:
+                    self._hold(*hold)
+                return
+            last = 0
+            for reference, room_type, check_in_date, check_out_date in holds:
+                start, stop = self._nights(check_in_date, check_out_date)
+                self._holds[reference] = (room_type, start, stop)
+                last = max(last, stop)
+            self._rebuild(last)
+
+    def _release(self, reference: str):
+        held = self._holds.pop(reference, None)
+        if held is not None and held[0] in self._trees:
+            self._trees[held[0]].add(held[1], held[2], -1)
+
+    def release(self, reference: str):
+        """
+        Frees the room held by a booking, if any.
+        """
+        with self._lock:
+            self._release(reference)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "room_types": {
+                    name: {"guests": capacity, "rooms": rooms}
+                    for name, (capacity, rooms) in self.room_types.items()
+                },
+                "holds": len(self._holds),
+                "nights_indexed": next(iter(self._trees.values())).size,
+            }
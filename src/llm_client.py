@@ -0,0 +1,486 @@
+import json
+import time
+import random
+import asyncio
+import threading
+from collections import deque
+from typing import Optional
+
+import httpx
+from langchain_openai import ChatOpenAI
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at `rate_per_minute`. Reservations may
+    overdraw the bucket, the caller then waits until the debt is paid back.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60
+        self.capacity = rate_per_minute if capacity is None else capacity
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        """
+        Takes `amount` from the bucket and returns how long to wait before using it, in seconds.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens -= amount
+            return max(0.0, -self.tokens / self.rate)
+
+
+class ConcurrencyLimit:
+    """
+    Limit on requests in flight shared by threads and coroutines, whichever event loop they
+    run on: a counter under a thread lock, with the waiters of both kinds served first in,
+    first out. A released slot is handed straight to the next waiter, so waiters that
+    arrive later cannot take it in between.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._used = 0
+        # threading.Event of a waiting thread, or (event loop, future) of a waiting coroutine
+        self._waiters: deque = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self._used < self.limit and not self._waiters:
+                self._used += 1
+                return
+            event = threading.Event()
+            self._waiters.append(event)
+        event.wait()
+
+    async def aacquire(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if self._used < self.limit and not self._waiters:
+                self._used += 1
+                return
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    raise
+            # The slot was handed over as the wait was cancelled: pass it on
+            self.release()
+            raise
+
+    def release(self):
+        with self._lock:
+            while self._waiters:
+                waiter = self._waiters.popleft()
+                if isinstance(waiter, threading.Event):
+                    waiter.set()
+                    return
+                loop, future = waiter
+                try:
+                    loop.call_soon_threadsafe(_wake, future)
+                    return
+                except RuntimeError:
+                    # Its event loop is closed, so nobody waits for this one any more
+                    continue
+            self._used -= 1
+
+
+def _wake(future: asyncio.Future):
+    if not future.done():
+        future.set_result(None)
+
+
+def _request_cost(request: httpx.Request) -> tuple[Optional[str], int]:
+    """
+    Returns the model of a chat completion request and a rough estimate of its tokens
+    (four characters per prompt token, plus the completion limit if one is set).
+    """
+    try:
+        body = json.loads(request.read() or b"{}")
+    except ValueError:
+        return None, 0
+    prompt_tokens = len(json.dumps(body.get("messages", ""))) // 4
+    completion_tokens = body.get("max_completion_tokens") or body.get("max_tokens") or 0
+    return body.get("model"), prompt_tokens + completion_tokens
+
+
+class _ReleasingStream(httpx.SyncByteStream):
+    """
+    Response body that frees the request's concurrency slot once it has been read or closed.
+    """
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    def __iter__(self):
+        yield from self._stream
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self._release()
+
+
+class _AsyncReleasingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._release = release
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            self._release()
+
+
+class _LimitedTransport(httpx.BaseTransport):
+    """
+    Transport of the shared sync client: waits for a concurrency slot and the rate limits,
+    then sends the request through the pooled transport, retrying 429 and 5xx answers.
+    """
+
+    def __init__(self, registry: "LLMClientRegistry", transport: httpx.BaseTransport):
+        self.registry = registry
+        self.transport = transport
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        registry = self.registry
+        model, tokens = _request_cost(request)
+        limits = [registry._limit(None), registry._limit(model)]
+
+        start = time.perf_counter()
+        registry._record_queued(1)
+        acquired = []
+        try:
+            for limit in limits:
+                if limit is not None:
+                    limit.acquire()
+                    acquired.append(limit)
+            time.sleep(registry._reserve(tokens))
+        except BaseException:
+            for limit in acquired:
+                limit.release()
+            raise
+        finally:
+            registry._record_queued(-1, time.perf_counter() - start)
+
+        release = registry._releaser(acquired)
+        try:
+            for attempt in range(registry.max_retries + 1):
+                response = self.transport.handle_request(request)
+                registry._record_response(model, response.status_code)
+                if response.status_code not in RETRY_STATUS_CODES or attempt == registry.max_retries:
+                    break
+                response.close()
+                registry._record_retry()
+                time.sleep(registry._backoff(attempt, response) + registry._reserve(tokens))
+        except BaseException:
+            release()
+            raise
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_ReleasingStream(response.stream, release),
+            extensions=response.extensions,
+        )
+
+    def close(self):
+        self.transport.close()
+
+
+class _AsyncLimitedTransport(httpx.AsyncBaseTransport):
+    """
+    Asynchronous version of _LimitedTransport.
+    """
+
+    def __init__(self, registry: "LLMClientRegistry", transport: httpx.AsyncBaseTransport):
+        self.registry = registry
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        registry = self.registry
+        model, tokens = _request_cost(request)
+        limits = [registry._limit(None), registry._limit(model)]
+
+        start = time.perf_counter()
+        registry._record_queued(1)
+        acquired = []
+        try:
+            for limit in limits:
+                if limit is not None:
+                    await limit.aacquire()
+                    acquired.append(limit)
+            await asyncio.sleep(registry._reserve(tokens))
+        except BaseException:
+            for limit in acquired:
+                limit.release()
+            raise
+        finally:
+            registry._record_queued(-1, time.perf_counter() - start)
+
+        release = registry._releaser(acquired)
+        try:
+            for attempt in range(registry.max_retries + 1):
+                response = await self.transport.handle_async_request(request)
+                registry._record_response(model, response.status_code)
+                if response.status_code not in RETRY_STATUS_CODES or attempt == registry.max_retries:
+                    break
+                await response.aclose()
+                registry._record_retry()
+                await asyncio.sleep(registry._backoff(attempt, response) + registry._reserve(tokens))
+        except BaseException:
+            release()
+            raise
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_AsyncReleasingStream(response.stream, release),
+            extensions=response.extensions,
+        )
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+class LLMClientRegistry:
+    """
+    Chat model clients shared by all chains. Every model goes through one keep-alive
+    connection pool (one sync and one async), with a global and a per-model limit on
+    requests in flight, token-bucket rate limits on requests and tokens per minute, and
+    jittered exponential backoff on 429 and 5xx answers. The limits and rate limits are
+    shared by the sync and async calls, so they hold whatever mix of the two the
+    process makes.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 16,
+        model_concurrency: Optional[dict[str, int]] = None,
+        requests_per_minute: Optional[float] = None,
+        tokens_per_minute: Optional[float] = None,
+        max_retries: int = 4,
+        backoff_base: float = 0.5,
+        backoff_max: float = 20.0,
+        max_connections: int = 32,
+        transport: Optional[httpx.BaseTransport] = None,
+        async_transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        """
+        Args:
+            max_concurrency (int): Requests in flight across all models.
+            model_concurrency (dict): Requests in flight per model, for the models listed.
+            requests_per_minute (float): Request rate limit, None for no limit.
+            tokens_per_minute (float): Estimated token rate limit, None for no limit.
+            max_retries (int): Retries of a request answered with 429 or 5xx.
+            backoff_base (float): First retry delay in seconds, doubled on every retry.
+            backoff_max (float): Upper bound of the retry delay in seconds.
+            max_connections (int): Size of each of the sync and async keep-alive connection
+                pools.
+            transport: Sync transport used instead of the pooled HTTP transport, e.g. a mock.
+            async_transport: Async transport used instead of the pooled HTTP transport.
+        """
+        self.max_concurrency = max_concurrency
+        self.model_concurrency = model_concurrency or {}
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.request_bucket = (
+            TokenBucket(requests_per_minute) if requests_per_minute else None
+        )
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+
+        limits = httpx.Limits(
+            max_connections=max_connections, max_keepalive_connections=max_connections
+        )
+        self.http_client = httpx.Client(
+            transport=_LimitedTransport(
+                self, transport or httpx.HTTPTransport(limits=limits)
+            ),
+            timeout=httpx.Timeout(60.0, connect=5.0),
+        )
+        self.http_async_client = httpx.AsyncClient(
+            transport=_AsyncLimitedTransport(
+                self, async_transport or httpx.AsyncHTTPTransport(limits=limits)
+            ),
+            timeout=httpx.Timeout(60.0, connect=5.0),
+        )
+
+        self._models: dict[tuple, ChatOpenAI] = {}
+        self._limits: dict[Optional[str], ConcurrencyLimit] = {}
+        self._lock = threading.Lock()
+
+        self.queued = 0
+        self.max_queued = 0
+        self.in_flight = 0
+        self.waits = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.requests: dict[str, int] = {}
+        self.retries = 0
+        self.rate_limited = 0
+        self.server_errors = 0
+
+    def chat_model(self, model: str = "gpt-4o", temperature: float = 0, **kwargs) -> ChatOpenAI:
+        """
+        Returns the shared client for a model and sampling settings, creating it on first use.
+        """
+        key = (model, temperature, tuple(sorted(kwargs.items())))
+        with self._lock:
+            if key not in self._models:
+                self._models[key] = ChatOpenAI(
+                    model=model,
+                    temperature=temperature,
+                    http_client=self.http_client,
+                    http_async_client=self.http_async_client,
+                    # Retries are done by the transport, which knows about the shared limits
+                    max_retries=0,
+                    **kwargs,
+                )
+            return self._models[key]
+
+    def _limit(self, model: Optional[str]) -> Optional[ConcurrencyLimit]:
+        """
+        Returns the global limit (model None) or the one of a model, if it has one. Sync
+        and async requests share them.
+        """
+        limit = self.max_concurrency if model is None else self.model_concurrency.get(model)
+        if not limit:
+            return None
+        with self._lock:
+            if model not in self._limits:
+                self._limits[model] = ConcurrencyLimit(limit)
+            return self._limits[model]
+
+    def _reserve(self, tokens: int) -> float:
+        wait = 0.0
+        if self.request_bucket is not None:
+            wait = max(wait, self.request_bucket.reserve(1))
+        if self.token_bucket is not None:
+            wait = max(wait, self.token_bucket.reserve(tokens))
+        return wait
+
+    def _backoff(self, attempt: int, response: httpx.Response) -> float:
+        """
+        Returns the delay before a retry: the server's Retry-After if given, otherwise
+        exponential backoff with full jitter.
+        """
+        retry_after = response.headers.get("retry-after")
+        if retry_after is not None:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+
+    def _releaser(self, limits: list):
+        """
+        Counts a request as in flight and returns the idempotent function that ends it.
+        """
+        with self._lock:
+            self.in_flight += 1
+        released = False
+
+        def release():
+            nonlocal released
+            with self._lock:
+                if released:
+                    return
+                released = True
+                self.in_flight -= 1
+            for limit in limits:
+                limit.release()
+
+        return release
+
+    def _record_queued(self, delta: int, wait: Optional[float] = None):
+        with self._lock:
+            self.queued += delta
+            self.max_queued = max(self.max_queued, self.queued)
+            if wait is not None:
+                self.waits += 1
+                self.total_wait += wait
+                self.max_wait = max(self.max_wait, wait)
+
+    def _record_response(self, model: Optional[str], status_code: int):
+        with self._lock:
+            self.requests[model] = self.requests.get(model, 0) + 1
+            if status_code == 429:
+                self.rate_limited += 1
+            elif status_code >= 500:
+                self.server_errors += 1
+
+    def _record_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def stats(self) -> dict:
+        """
+        Returns the queue depth, wait times, requests per model and retry counters.
+        """
+        with self._lock:
+            return {
+                "queue_depth": self.queued,
+                "max_queue_depth": self.max_queued,
+                "in_flight": self.in_flight,
+                "mean_wait_seconds": self.total_wait / self.waits if self.waits else 0.0,
+                "max_wait_seconds": self.max_wait,
+                "requests": dict(self.requests),
+                "retries": self.retries,
+                "rate_limited": self.rate_limited,
+                "server_errors": self.server_errors,
+            }
+
+    def close(self):
+        self.http_client.close()
+
+    async def aclose(self):
+        await self.http_async_client.aclose()
+
+
+_default_registry: Optional[LLMClientRegistry] = None
+_default_registry_lock = threading.Lock()
+
+
+def get_registry() -> LLMClientRegistry:
+    """
+    Returns the process-wide registry used by the chains, creating it with the defaults.
+    """
+    global _default_registry
+    with _default_registry_lock:
+        if _default_registry is None:
+            _default_registry = LLMClientRegistry()
+        return _default_registry
+
+
+def set_registry(registry: LLMClientRegistry):
+    """
+    Replaces the process-wide registry. Only chains created afterwards use it.
+    """
+    global _default_registry
+    with _default_registry_lock:
+        _default_registry = registry
+
+
+def get_chat_model(model: str = "gpt-4o", temperature: float = 0, **kwargs) -> ChatOpenAI:
+    """
+    Returns the shared client of the process-wide registry for a model.
+    """
+    return get_registry().chat_model(model, temperature, **kwargs)
@@ -0,0 +1,223 @@
+import re
+import threading
+from datetime import date, timedelta
+from typing import Optional
+
+from intent_rules import VALID_PAYMENT_METHODS
+from pydantic_classes import BookingInfo
+
+_NUMBER_WORDS = {
+    "one": 1,
+    "two": 2,
+    "three": 3,
+    "four": 4,
+    "five": 5,
+    "six": 6,
+    "seven": 7,
+    "eight": 8,
+    "nine": 9,
+    "ten": 10,
+}
+_NUMBER = r"(\d{1,2}|" + "|".join(_NUMBER_WORDS) + r")"
+_WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+_ISO_DATE = re.compile(r"\b(\d{4})-(\d{2})-(\d{2})\b")
+_RELATIVE_DATE = re.compile(
+    r"\b(?:(day after tomorrow)|(today|tonight)|(tomorrow)"
+    r"|in " + _NUMBER + r" days?"
+    r"|(next|this|on) (" + "|".join(_WEEKDAYS) + r"))\b"
+)
+_NIGHTS = re.compile(r"\bfor " + _NUMBER + r" nights?\b")
+_GUESTS = re.compile(r"\b" + _NUMBER + r" (?:guests?|people|persons?|adults?|of us)\b")
+_BARE_NUMBER = re.compile(r"^(?:we are |we're |for |just )?" + _NUMBER + r"[.!]?$")
+_PAYMENT = re.compile(
+    r"\b(" + "|".join(re.escape(method) for method in VALID_PAYMENT_METHODS) + r")\b"
+)
+_BREAKFAST_YES = re.compile(
+    r"\b(?:with|include|including|includes|add) (?:the )?breakfast\b"
+    r"|\bbreakfast (?:included|please|yes)\b"
+)
+_BREAKFAST_NO = re.compile(
+    r"\b(?:without|no|skip|exclude) (?:the )?breakfast\b|\bbreakfast (?:not included|no)\b"
+)
+_YES = re.compile(r"^\s*(?:yes|yeah|yep|sure|of course|please)\b")
+_NO = re.compile(r"^\s*(?:no|nope)\b")
+_CHECK_OUT_HINT = re.compile(r"check-?\s?out|leave|leaving|depart|until|till")
+
+# Words that carry no booking information once the recognized values are removed
+_FILLER_WORDS = {
+    "i", "we", "we'll", "i'll", "i'd", "we'd", "we're", "will", "would", "like", "to", "pay", "paying", "with",
+    "by", "using", "use", "in", "on", "at", "for", "from", "and", "the", "a", "an", "my",
+    "our", "please", "thanks", "thank", "you", "it", "is", "be", "are", "there", "of",
+    "guest", "guests", "people", "persons", "person", "adults", "us", "night", "nights",
+    "check", "check-in", "check-out", "out", "checking", "arrive", "arriving",
+    "leave", "leaving", "until", "till", "date", "dates", "yes", "no", "ok", "okay",
+    "sure", "breakfast", "included", "include", "including", "without", "that", "fine",
+    "great", "perfect", "also", "want", "need", "room", "stay", "just", "then",
+}
+
+
+def _number(token: str) -> int:
+    return int(token) if token.isdigit() else _NUMBER_WORDS[token]
+
+
+class LocalBookingExtractor:
+    """
+    Deterministic extraction of the fixed-format booking fields (dates, number of guests,
+    payment method and breakfast) before booking_info_chain is called. Relative dates are
+    resolved against a reference date. It keeps per-field counters of what it filled and of
+    how many LLM calls it avoided.
+    """
+
+    FIELDS = [
+        "check_in_date",
+        "check_out_date",
+        "num_guests",
+        "payment_method",
+        "breakfast_included",
+    ]
+
+    def __init__(self):
+        self.filled = {field: 0 for field in self.FIELDS}
+        self.messages = 0
+        self.llm_calls = 0
+        self._lock = threading.Lock()
+
+    def _resolve_relative(self, match: re.Match, today: date) -> date:
+        day_after, same_day, tomorrow, in_days, qualifier, weekday = match.groups()
+        if day_after:
+            return today + timedelta(days=2)
+        if same_day:
+            return today
+        if tomorrow:
+            return today + timedelta(days=1)
+        if in_days:
+            return today + timedelta(days=_number(in_days))
+        # "next", "this" and "on" a weekday all mean its next occurrence after today
+        days_ahead = (_WEEKDAYS.index(weekday) - today.weekday()) % 7 or 7
+        return today + timedelta(days=days_ahead)
+
+    def extract(
+        self,
+        message: str,
+        not_filled_keys: list[str],
+        last_response: Optional[str] = None,
+        reference_date: Optional[date] = None,
+    ) -> tuple[BookingInfo, bool]:
+        """
+        Extracts the fixed-format fields that are still missing from a message.
+
+        Args:
+            message (str): The user's message.
+            not_filled_keys (list): Booking fields still missing.
+            last_response (str): The assistant's previous message, used to read bare answers.
+            reference_date (date): Date relative expressions are resolved against, today by default.
+
+        Returns:
+            tuple: The extracted BookingInfo and whether the message may still hold
+            information only the LLM can extract.
+        """
+        today = reference_date or date.today()
+        text = " ".join(message.lower().split())
+        question = (last_response or "").lower()
+        values = {}
+        spans = []
+
+        # Dates, in the order they appear in the message
+        dates = []
+        for match in _ISO_DATE.finditer(text):
+            dates.append((match.start(), match.group(0)))
+            spans.append(match.span())
+        for match in _RELATIVE_DATE.finditer(text):
+            dates.append((match.start(), self._resolve_relative(match, today).isoformat()))
+            spans.append(match.span())
+        dates = [value for _, value in sorted(dates)]
+        nights = _NIGHTS.search(text)
+        if nights:
+            spans.append(nights.span())
+
+        missing_dates = [
+            key for key in ("check_in_date", "check_out_date") if key in not_filled_keys
+        ]
+        if len(dates) >= 2:
+            values["check_in_date"], values["check_out_date"] = dates[0], dates[1]
+        elif len(dates) == 1:
+            asks_check_out = _CHECK_OUT_HINT.search(question) and not re.search(
+                r"check-?\s?in", question
+            )
+            wants_check_out = (
+                "check_in_date" not in missing_dates
+                or bool(_CHECK_OUT_HINT.search(text))
+                or bool(asks_check_out)
+            )
+            key = "check_out_date" if wants_check_out else "check_in_date"
+            values[key] = dates[0]
+            if key == "check_in_date" and nights:
+                check_in = date.fromisoformat(dates[0])
+                values["check_out_date"] = (
+                    check_in + timedelta(days=_number(nights.group(1)))
+                ).isoformat()
+
+        # Number of guests
+        guests = _GUESTS.search(text)
+        if guests:
+            values["num_guests"] = _number(guests.group(1))
+            spans.append(guests.span())
+        elif "guest" in question or "how many" in question:
+            bare = _BARE_NUMBER.match(text)
+            if bare:
+                values["num_guests"] = _number(bare.group(1))
+                spans.append(bare.span())
+
+        # Payment method, from the fixed list accepted by validate_information
+        payment = _PAYMENT.search(text)
+        if payment:
+            values["payment_method"] = payment.group(1)
+            spans.append(payment.span())
+
+        # Breakfast
+        if _BREAKFAST_NO.search(text):
+            values["breakfast_included"] = False
+        elif _BREAKFAST_YES.search(text):
+            values["breakfast_included"] = True
+        elif "breakfast" in question:
+            if _NO.match(text):
+                values["breakfast_included"] = False
+            elif _YES.match(text):
+                values["breakfast_included"] = True
+
+        values = {key: value for key, value in values.items() if key in not_filled_keys}
+
+        # Whatever is left once the recognized values are removed may hold other
+        # fields (typically the full name), which only the LLM can extract
+        residual = text
+        for start, end in sorted(spans, reverse=True):
+            residual = residual[:start] + " " + residual[end:]
+        residual_words = [
+            word for word in re.findall(r"[a-z][a-z'-]*", residual) if word not in _FILLER_WORDS
+        ]
+        remaining = [key for key in not_filled_keys if key not in values]
+        needs_llm = bool(remaining) and (not values or bool(residual_words))
+
+        with self._lock:
+            self.messages += 1
+            self.llm_calls += needs_llm
+            for key in values:
+                self.filled[key] += 1
+
+        return BookingInfo(**values), needs_llm
+
+    def stats(self) -> dict:
+        """
+        Returns the per-field coverage and the share of messages that still needed the LLM.
+        """
+        with self._lock:
+            return {
+                "messages": self.messages,
+                "llm_calls": self.llm_calls,
+                "llm_skip_rate": 1 - self.llm_calls / self.messages if self.messages else 0.0,
+                "filled": {
+                    field: count / self.messages if self.messages else 0.0
+                    for field, count in self.filled.items()
+                },
+            }
@@ -0,0 +1,175 @@
+import time
+import threading
+from typing import Any, Callable, Optional
+
+from langchain_core.exceptions import OutputParserException
+from langchain_core.runnables import RunnableLambda
+
+from llm_client import get_chat_model
+from validation import booking_errors
+
+# Model behind each tier
+MODEL_TIERS = {
+    "fast": "gpt-4o-mini",
+    "large": "gpt-4o",
+}
+
+# Tier each chain starts on. Chains on the fast tier escalate to the large one when
+# their output is rejected, if they have an acceptance check (see ACCEPT_CHECKS)
+CHAIN_TIERS = {
+    "intent": "fast",
+    "booking_info": "fast",
+    "intent_and_booking_info": "large",
+    "booking_change": "large",
+    "response": "large",
+    "summarization": "large",
+    "correction": "large",
+}
+
+
+def accept_intent(result) -> bool:
+    # Structured output parsers return None when the model does not call the schema tool
+    return result is not None
+
+
+def accept_booking_info(result) -> bool:
+    """
+    Accepts extracted booking fields if validate_information would accept every one of them.
+    """
+    if result is None:
+        return False
+    extracted = {key: value for key, value in result.model_dump().items() if value is not None}
+    return not booking_errors(extracted)
+
+
+ACCEPT_CHECKS = {
+    "intent": accept_intent,
+    "booking_info": accept_booking_info,
+}
+
+
+class ModelRouter:
+    """
+    Chooses the model of every chain from its tier. Chains with an acceptance check run on
+    the fast tier first and are retried on the large tier when the output fails schema
+    validation or the check rejects it. Keeps per-chain counts of the models used, the
+    escalations and the latency of each model.
+    """
+
+    def __init__(
+        self,
+        model_tiers: Optional[dict[str, str]] = None,
+        chain_tiers: Optional[dict[str, str]] = None,
+        models: Optional[dict[str, Any]] = None,
+        escalate: bool = True,
+    ):
+        """
+        Args:
+            model_tiers (dict): Model name per tier, MODEL_TIERS by default.
+            chain_tiers (dict): Tier per chain, overriding CHAIN_TIERS for the chains listed.
+            models (dict): Chat model instances per tier, used instead of the shared clients.
+            escalate (bool): If False, chains stay on their tier even when their output is rejected.
+        """
+        self.model_tiers = {**MODEL_TIERS, **(model_tiers or {})}
+        self.chain_tiers = {**CHAIN_TIERS, **(chain_tiers or {})}
+        self.models = models or {}
+        self.escalate = escalate
+        self._stats: dict[str, dict] = {}
+        self._lock = threading.Lock()
+
+    def chat_model(self, tier: str, temperature: float = 0):
+        if tier in self.models:
+            return self.models[tier]
+        return get_chat_model(self.model_tiers[tier], temperature=temperature)
+
+    def route(self, name: str, build: Callable, temperature: float = 0):
+        """
+        Builds a chain on the models of its tier.
+
+        Args:
+            name (str): Chain name, a key of the chain tiers.
+            build (callable): Builds the chain from a chat model.
+            temperature (float): Sampling temperature of the shared clients.
+
+        Returns:
+            Runnable: The chain, escalating to the large tier if it starts on the fast one.
+        """
+        tier = self.chain_tiers[name]
+        accept = ACCEPT_CHECKS.get(name)
+        first = build(self.chat_model(tier, temperature))
+        escalation = None
+        if self.escalate and accept is not None and tier != "large":
+            escalation = build(self.chat_model("large", temperature))
+
+        def attempt(tier, result, elapsed) -> bool:
+            self._record(name, tier, elapsed)
+            return escalation is None or accept(result)
+
+        def invoke(inputs, config=None):
+            start = time.perf_counter()
+            try:
+                result = first.invoke(inputs, config=config)
+            except (OutputParserException, ValueError):
+                if escalation is None:
+                    raise
+                self._record(name, tier, time.perf_counter() - start)
+            else:
+                if attempt(tier, result, time.perf_counter() - start):
+                    return result
+            start = time.perf_counter()
+            result = escalation.invoke(inputs, config=config)
+            self._record(name, "large", time.perf_counter() - start, escalated=True)
+            return result
+
+        async def ainvoke(inputs, config=None):
+            start = time.perf_counter()
+            try:
+                result = await first.ainvoke(inputs, config=config)
+            except (OutputParserException, ValueError):
+                if escalation is None:
+                    raise
+                self._record(name, tier, time.perf_counter() - start)
+            else:
+                if attempt(tier, result, time.perf_counter() - start):
+                    return result
+            start = time.perf_counter()
+            result = await escalation.ainvoke(inputs, config=config)
+            self._record(name, "large", time.perf_counter() - start, escalated=True)
+            return result
+
+        return RunnableLambda(invoke, afunc=ainvoke, name=f"routed_{name}")
+
+    def _record(self, name: str, tier: str, elapsed: float, escalated: bool = False):
+        with self._lock:
+            stats = self._stats.setdefault(name, {"calls": 0, "escalations": 0, "models": {}})
+            model = self.model_tiers[tier]
+            usage = stats["models"].setdefault(model, {"calls": 0, "seconds": 0.0})
+            usage["calls"] += 1
+            usage["seconds"] += elapsed
+            if escalated:
+                stats["escalations"] += 1
+            else:
+                stats["calls"] += 1
+
+    def stats(self) -> dict:
+        """
+        Returns, per chain, the calls, escalation rate and the calls and mean latency per model.
+        """
+        with self._lock:
+            return {
+                name: {
+                    "calls": stats["calls"],
+                    "escalations": stats["escalations"],
+                    "escalation_rate": stats["escalations"] / stats["calls"]
+                    if stats["calls"]
+                    else 0.0,
+                    "models": {
+                        model: {
+                            "calls": usage["calls"],
+                            "mean_seconds": usage["seconds"] / usage["calls"],
+                        }
+                        for model, usage in stats["models"].items()
+                    },
+                }
+                for name, stats in self._stats.items()
+            }
@@ -0,0 +1,353 @@
+import re
+import math
+import threading
+import unicodedata
+from array import array
+from typing import Iterable, Optional, Union
+
+import numpy as np
+
+_NOT_LETTER = re.compile(r"[\W\d_]+")
+
+# Similarity thresholds a lookup tries, highest first, before falling back to its min_score
+SEARCH_THRESHOLDS = (0.7, 0.5)
+
+# A trigram held by more than one name in DENSE_SHARE keeps a bitmap of every id instead of
+# a list of ids: one bit per name takes less room than 32 bits per holder from there on
+DENSE_SHARE = 32
+
+# Rough cost of a binary search for one id in a posting list, relative to marking one id
+SEARCH_COST = 8
+
+# Candidates come from sorting the shortest lists while those hold fewer ids than one in
+# SORT_SHARE names, and from counting into an array of every id beyond that
+SORT_SHARE = 8
+
+
+def fold(full_name: str) -> str:
+    """
+    Returns the form of a name that trigrams are taken from: lower case, without accents,
+    digits or punctuation, so "João D'Ávila" and "joao davila" share every trigram.
+    """
+    decomposed = unicodedata.normalize("NFKD", full_name.lower())
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(_NOT_LETTER.sub(" ", stripped.replace("'", "")).split())
+
+
+def trigrams(full_name: str) -> set[str]:
+    """
+    Returns the trigrams of a name, each word padded with two spaces in front and one
+    behind, as in PostgreSQL's pg_trgm: "H. Cosme" gives "  h" and " h ", so an initial
+    matches the start of the first name.
+    """
+    grams = set()
+    for word in fold(full_name).split():
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+class NameIndex:
+    """
+    In-memory trigram index of guest names with ranked fuzzy lookup.
+
+    Each distinct name gets an integer id. A trigram keeps the ids of the names that contain
+    it in an array of 32-bit integers, which stays sorted because ids only grow, or, once
+    more than one name in DENSE_SHARE has it, in a bitmap over all ids; the choice is
+    revisited every time the number of ids doubles.
+
+    Names are ranked by the Jaccard similarity of their trigram sets. A name reaching a
+    similarity threshold shares a known number of the query's trigrams, so it appears in at
+    least one of the query's shortest posting lists: those give the candidates, which are
+    then looked up in the longer lists, a bit test in a bitmap. A lookup tries high
+    thresholds first, where few lists give few candidates, and only goes lower while it has
+    found fewer names than asked for.
+
+    Removed names keep their id, marked by a trigram count of zero, until more than half
+    the ids are dead and the index is rebuilt.
+    """
+
+    def __init__(self, names: Iterable[str] = ()):
+        """
+        Args:
+            names (Iterable[str]): Names to index from the start.
+        """
+        self._lock = threading.Lock()
+        self._reset()
+        self.add_many(names)
+
+    def _reset(self):
+        self._names: list[Optional[str]] = []
+        self._ids: dict[str, int] = {}
+        # Trigram count of every id, 0 once the name is removed
+        self._sizes = array("H")
+        self._postings: dict[str, array] = {}
+        # Bitmaps of the dense trigrams, all self._capacity bits long, and their lengths
+        self._bitmaps: dict[str, bytearray] = {}
+        self._dense_sizes: dict[str, int] = {}
+        self._capacity = 0
+        self._rebalance_at = 1024
+        self.removed = 0
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._ids
+
+    def _add(self, name: str):
+        if name in self._ids:
+            return
+        grams = trigrams(name)
+        if not grams:
+            return
+        name_id = len(self._names)
+        self._names.append(name)
+        self._ids[name] = name_id
+        self._sizes.append(min(len(grams), 0xFFFF))
+        if name_id >= self._capacity:
+            self._grow()
+        for gram in grams:
+            bitmap = self._bitmaps.get(gram)
+            if bitmap is not None:
+                bitmap[name_id >> 3] |= 1 << (name_id & 7)
+                self._dense_sizes[gram] += 1
+                continue
+            postings = self._postings.get(gram)
+            if postings is None:
+                postings = self._postings[gram] = array("I")
+            postings.append(name_id)
+        if len(self._names) >= self._rebalance_at:
+            self._rebalance()
+            self._rebalance_at *= 2
+
+    def _grow(self):
+        extra = max(1024, self._capacity) // 8
+        for bitmap in self._bitmaps.values():
+            bitmap.extend(bytes(extra))
+        self._capacity += extra * 8
+
+    def _rebalance(self):
+        """
+        Moves the trigrams that became common to bitmaps and, with some slack so a trigram
+        does not switch back and forth, those that became rare to id arrays.
+        """
+        count = len(self._names)
+        for gram, postings in list(self._postings.items()):
+            if len(postings) * DENSE_SHARE > count:
+                bits = np.zeros(self._capacity, dtype=bool)
+                bits[np.frombuffer(postings, dtype=np.uint32)] = True
+                self._bitmaps[gram] = bytearray(np.packbits(bits, bitorder="little"))
+                self._dense_sizes[gram] = len(postings)
+                del self._postings[gram]
+        for gram, bitmap in list(self._bitmaps.items()):
+            if self._dense_sizes[gram] * DENSE_SHARE * 2 < count:
+                self._postings[gram] = array("I", self._bitmap_ids(bitmap).tobytes())
+                del self._bitmaps[gram], self._dense_sizes[gram]
+
+    @staticmethod
+    def _bitmap_ids(bitmap: bytearray) -> np.ndarray:
+        bits = np.unpackbits(np.frombuffer(bitmap, dtype=np.uint8), bitorder="little")
+        return np.flatnonzero(bits).astype(np.uint32)
+
+    def add(self, name: str):
+        """
+        Indexes a name; adding a name twice keeps one entry.
+        """
+        with self._lock:
+            self._add(name)
+
+    def add_many(self, names: Iterable[str]):
+        with self._lock:
+            for name in names:
+                self._add(name)
+
+    def remove(self, name: str):
+        """
+        Drops a name from the results; unknown names are ignored.
+        """
+        with self._lock:
+            name_id = self._ids.pop(name, None)
+            if name_id is None:
+                return
+            self._names[name_id] = None
+            self._sizes[name_id] = 0
+            self.removed += 1
+            if self.removed > len(self._names) // 2:
+                names = [name for name in self._names if name is not None]
+                self._reset()
+                for name in names:
+                    self._add(name)
+
+    def _lists(self, grams: set[str]) -> list[tuple[int, Union[array, bytearray]]]:
+        """
+        Returns the length and ids (array) or bitmap (bytearray) of every indexed trigram
+        of a query, shortest first.
+        """
+        lists = [
+            (self._dense_sizes[gram], self._bitmaps[gram])
+            if gram in self._bitmaps
+            else (len(self._postings[gram]), self._postings[gram])
+            for gram in grams
+            if gram in self._bitmaps or gram in self._postings
+        ]
+        return sorted(lists, key=lambda pair: pair[0])
+
+    def _ids_of(self, ids: Union[array, bytearray]) -> np.ndarray:
+        # The views must not outlive the lock: an array exporting its buffer cannot grow
+        if isinstance(ids, bytearray):
+            return self._bitmap_ids(ids)
+        return np.frombuffer(ids, dtype=np.uint32)
+
+    @staticmethod
+    def _contains(
+        ids: Union[array, bytearray], candidates: np.ndarray, marks: np.ndarray
+    ) -> np.ndarray:
+        """
+        Returns which of the (sorted) candidate ids are in a posting list or bitmap.
+        """
+        if isinstance(ids, bytearray):
+            bits = np.frombuffer(ids, dtype=np.uint8)[candidates >> 3]
+            return (bits >> (candidates & 7).astype(np.uint8)) & 1 == 1
+        ids = np.frombuffer(ids, dtype=np.uint32)
+        if len(candidates) * SEARCH_COST < len(ids):
+            positions = np.searchsorted(ids, candidates)
+            found = positions < len(ids)
+            found[found] = ids[positions[found]] == candidates[found]
+            return found
+        # Marking the list's ids in an array of every id costs less than searching for
+        # this many candidates
+        marks[ids] = True
+        found = marks[candidates]
+        marks[ids] = False
+        return found
+
+    def _counts_all(self, lists: list[tuple], needed: int) -> bool:
+        # Whether _candidates counts every id instead of sorting the shortest lists
+        prefix = lists[: len(lists) - needed + 1]
+        return sum(length for length, _ in prefix) * SORT_SHARE >= len(self._names)
+
+    def _candidates(self, lists: list[tuple], needed: int) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the ids in at least `needed` of the posting lists, sorted by length, and how
+        many of the lists each of them is in.
+        """
+        if needed > len(lists):
+            return np.empty(0, dtype=np.uint32), np.empty(0, dtype=np.int64)
+        # An id in `needed` lists is in at least one of the len(lists) - needed + 1
+        # shortest, so the needed - 1 longest are only searched for the ids found there
+        if not self._counts_all(lists, needed):
+            prefix = lists[: len(lists) - needed + 1]
+            candidates, shared = np.unique(
+                np.concatenate([self._ids_of(ids) for _, ids in prefix]), return_counts=True
+            )
+            rest = lists[len(prefix) :]
+        else:
+            # With long lists, counting the ids of all but the longest into an array of
+            # every id beats sorting them; an id then needs needed - len(rest) of those
+            # before it is searched for in the rest (DivideSkip)
+            split = len(lists) - (needed - 1) // 2
+            counted = [ids for _, ids in lists[:split]]
+            arrays = [
+                np.frombuffer(ids, dtype=np.uint32) for ids in counted if isinstance(ids, array)
+            ]
+            counts = np.bincount(
+                np.concatenate(arrays) if arrays else np.empty(0, dtype=np.uint32),
+                minlength=len(self._names),
+            )
+            for ids in counted:
+                if isinstance(ids, bytearray):
+                    bits = np.frombuffer(ids, dtype=np.uint8)
+                    counts += np.unpackbits(bits, count=len(self._names), bitorder="little")
+            rest = lists[split:]
+            candidates = np.flatnonzero(counts >= needed - len(rest)).astype(np.uint32)
+            shared = counts[candidates]
+        marks = np.zeros(len(self._names), dtype=bool)
+        # Ids that cannot reach `needed` even if they are in every list left are dropped
+        # after each list, so the longest lists are searched for the fewest ids
+        for left in range(len(rest), 0, -1):
+            possible = shared + left >= needed
+            if not possible.all():
+                candidates, shared = candidates[possible], shared[possible]
+            shared += self._contains(rest[-left][1], candidates, marks)
+        enough = shared >= needed
+        return candidates[enough], shared[enough]
+
+    def _ranked(
+        self, grams: set[str], lists: list[tuple], limit: int, min_score: float
+    ) -> list[tuple[str, float]]:
+        # The higher the threshold, the fewer lists candidates come from; a lower one is only
+        # tried when fewer than `limit` names reach the current one, which keeps the result
+        # exact. Counting every id costs about the same at any threshold, so a threshold that
+        # needs it is skipped for min_score
+        thresholds = [score for score in SEARCH_THRESHOLDS if score > min_score]
+        for threshold in thresholds + [min_score]:
+            # Jaccard >= threshold means sharing at least threshold * len(grams) trigrams
+            needed = max(1, math.ceil(threshold * len(grams)))
+            if threshold > min_score and (needed > len(lists) or self._counts_all(lists, needed)):
+                continue
+            candidates, shared = self._candidates(lists, needed)
+            sizes = np.frombuffer(self._sizes, dtype=np.uint16)[candidates].astype(np.int32)
+            # Removed names have size 0; the floor keeps their score finite before they
+            # are dropped
+            scores = shared / np.maximum(len(grams) + sizes - shared, 1)
+            keep = np.flatnonzero((sizes > 0) & (scores >= threshold))
+            if len(keep) >= limit:
+                break
+        if len(keep) > limit:
+            keep = keep[np.argpartition(-scores[keep], limit - 1)[:limit]]
+        keep = keep[np.argsort(-scores[keep], kind="stable")]
+        return [(self._names[candidates[i]], float(scores[i])) for i in keep]
+
+    def search(
+        self,
+        query: str,
+        limit: int = 5,
+        min_score: float = 0.3,
+        within: Optional[float] = None,
+    ) -> list[tuple[str, float]]:
+        """
+        Returns the indexed names most similar to `query`, best first.
+
+        Args:
+            query (str): A full, partial or misspelled name, e.g. "H. Cosme".
+            limit (int): Maximum number of names returned.
+            min_score (float): Lowest Jaccard similarity of trigrams, between 0 and 1, a name
+                needs to be returned.
+            within (float): If set, only names scoring at most this much below the best one
+                are returned. The best match usually scores high and is found from a few
+                short lists, while ranking every weak match down to min_score means counting
+                most of the index.
+
+        Returns:
+            list: (name, score) pairs.
+        """
+        grams = trigrams(query)
+        if not grams or limit <= 0:
+            return []
+        with self._lock:
+            lists = self._lists(grams)
+            if within is None:
+                return self._ranked(grams, lists, limit, min_score)
+            best = self._ranked(grams, lists, 1, min_score)
+            if not best or limit == 1:
+                return best
+            return self._ranked(grams, lists, limit, max(min_score, best[0][1] - within))
+
+    def stats(self) -> dict:
+        """
+        Returns the number of names and trigrams and the bytes held by the id arrays and
+        bitmaps.
+        """
+        with self._lock:
+            postings = sum(len(ids) for ids in self._postings.values())
+            return {
+                "names": len(self._ids),
+                "removed": self.removed,
+                "trigrams": len(self._postings) + len(self._bitmaps),
+                "dense_trigrams": len(self._bitmaps),
+                "postings": postings + sum(self._dense_sizes.values()),
+                "postings_bytes": postings * 4
+                + len(self._bitmaps) * self._capacity // 8
+                + len(self._sizes) * 2,
+            }
@@ -0,0 +1,316 @@
+"""
+Opt-in per-turn profiling. A profiled turn is sampled by a background thread every few
+milliseconds and written as a collapsed-stack file (one "frame;frame;frame count" line per
+distinct stack, the input of flamegraph.pl and speedscope) next to a JSON file with the
+turn's per-node breakdown and where its samples were spent.
+
+Aggregate the profiles of many turns (from src/):
+    python profiling.py profiles --output merged.collapsed --top 20
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+from typing import Optional
+
+# Sample categories, matched against the file of each frame from the innermost outwards
+CATEGORIES = {
+    "llm_http": ("httpx", "httpcore", "openai", "ssl.py", "socket.py"),
+    "checkpoint": ("langgraph/checkpoint", "checkpointing.py", "sqlite3", "aiosqlite"),
+    "pydantic": ("pydantic",),
+    "prompt": ("langchain_core/prompts", "langchain_core/messages"),
+    "graph": ("langgraph/pregel", "langgraph/graph", "langgraph/channels"),
+}
+
+# Characters kept from a label in the profile's file name
+_UNSAFE_NAME = re.compile(r"[^A-Za-z0-9_.-]")
+
+# Profile of the turn running in the current context, None when it is not profiled
+_active_profile: contextvars.ContextVar[Optional["TurnProfile"]] = contextvars.ContextVar(
+    "booking_profile", default=None
+)
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _category(frame) -> str:
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        for category, markers in CATEGORIES.items():
+            if any(marker in filename for marker in markers):
+                return category
+        frame = frame.f_back
+    return "other"
+
+
+class TurnProfile:
+    """
+    Samples of the threads working on one turn, and the wall time of its nodes.
+    """
+
+    def __init__(self, label: str, interval: float):
+        self.label = label
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self.categories: Counter = Counter()
+        self.nodes: dict[str, list] = {}
+        # thread id -> number of active registrations; the thread that started the turn
+        # is registered for the whole turn, node threads while their node runs
+        self._owner = threading.get_ident()
+        self._threads: Counter = Counter({self._owner: 1})
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name="profiler", daemon=True)
+        self.started = time.perf_counter()
+        self.seconds = 0.0
+
+    def _sample(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                threads = list(self._threads)
+            # While a node runs in another thread, the thread that started the turn only
+            # waits for it and is left out
+            if len(threads) > 1:
+                threads.remove(self._owner)
+            for thread_id in threads:
+                frame = frames.get(thread_id)
+                if frame is None or thread_id == own:
+                    continue
+                stack = []
+                leaf = frame
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(stack))] += 1
+                self.categories[_category(leaf)] += 1
+
+    def start(self):
+        self._sampler.start()
+
+    def stop(self):
+        self.seconds = time.perf_counter() - self.started
+        self._stop.set()
+        self._sampler.join()
+
+    @contextmanager
+    def node(self, name: str):
+        """
+        Registers the current thread for sampling and times the node running in it.
+        """
+        thread_id = threading.get_ident()
+        with self._lock:
+            self._threads[thread_id] += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._threads[thread_id] -= 1
+                if not self._threads[thread_id]:
+                    del self._threads[thread_id]
+                calls = self.nodes.setdefault(name, [0, 0.0])
+                calls[0] += 1
+                calls[1] += elapsed
+
+    def breakdown(self) -> dict:
+        """
+        Returns the turn duration, the calls and milliseconds of every node, the time spent
+        outside the nodes, and the share of the samples in each category.
+        """
+        node_seconds = sum(seconds for _, seconds in self.nodes.values())
+        samples = sum(self.categories.values())
+        return {
+            "label": self.label,
+            "ms": round(self.seconds * 1000, 3),
+            "nodes": {
+                name: {"calls": calls, "ms": round(seconds * 1000, 3)}
+                for name, (calls, seconds) in self.nodes.items()
+            },
+            "outside_nodes_ms": round((self.seconds - node_seconds) * 1000, 3),
+            "samples": samples,
+            "interval_ms": self.interval * 1000,
+            "categories": {
+                category: round(count / samples, 4) for category, count in self.categories.items()
+            }
+            if samples
+            else {},
+        }
+
+
+class Profiler:
+    """
+    Profiles selected turns and writes each one to `directory` as <name>.collapsed and
+    <name>.json. Turns are profiled on request, or at random with the given sample rate.
+    """
+
+    def __init__(self, directory: str = "profiles", sample_rate: float = 0.0, interval: float = 0.005):
+        """
+        Args:
+            directory (str): Where the profiles are written.
+            sample_rate (float): Share of the turns profiled without being asked for.
+            interval (float): Seconds between two stack samples.
+        """
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.interval = interval
+
+    def should_profile(self, requested: bool = False) -> bool:
+        return requested or (self.sample_rate > 0 and random.random() < self.sample_rate)
+
+    @contextmanager
+    def profile(self, label: str = "turn"):
+        """
+        Profiles the code run inside the block and the graph nodes it runs.
+
+        Args:
+            label (str): Name of the turn, e.g. its thread_id, kept in the profile's JSON file
+                and, with other characters than letters, digits, "_", "." and "-" replaced,
+                in its file name.
+
+        Yields:
+            TurnProfile: The profile, written out when the block exits.
+        """
+        profile = TurnProfile(label, self.interval)
+        token = _active_profile.set(profile)
+        profile.start()
+        try:
+            yield profile
+        finally:
+            profile.stop()
+            _active_profile.reset(token)
+            self.write(profile)
+
+    def write(self, profile: TurnProfile) -> str:
+        """
+        Writes a profile and returns the path of its files without the extension.
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        # The label may come from a request, so it must not lead out of the directory
+        label = _UNSAFE_NAME.sub("_", profile.label)[:64]
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{label}-{uuid.uuid4().hex[:8]}"
+        path = os.path.join(self.directory, name)
+        with open(path + ".collapsed", "w") as file:
+            for stack, count in profile.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+        with open(path + ".json", "w") as file:
+            json.dump(profile.breakdown(), file, indent=2)
+        return path
+
+    @staticmethod
+    def wrap_node(name: str, func, afunc=None):
+        """
+        Returns the sync and async implementations of a node, timed and sampled when the
+        turn running them is profiled. A node without an async implementation keeps None.
+        """
+
+        def run(state):
+            profile = _active_profile.get()
+            if profile is None:
+                return func(state)
+            with profile.node(name):
+                return func(state)
+
+        async def arun(state):
+            profile = _active_profile.get()
+            if profile is None:
+                return await afunc(state)
+            with profile.node(name):
+                return await afunc(state)
+
+        return run, arun if afunc is not None else None
+
+
+def aggregate(directory: str) -> tuple[Counter, list[dict]]:
+    """
+    Reads every profile in a directory.
+
+    Returns:
+        tuple: The merged stack counts, and the breakdown of every turn.
+    """
+    stacks, breakdowns = Counter(), []
+    for filename in sorted(os.listdir(directory)):
+        path = os.path.join(directory, filename)
+        if filename.endswith(".collapsed"):
+            with open(path) as file:
+                for line in file:
+                    stack, _, count = line.rstrip("\n").rpartition(" ")
+                    stacks[stack] += int(count)
+        elif filename.endswith(".json"):
+            with open(path) as file:
+                breakdowns.append(json.load(file))
+    return stacks, breakdowns
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def format_summary(stacks: Counter, breakdowns: list[dict], top: int = 15) -> str:
+    lines = [f"turns: {len(breakdowns)}"]
+    if breakdowns:
+        turn_ms = [breakdown["ms"] for breakdown in breakdowns]
+        lines.append(f"turn ms: p50 {_percentile(turn_ms, 0.5):.1f}  p95 {_percentile(turn_ms, 0.95):.1f}")
+
+        lines.append(f"\n{'node':<24}{'turns':>7}{'mean ms':>10}{'p95 ms':>10}")
+        per_node: dict[str, list[float]] = {}
+        for breakdown in breakdowns:
+            for name, node in breakdown["nodes"].items():
+                per_node.setdefault(name, []).append(node["ms"])
+            per_node.setdefault("(outside nodes)", []).append(breakdown["outside_nodes_ms"])
+        for name, values in sorted(per_node.items(), key=lambda item: -sum(item[1])):
+            lines.append(
+                f"{name:<24}{len(values):>7}{sum(values) / len(values):>10.1f}"
+                f"{_percentile(values, 0.95):>10.1f}"
+            )
+
+        categories = Counter()
+        for breakdown in breakdowns:
+            for category, share in breakdown["categories"].items():
+                categories[category] += share * breakdown["samples"]
+        total = sum(categories.values())
+        if total:
+            lines.append(f"\n{'category':<24}{'share':>7}")
+            for category, count in categories.most_common():
+                lines.append(f"{category:<24}{count / total:>7.1%}")
+
+    # Self time: the samples in which a frame was the innermost one
+    leaves = Counter()
+    for stack, count in stacks.items():
+        leaves[stack.rpartition(";")[2]] += count
+    total = sum(leaves.values())
+    if total:
+        lines.append(f"\n{'self samples':>12}  frame")
+        for frame, count in leaves.most_common(top):
+            lines.append(f"{count:>6} {count / total:>5.1%}  {frame}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Aggregate the per-turn profiles of a directory.")
+    parser.add_argument("directory", nargs="?", default="profiles", help="Directory of the profiles")
+    parser.add_argument("--output", default=None, help="Write the merged collapsed stacks to this file")
+    parser.add_argument("--top", type=int, default=15, help="Frames listed by self time")
+    args = parser.parse_args()
+
+    stacks, breakdowns = aggregate(args.directory)
+    if args.output:
+        with open(args.output, "w") as file:
+            for stack, count in stacks.most_common():
+                file.write(f"{stack} {count}\n")
+    print(format_summary(stacks, breakdowns, args.top))
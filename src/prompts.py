@@ -16,23 +16,73 @@ intent_prompt = ChatPromptTemplate.from_template("""
     1. if the "Last asked question" is empty, interpret the answer as the first reply of the conversation
     """)
 
-booking_info_prompt = ChatPromptTemplate.from_template("""
+intent_and_booking_info_prompt = ChatPromptTemplate.from_template("""
+    You are an AI assistant for a hotel booking system. The user will provide a message, and you must classify their intent and extract the booking information it contains.
+
+    Last asked question: {assistant_question}
+    User's reply: {answer}
+
+    1. Classify the intent as one of these four: "make a reservation", "check reservation", "change reservation", or "other".
+
+    2. Extract the following booking information if it is explicitly mentioned in the reply:
+    - Full Name (The full name of the guest. Only first name is not enough to fill this information)
+    - Check-in Date
+    - Check-out Date
+    - Number of Guests
+    - Payment Method
+    - Whether Breakfast is Included
+
+    Observations:
+    1. if the "Last asked question" is empty, interpret the answer as the first reply of the conversation
+    2. If a piece of information is not mentioned in the reply, leave it as None.
+
+    Provide the intent and the extracted information in a structured format.
+    """)
+
+# Fields listed by the booking information prompt, which can be built for a subset of them
+booking_info_field_descriptions = {
+    "full_name": "Full Name (The full name of the guest. Only first name is not enough to fill this information)",
+    "check_in_date": "Check-in Date",
+    "check_out_date": "Check-out Date",
+    "num_guests": "Number of Guests",
+    "payment_method": "Payment Method",
+    "breakfast_included": "Whether Breakfast is Included",
+}
+
+booking_info_template = """
     You are an AI assistant for a hotel booking system. Your task is to extract relevant booking information from the user's message. Extract only the information that is explicitly mentioned in the message.
 
     User's message: {message}
 
     Please extract the following information if present:
-    1. Full Name (The full name of the guest. Only first name is not enough to fill this information)
-    2. Check-in Date
-    3. Check-out Date
-    4. Number of Guests
-    5. Payment Method
-    6. Whether Breakfast is Included
+{field_list}
 
     If a piece of information is not mentioned in the message, leave it as None.
 
     Provide the extracted information in a structured format.
-    """)
+    """
+
+
+def create_booking_info_prompt(fields):
+    """
+    Builds the booking information prompt listing only the given fields.
+
+    Args:
+        fields (list): Booking fields to extract, in the order they should be listed.
+
+    Returns:
+        ChatPromptTemplate: A prompt with the same wording as booking_info_prompt.
+    """
+    field_list = "\n".join(
+        f"    {i}. {booking_info_field_descriptions[field]}"
+        for i, field in enumerate(fields, start=1)
+    )
+    return ChatPromptTemplate.from_template(booking_info_template).partial(
+        field_list=field_list
+    )
+
+
+booking_info_prompt = create_booking_info_prompt(list(booking_info_field_descriptions))
 
 booking_change_prompt = ChatPromptTemplate.from_template("""
     You are an AI assistant for a hotel booking system. Your task is to extract the information the user wants to change in his reservation. Extract only the information that is explicitly mentioned in the message.
@@ -119,6 +169,7 @@ Check-out Date: {check_out_date}
 Number of Guests: {num_guests}
 Payment Method: {payment_method}
 Breakfast Included: {breakfast_included}
+Booking Reference: {booking_reference}
 
 Instructions:
 1. Provide a summary of the information collected so far.
@@ -129,6 +180,7 @@ Instructions:
 Observations:
 1. You are in an active conversation with a user, so be friendly and professional. Avoid talking like if you were sending a message or an email
 2. DO NOT ask the user to provide any additional type of information besides the ones highlighted in "Current booking information"
+3. If there is a Booking Reference, tell it to the user. Do not mention it when it is None
 """
 
 correction_chain_prompt = ChatPromptTemplate.from_template("""
@@ -153,3 +205,77 @@ Observations:
 
 Please rephrase these errors into a polite and professional message asking the user to correct the information. Do not output anything besides the message to the user:
 """)
+
+# Questions asking for one missing booking field, used when no LLM answer is available
+field_questions = {
+    "full_name": "Could you please tell me your full name?",
+    "check_in_date": "What is your check-in date (YYYY-MM-DD)?",
+    "check_out_date": "What is your check-out date (YYYY-MM-DD)?",
+    "num_guests": "How many guests will be staying?",
+    "payment_method": "How would you like to pay: credit card, debit card, cash or paypal?",
+    "breakfast_included": "Would you like breakfast included?",
+}
+
+# Degraded answers sent when a node misses its deadline
+deadline_fallback_prompt = "I'm sorry for the wait, our system is a bit slow right now."
+deadline_fallback_retry = "Could you please send your last message again?"
+deadline_fallback_booking = "I couldn't retrieve your booking details just now, please ask me again in a moment."
+
+# Responses rendered without the LLM in template mode, keyed by node, by intent and by the
+# first item of not_filled_keys: None once every field is filled, "*" for any missing field
+# not listed. Available placeholders: {greeting}, {first_name}, {summary} and {missing}
+response_templates = {
+    "generate_response": {
+        "make a reservation": {
+            "full_name": "I'd be happy to help you book a room! " + field_questions["full_name"],
+            **{
+                key: "{greeting} " + question
+                for key, question in field_questions.items()
+                if key != "full_name"
+            },
+            None: (
+                "{greeting} Here are your booking details:\n{summary}\n"
+                "Would you like me to proceed with the booking?"
+            ),
+        },
+    },
+    "summarize_booking": {
+        "check reservation": {
+            "*": (
+                "Here is the booking information I have so far:\n{summary}\n"
+                "I still need your {missing}. Would you like to provide the missing details, "
+                "or change anything?"
+            ),
+            None: (
+                "Here is your reservation:\n{summary}\n"
+                "Your reservation is booked. Is there anything else I can help you with?"
+            ),
+        },
+        # A change leaving fields to collect sets the intent back to "make a reservation"
+        "make a reservation": {
+            "*": (
+                "I have updated your booking information:\n{summary}\n"
+                "I still need your {missing}. Would you like to provide the missing details, "
+                "or change anything else?"
+            ),
+        },
+    },
+}
+
+# Asks for at most two corrections, like correction_chain_prompt; {salutation} is "Dear <first
+# name>" or "Dear Guest"
+correction_template = (
+    "{salutation}, there is a problem with your booking details: {errors} "
+    "Could you please send me the corrected information?"
+)
+
+# Labels of the booking fields in rendered summaries
+booking_field_labels = {
+    "full_name": "Full Name",
+    "check_in_date": "Check-in Date",
+    "check_out_date": "Check-out Date",
+    "num_guests": "Number of Guests",
+    "payment_method": "Payment Method",
+    "breakfast_included": "Breakfast Included",
+    "booking_reference": "Booking Reference",
+}
@@ -1,4 +1,4 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, create_model
 from typing import Optional, Literal, TypedDict
 
 
@@ -27,6 +27,32 @@ class BookingInfo(BaseModel):
     )
 
 
+class IntentWithBookingInfo(BookingInfo):
+    intent: Literal[
+        "make a reservation", "check reservation", "change reservation", "other"
+    ] = Field(..., description="The classified intent of the user's message")
+
+
+def create_booking_info_model(fields):
+    """
+    Builds a BookingInfo model restricted to the given fields, so the structured output
+    schema only asks for the information that is still missing.
+
+    Args:
+        fields (list): Names of BookingInfo fields to keep.
+
+    Returns:
+        type[BaseModel]: A model named BookingInfo with the same field definitions.
+    """
+    return create_model(
+        "BookingInfo",
+        **{
+            field: (BookingInfo.model_fields[field].annotation, BookingInfo.model_fields[field])
+            for field in fields
+        },
+    )
+
+
 # Define the state using TypedDict
 class BookingState(TypedDict):
     user_message: Optional[str]
@@ -45,3 +71,7 @@ class BookingState(TypedDict):
     error: Optional[str]
     not_filled_keys: Optional[list[str]]
     response: Optional[str]
+    # Booking fields extracted together with the intent, consumed by collect_information
+    extracted_info: Optional[dict]
+    # Reference of the booking in the reservations store, once it is complete and valid
+    booking_reference: Optional[str]
@@ -0,0 +1,466 @@
+import re
+import time
+import secrets
+import sqlite3
+import threading
+from datetime import date
+from typing import Iterable, Optional
+
+from checkpointing import connect_sqlite
+from inventory import RoomInventory, RoomUnavailableError
+from name_index import NameIndex
+
+# Booking references look like "GV-7K3M9Q2X": Crockford base32, without I, L, O and U so
+# they can be read out over the phone, with about 10^12 possible values
+REFERENCE_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+REFERENCE_LENGTH = 8
+REFERENCE_PATTERN = re.compile(
+    rf"\bGV-?([0-9A-HJKMNP-TV-Z]{{{REFERENCE_LENGTH}}})\b", re.IGNORECASE
+)
+
+_SCHEMA = (
+    """
+    CREATE TABLE IF NOT EXISTS reservations (
+        reference TEXT PRIMARY KEY,
+        full_name TEXT NOT NULL,
+        name_key TEXT NOT NULL,
+        check_in_date TEXT NOT NULL,
+        check_out_date TEXT NOT NULL,
+        num_guests INTEGER NOT NULL,
+        payment_method TEXT NOT NULL,
+        breakfast_included INTEGER NOT NULL,
+        created_at REAL NOT NULL,
+        updated_at REAL NOT NULL
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS reservations_name ON reservations (name_key, check_in_date)",
+    "CREATE INDEX IF NOT EXISTS reservations_check_in ON reservations (check_in_date)",
+    "CREATE INDEX IF NOT EXISTS reservations_check_out ON reservations (check_out_date)",
+    # Lets a name index pick up the bookings written by other processes
+    "CREATE INDEX IF NOT EXISTS reservations_updated ON reservations (updated_at)",
+    # The room held by every booking. Each write transaction stamps its holds with the next
+    # version, so a process catches up on the holds of the others by reading past its own
+    """
+    CREATE TABLE IF NOT EXISTS room_holds (
+        reference TEXT PRIMARY KEY,
+        room_type TEXT NOT NULL,
+        check_in_date TEXT NOT NULL,
+        check_out_date TEXT NOT NULL,
+        version INTEGER NOT NULL
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS room_holds_version ON room_holds (version)",
+)
+
+# Columns read back by the lookups, in the order _booking unpacks them
+_SELECT = (
+    "SELECT reference, full_name, check_in_date, check_out_date, num_guests, payment_method, "
+    "breakfast_included, created_at, updated_at FROM reservations"
+)
+
+
+def name_key(full_name: str) -> str:
+    """
+    Returns the form of a guest name that lookups compare: lower case, single spaces.
+    """
+    return " ".join(full_name.lower().split())
+
+
+def new_reference() -> str:
+    # Five random bytes are exactly eight base32 characters
+    value = int.from_bytes(secrets.token_bytes(REFERENCE_LENGTH * 5 // 8), "big")
+    return "GV-" + "".join(
+        REFERENCE_ALPHABET[(value >> shift) & 31]
+        for shift in range((REFERENCE_LENGTH - 1) * 5, -1, -5)
+    )
+
+
+def find_reference(text: str) -> Optional[str]:
+    """
+    Returns the first booking reference mentioned in a message, normalized, or None.
+    """
+    match = REFERENCE_PATTERN.search(text or "")
+    return f"GV-{match.group(1).upper()}" if match else None
+
+
+class ReservationStore:
+    """
+    Confirmed bookings in a SQLite table, indexed by booking reference (the primary key),
+    guest name and check-in and check-out dates, so "check reservation" and "change
+    reservation" turns can find a booking without the client sending it back.
+
+    With `name_index`, the distinct guest names are also kept in an in-memory trigram
+    index (see name_index.NameIndex) for misspelled and partial names. The index is built
+    when the store opens, follows this store's writes, and reads the names written by
+    other processes from the updated_at index at most every `refresh_interval` seconds.
+
+    With `room_types`, every booking also holds a room in the room_holds table, mirrored in
+    an in-memory inventory.RoomInventory. A save takes the database's write lock before it
+    checks the room, so two bookings, even from different processes, cannot take the last
+    one; a booking that finds no free room is refused with RoomUnavailableError.
+    """
+
+    def __init__(
+        self,
+        db_path: str = "conversation_history.db",
+        busy_timeout: float = 5.0,
+        name_index: bool = False,
+        refresh_interval: float = 1.0,
+        room_types: Optional[dict[str, tuple[int, int]]] = None,
+    ):
+        """
+        Args:
+            db_path (str): Path of the SQLite file; it can be the conversation database.
+            busy_timeout (float): Seconds a write waits for a lock held by another connection.
+            name_index (bool): If True, keeps a fuzzy index of the guest names for match_name.
+            refresh_interval (float): Minimum seconds between two reads of the names written
+                by other processes.
+            room_types (dict): {name: (guests per room, number of rooms)} of the hotel. If
+                given, each booking holds a room of the smallest free type that fits it.
+        """
+        self.db_path = db_path
+        self.busy_timeout = busy_timeout
+        self.conn = connect_sqlite(db_path, busy_timeout)
+        self._lock = threading.Lock()
+        with self._lock, self.conn:
+            for statement in _SCHEMA:
+                self.conn.execute(statement)
+        self.names = None
+        self.refresh_interval = refresh_interval
+        if name_index:
+            self._names_since = self._names_watermark()
+            with self._lock:
+                rows = self.conn.execute("SELECT DISTINCT name_key FROM reservations")
+                self.names = NameIndex(name for name, in rows)
+            self._names_refreshed_at = time.monotonic()
+        self.rooms = None
+        if room_types:
+            self.rooms = RoomInventory(room_types)
+            self._rooms_version = 0
+            with self._lock:
+                self._sync_rooms()
+                self._hold_unheld()
+
+    @staticmethod
+    def _row(booking: dict) -> tuple:
+        return (
+            booking["full_name"],
+            name_key(booking["full_name"]),
+            booking["check_in_date"],
+            booking["check_out_date"],
+            int(booking["num_guests"]),
+            booking["payment_method"],
+            int(bool(booking["breakfast_included"])),
+        )
+
+    @staticmethod
+    def _booking(row: tuple) -> dict:
+        reference, full_name, check_in, check_out, guests, payment, breakfast, created, updated = row
+        return {
+            "reference": reference,
+            "full_name": full_name,
+            "check_in_date": check_in,
+            "check_out_date": check_out,
+            "num_guests": guests,
+            "payment_method": payment,
+            "breakfast_included": bool(breakfast),
+            "created_at": created,
+            "updated_at": updated,
+        }
+
+    def save(self, booking: dict, reference: Optional[str] = None) -> str:
+        """
+        Stores a complete booking, or updates the one with the given reference.
+
+        Args:
+            booking (dict): The six booking fields.
+            reference (str): Reference of a stored booking to update; a new one is issued if
+                it is None or unknown.
+
+        Returns:
+            str: The booking reference.
+        """
+        now = time.time()
+        row = self._row(booking)
+        room_type = None
+        with self._lock:
+            with self.conn:
+                if self.rooms is not None:
+                    # The write lock is taken before the room is checked, so no other booking
+                    # can take it in between, from this process or another
+                    self.conn.execute("BEGIN IMMEDIATE")
+                    self._sync_rooms()
+                    _, _, check_in, check_out, guests, _, _ = row
+                    room_type = self.rooms.room_for(guests, check_in, check_out, reference)
+                reference = self._write(row, reference, now)
+                if room_type is not None:
+                    hold = (reference, room_type, check_in, check_out)
+                    version = self._write_holds([hold])
+            if room_type is not None:
+                self.rooms.hold(*hold)
+                self._rooms_version = version
+        return reference
+
+    def _write(self, row: tuple, reference: Optional[str], now: float) -> str:
+        # Called with the lock held, inside a transaction
+        if reference is not None:
+            previous = self.conn.execute(
+                "SELECT name_key FROM reservations WHERE reference = ?", (reference,)
+            ).fetchone()
+            updated = self.conn.execute(
+                "UPDATE reservations SET full_name = ?, name_key = ?, check_in_date = ?, "
+                "check_out_date = ?, num_guests = ?, payment_method = ?, "
+                "breakfast_included = ?, updated_at = ? WHERE reference = ?",
+                (*row, now, reference),
+            ).rowcount
+            if updated:
+                self._rename(previous[0], row[1])
+                return reference
+        if self.names is not None:
+            self.names.add(row[1])
+        while True:
+            reference = new_reference()
+            try:
+                self.conn.execute(
+                    "INSERT INTO reservations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (reference, *row, now, now),
+                )
+                return reference
+            except sqlite3.IntegrityError:
+                # The reference is already taken, draw another one
+                continue
+
+    def insert_many(self, bookings: Iterable[dict]) -> list[str]:
+        """
+        Stores many new bookings in one transaction, e.g. for an import. With room types,
+        a booking that finds no free room rolls the whole import back with
+        RoomUnavailableError.
+
+        Returns:
+            list: The references issued, in the order of the bookings.
+        """
+        now = time.time()
+        bookings = list(bookings)
+        references, rows = [], []
+        for booking in bookings:
+            references.append(new_reference())
+            rows.append((references[-1], *self._row(booking), now, now))
+        holds = []
+        try:
+            with self._lock:
+                try:
+                    with self.conn:
+                        if self.rooms is not None:
+                            self.conn.execute("BEGIN IMMEDIATE")
+                            self._sync_rooms()
+                            self._hold_rooms(rows, holds)
+                        self.conn.executemany(
+                            "INSERT INTO reservations VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows
+                        )
+                        if holds:
+                            version = self._write_holds(holds)
+                except BaseException:
+                    # The transaction rolled back, and so do the rooms held in memory
+                    for hold in holds:
+                        self.rooms.release(hold[0])
+                    raise
+                if holds:
+                    self._rooms_version = version
+            if self.names is not None:
+                self.names.add_many(row[2] for row in rows)
+        except sqlite3.IntegrityError:
+            # A reference was already taken and the transaction rolled back; save() draws
+            # a new reference on every collision
+            references = [self.save(booking) for booking in bookings]
+        return references
+
+    def get(self, reference: str) -> Optional[dict]:
+        """
+        Returns the booking with the given reference, or None.
+        """
+        with self._lock:
+            row = self.conn.execute(
+                f"{_SELECT} WHERE reference = ?", (reference.upper(),)
+            ).fetchone()
+        return self._booking(row) if row is not None else None
+
+    def find_by_name(self, full_name: str, limit: int = 10) -> list[dict]:
+        """
+        Returns the bookings of a guest, the latest check-in first.
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                f"{_SELECT} WHERE name_key = ? "
+                "ORDER BY check_in_date DESC LIMIT ?",
+                (name_key(full_name), limit),
+            ).fetchall()
+        return [self._booking(row) for row in rows]
+
+    def find_by_dates(
+        self,
+        check_in_date: Optional[str] = None,
+        check_out_date: Optional[str] = None,
+        limit: int = 100,
+    ) -> list[dict]:
+        """
+        Returns the bookings arriving on `check_in_date` and/or leaving on `check_out_date`.
+        """
+        conditions, values = [], []
+        if check_in_date is not None:
+            conditions.append("check_in_date = ?")
+            values.append(check_in_date)
+        if check_out_date is not None:
+            conditions.append("check_out_date = ?")
+            values.append(check_out_date)
+        if not conditions:
+            raise ValueError("Give a check-in date, a check-out date or both.")
+        with self._lock:
+            rows = self.conn.execute(
+                f"{_SELECT} WHERE {' AND '.join(conditions)} LIMIT ?",
+                (*values, limit),
+            ).fetchall()
+        return [self._booking(row) for row in rows]
+
+    def _rename(self, old_key: str, new_key: str):
+        # Called with the lock held, once the update is written
+        if self.names is None or old_key == new_key:
+            return
+        self.names.add(new_key)
+        if self.conn.execute(
+            "SELECT 1 FROM reservations WHERE name_key = ? LIMIT 1", (old_key,)
+        ).fetchone() is None:
+            self.names.remove(old_key)
+
+    def _names_watermark(self) -> float:
+        # A write stamps updated_at before it waits for the database lock, so a row can
+        # commit up to busy_timeout seconds after its timestamp
+        return time.time() - self.busy_timeout - 1.0
+
+    def _refresh_names(self):
+        if time.monotonic() - self._names_refreshed_at < self.refresh_interval:
+            return
+        since = self._names_watermark()
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT DISTINCT name_key FROM reservations WHERE updated_at >= ?",
+                (self._names_since,),
+            ).fetchall()
+        self.names.add_many(name for name, in rows)
+        self._names_since = since
+        self._names_refreshed_at = time.monotonic()
+
+    def match_name(
+        self,
+        full_name: str,
+        limit: int = 5,
+        min_score: float = 0.3,
+        within: Optional[float] = None,
+    ) -> list[tuple[str, float]]:
+        """
+        Returns the stored guest names closest to a possibly misspelled or partial name,
+        as (name key, similarity) pairs, best first; see NameIndex.search. Needs the store
+        to have a name index.
+        """
+        if self.names is None:
+            raise ValueError("The reservations store was opened without a name index.")
+        self._refresh_names()
+        return self.names.search(full_name, limit, min_score, within)
+
+    def _sync_rooms(self):
+        # Called with the lock held: applies the holds written by other processes
+        rows = self.conn.execute(
+            "SELECT reference, room_type, check_in_date, check_out_date, version "
+            "FROM room_holds WHERE version > ? ORDER BY version",
+            (self._rooms_version,),
+        ).fetchall()
+        if rows:
+            self.rooms.hold_many(row[:4] for row in rows)
+            self._rooms_version = rows[-1][4]
+
+    def _hold_rooms(self, rows: list[tuple], holds: list[tuple]):
+        # Holds a room in memory for every row of insert_many, adding it to `holds` so the
+        # caller can release them if the transaction fails
+        for reference, _, _, check_in, check_out, guests, *_ in rows:
+            room_type = self.rooms.room_for(guests, check_in, check_out)
+            self.rooms.hold(reference, room_type, check_in, check_out)
+            holds.append((reference, room_type, check_in, check_out))
+
+    def _write_holds(self, holds: list[tuple]) -> int:
+        # Called inside a transaction begun with BEGIN IMMEDIATE after _sync_rooms, when
+        # _rooms_version is the latest version in the table
+        version = self._rooms_version + 1
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO room_holds VALUES (?, ?, ?, ?, ?)",
+            [(*hold, version) for hold in holds],
+        )
+        return version
+
+    def _hold_unheld(self):
+        """
+        Gives a room to the bookings still to come that were saved without one, e.g. before
+        the store had room types. Their guests already have a confirmation, so where no
+        room is free they take one of the smallest type that fits them anyway.
+        """
+        with self.conn:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self._sync_rooms()
+            rows = self.conn.execute(
+                "SELECT reference, num_guests, check_in_date, check_out_date FROM reservations "
+                "WHERE check_out_date > ? AND reference NOT IN (SELECT reference FROM room_holds)",
+                (date.today().isoformat(),),
+            ).fetchall()
+            holds = []
+            for reference, guests, check_in, check_out in rows:
+                try:
+                    room_type = self.rooms.room_for(guests, check_in, check_out)
+                except RoomUnavailableError:
+                    fitting = [
+                        name
+                        for name, (capacity, _) in self.rooms.room_types.items()
+                        if capacity >= guests
+                    ]
+                    room_type = fitting[0] if fitting else list(self.rooms.room_types)[-1]
+                self.rooms.hold(reference, room_type, check_in, check_out)
+                holds.append((reference, room_type, check_in, check_out))
+            version = self._write_holds(holds)
+        if holds:
+            self._rooms_version = version
+
+    def room_for(
+        self,
+        num_guests: int,
+        check_in_date: str,
+        check_out_date: str,
+        reference: Optional[str] = None,
+    ) -> str:
+        """
+        Returns the room type a booking would hold, not counting the current hold of the
+        booking with the given reference; see RoomInventory.room_for. Needs the store to
+        have room types.
+
+        Raises:
+            RoomUnavailableError: No room takes that many guests, or none is free.
+        """
+        if self.rooms is None:
+            raise ValueError("The reservations store was opened without room types.")
+        with self._lock:
+            self._sync_rooms()
+        return self.rooms.room_for(num_guests, check_in_date, check_out_date, reference)
+
+    def rooms_left(self, check_in_date: str, check_out_date: str) -> dict[str, int]:
+        """
+        Returns the rooms of each type free for the whole stay. Needs the store to have
+        room types.
+        """
+        if self.rooms is None:
+            raise ValueError("The reservations store was opened without room types.")
+        with self._lock:
+            self._sync_rooms()
+        return self.rooms.rooms_left(check_in_date, check_out_date)
+
+    def count(self) -> int:
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM reservations").fetchone()[0]
+
+    def close(self):
+        self.conn.close()
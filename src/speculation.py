@@ -0,0 +1,54 @@
+import threading
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+
+class TokenUsageCallback(BaseCallbackHandler):
+    """
+    Sums the tokens reported by the chat model calls of a chain run.
+    """
+
+    def __init__(self):
+        self.tokens = 0
+
+    def on_llm_end(self, response, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None)
+                if usage:
+                    self.tokens += usage["total_tokens"]
+
+
+class SpeculationStats:
+    """
+    Counters for speculative slot extraction: how often the extraction started alongside
+    intent detection was used, and the tokens spent on the ones that were dropped.
+    """
+
+    def __init__(self):
+        self.speculated = 0
+        self.committed = 0
+        self.wasted_tokens = 0
+        self._lock = threading.Lock()
+
+    def record(self, committed: bool, tokens: int):
+        with self._lock:
+            self.speculated += 1
+            if committed:
+                self.committed += 1
+            else:
+                self.wasted_tokens += tokens
+
+    def stats(self) -> dict:
+        """
+        Returns the speculation counters and hit rate.
+        """
+        with self._lock:
+            return {
+                "speculated": self.speculated,
+                "committed": self.committed,
+                "dropped": self.speculated - self.committed,
+                "hit_rate": self.committed / self.speculated if self.speculated else 0.0,
+                "wasted_tokens": self.wasted_tokens,
+            }
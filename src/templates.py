@@ -0,0 +1,178 @@
+import string
+import threading
+from collections import deque
+from typing import Callable, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from prompts import booking_field_labels, correction_template, response_templates
+
+# Placeholders a response template may use
+TEMPLATE_FIELDS = {"greeting", "first_name", "summary", "missing", "salutation", "errors"}
+
+# Nodes whose response can be rendered from a template
+TEMPLATE_NODES = ("generate_response", "summarize_booking", "ask_for_correction")
+
+
+def _compile(template: str) -> Callable[..., str]:
+    """
+    Checks the placeholders of a template once and returns its formatter.
+    """
+    fields = {name for _, name, _, _ in string.Formatter().parse(template) if name is not None}
+    unknown = fields - TEMPLATE_FIELDS
+    if unknown:
+        raise ValueError(f"Unknown template fields: {', '.join(sorted(unknown))}")
+    return template.format
+
+
+class ChatModelCallCounter(BaseCallbackHandler):
+    """
+    Counts the chat model calls of a turn; cached and replayed chain results are not calls.
+    """
+
+    run_inline = True
+
+    def __init__(self):
+        self.calls = 0
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.calls += 1
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.calls += 1
+
+
+class ResponseTemplates:
+    """
+    Renders the routine answers of the booking workflow without the LLM: the next question
+    while a reservation is being made, booking summaries and correction requests. Templates
+    are keyed by node, intent and the first field still missing; the "other" intent and any
+    case without a template are left to the LLM. Also counts the turns that needed no chat
+    model call at all and how long they took.
+    """
+
+    def __init__(
+        self,
+        templates: Optional[dict] = None,
+        correction: str = correction_template,
+        latency_window: int = 10_000,
+    ):
+        """
+        Args:
+            templates (dict): {node: {intent: {first missing field: template}}}, defaults to
+                prompts.response_templates.
+            correction (str): Template of the correction requests.
+            latency_window (int): Number of recent turns kept for the latency percentiles.
+        """
+        self._templates = {
+            node: {
+                intent: {key: _compile(template) for key, template in by_key.items()}
+                for intent, by_key in by_intent.items()
+            }
+            for node, by_intent in (templates or response_templates).items()
+        }
+        self._correction = _compile(correction)
+        self.rendered = {node: 0 for node in TEMPLATE_NODES}
+        self.llm = {node: 0 for node in TEMPLATE_NODES}
+        self.turns = 0
+        self.llm_free_turns = 0
+        self._latencies = {
+            "llm_free": deque(maxlen=latency_window),
+            "llm": deque(maxlen=latency_window),
+        }
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _format_value(value) -> str:
+        if value is None:
+            return "not provided yet"
+        if isinstance(value, bool):
+            return "Yes" if value else "No"
+        return str(value)
+
+    def _fields(self, state: dict) -> dict:
+        full_name = state.get("full_name")
+        first_name = full_name.split()[0] if full_name and full_name.split() else ""
+        # A field asked for again after a validation error can be listed more than once
+        missing = [
+            booking_field_labels[key].lower()
+            for key in dict.fromkeys(state.get("not_filled_keys") or [])
+            if key in booking_field_labels
+        ]
+        return {
+            "first_name": first_name,
+            "greeting": f"Thank you, {first_name}!" if first_name else "Thank you!",
+            "salutation": f"Dear {first_name}" if first_name else "Dear Guest",
+            "summary": "\n".join(
+                f"- {label}: {self._format_value(state.get(key))}"
+                for key, label in booking_field_labels.items()
+                if key != "booking_reference" or state.get(key)
+            ),
+            "missing": " and ".join(filter(None, [", ".join(missing[:-1]), missing[-1]]))
+            if missing
+            else "",
+        }
+
+    def _template(self, node: str, state: dict) -> Optional[Callable[..., str]]:
+        if node == "ask_for_correction":
+            return self._correction if state.get("error") else None
+        by_key = self._templates.get(node, {}).get(state.get("intent"))
+        if by_key is None:
+            return None
+        not_filled_keys = state.get("not_filled_keys") or []
+        key = not_filled_keys[0] if not_filled_keys else None
+        return by_key.get(key, by_key.get("*") if key is not None else None)
+
+    def render(self, node: str, state: dict) -> Optional[str]:
+        """
+        Returns the templated response of a node, or None if the LLM has to answer.
+
+        Args:
+            node (str): One of TEMPLATE_NODES.
+            state (dict): The state of the conversation when the node runs.
+        """
+        template = self._template(node, state)
+        with self._lock:
+            if template is None:
+                self.llm[node] += 1
+            else:
+                self.rendered[node] += 1
+        if template is None:
+            return None
+        fields = self._fields(state)
+        # At most two corrections at once, as correction_chain asks for
+        fields["errors"] = " ".join((state.get("error") or [])[:2])
+        return template(**fields)
+
+    def record_turn(self, llm_calls: int, seconds: float):
+        with self._lock:
+            self.turns += 1
+            if not llm_calls:
+                self.llm_free_turns += 1
+            self._latencies["llm" if llm_calls else "llm_free"].append(seconds)
+
+    @staticmethod
+    def _latency(values) -> dict:
+        if not values:
+            return {"p50_ms": None, "p95_ms": None, "mean_ms": None}
+        ordered = sorted(values)
+        return {
+            "p50_ms": round(ordered[len(ordered) // 2] * 1000, 2),
+            "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 2),
+            "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+        }
+
+    def stats(self) -> dict:
+        """
+        Returns the templated and LLM answers per node, the share of turns served without
+        any chat model call, and the latency of the turns with and without one.
+        """
+        with self._lock:
+            return {
+                "rendered": dict(self.rendered),
+                "llm": dict(self.llm),
+                "turns": self.turns,
+                "llm_free_turns": self.llm_free_turns,
+                "llm_free_share": self.llm_free_turns / self.turns if self.turns else 0.0,
+                "latency": {kind: self._latency(values) for kind, values in self._latencies.items()},
+            }
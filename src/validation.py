@@ -0,0 +1,104 @@
+import re
+from datetime import datetime
+from typing import Optional
+
+from intent_rules import VALID_PAYMENT_METHODS
+
+# The booking rules, compiled once and shared by booking_errors and the bulk validation in
+# bulk_validation.py, so a booking gets the same errors either way
+DATE_PATTERN = re.compile(r"[0-9]{4}-[0-9]{2}-[0-9]{2}")
+# strptime also reads some other Unicode digits, e.g. "٢٠٣٠-01-15"
+_ANY_DIGIT_DATE = re.compile(r"\d{4}-\d{2}-\d{2}")
+MIN_NAME_LENGTH = 3
+PAYMENT_METHODS = frozenset(VALID_PAYMENT_METHODS)
+
+# Error message of every rule and the fields it asks for again, in the order they are checked
+ERRORS = {
+    "full_name": ("Full name must be at least 3 characters long.", ("full_name",)),
+    "check_in_format": ("Check-in date format is invalid (YYYY-MM-DD).", ("check_in_date",)),
+    "check_in_past": ("Check-in date cannot be in the past.", ("check_in_date",)),
+    "check_out_format": ("Check-out date format is invalid (YYYY-MM-DD).", ("check_out_date",)),
+    "check_out_past": ("Check-out date cannot be in the past.", ("check_out_date",)),
+    "date_order": (
+        "Check-out date must be after check-in date.",
+        ("check_in_date", "check_out_date"),
+    ),
+    "num_guests": ("Number of guests must be positive.", ("num_guests",)),
+    "payment_method": (
+        f"Invalid payment method. Please choose from: {', '.join(VALID_PAYMENT_METHODS)}.",
+        ("payment_method",),
+    ),
+}
+
+
+def error(rule: str) -> tuple[str, list[str]]:
+    """
+    Returns the (error message, fields to ask for again) pair of a failed rule.
+    """
+    message, fields = ERRORS[rule]
+    return message, list(fields)
+
+
+def parse_date(date_string: str) -> Optional[datetime]:
+    """
+    Returns the date of a YYYY-MM-DD string, or None if it is not one. It accepts exactly
+    what datetime.strptime(date_string, "%Y-%m-%d") does, without its cost for ASCII dates:
+    once the pattern matches, only the month and day ranges are left to check.
+    """
+    try:
+        if DATE_PATTERN.fullmatch(date_string):
+            return datetime(int(date_string[:4]), int(date_string[5:7]), int(date_string[8:]))
+        if _ANY_DIGIT_DATE.fullmatch(date_string):
+            return datetime.strptime(date_string, "%Y-%m-%d")
+    except ValueError:
+        pass
+    return None
+
+
+def is_valid_date_format(date_string: str) -> bool:
+    return parse_date(date_string) is not None
+
+
+def booking_errors(info: dict, now: Optional[datetime] = None) -> list[tuple[str, list[str]]]:
+    """
+    Checks the booking fields present in `info`, as done by validate_information.
+
+    Args:
+        info (dict): Booking fields, e.g. the conversation state or freshly extracted values.
+        now (datetime): Time the dates must not be before, defaults to datetime.today().
+
+    Returns:
+        list: One (error message, fields to ask for again) pair per failed rule.
+    """
+    errors = []
+    now = now or datetime.today()
+
+    # Validate full_name
+    if "full_name" in info and len(info["full_name"]) < MIN_NAME_LENGTH:
+        errors.append(error("full_name"))
+
+    # Validate check_in_date and check_out_date, each parsed once
+    dates = {}
+    for key, prefix in (("check_in_date", "check_in"), ("check_out_date", "check_out")):
+        if key not in info:
+            continue
+        dates[key] = parse_date(info[key])
+        if dates[key] is None:
+            errors.append(error(f"{prefix}_format"))
+        elif dates[key] < now:
+            errors.append(error(f"{prefix}_past"))
+
+    # Validate date order, once both dates are valid
+    if dates.get("check_in_date") and dates.get("check_out_date"):
+        if dates["check_out_date"] <= dates["check_in_date"]:
+            errors.append(error("date_order"))
+
+    # Validate num_guests
+    if "num_guests" in info and info["num_guests"] <= 0:
+        errors.append(error("num_guests"))
+
+    # Validate payment_method
+    if "payment_method" in info and info["payment_method"].lower() not in PAYMENT_METHODS:
+        errors.append(error("payment_method"))
+
+    return errors